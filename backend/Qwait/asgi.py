@@ -12,7 +12,6 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack # If you need authentication for websockets
 # import restaurant_app.routing # Old import, will be replaced
-import waitlist.routing # Import the new waitlist app's routing
 
 settings_module = 'Qwait.deployment_settings' if 'RENDER_EXTERNAL_HOSTNAME' in os.environ else 'Qwait.settings'
 
@@ -21,13 +20,19 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
 # Get the default Django ASGI application
 django_asgi_app = get_asgi_application()
 
+# Consumers import models, so the routing modules can only load once the app registry is ready
+from realtime.auth import TokenAuthMiddleware # Host sockets authenticate with the API token
+import waitlist.routing # Import the new waitlist app's routing
+import customer_interface.routing # Customer queue position sockets
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app, # Handles standard HTTP requests
     "websocket": AuthMiddlewareStack( # Or just URLRouter if no auth needed on WS
-        URLRouter(
+        TokenAuthMiddleware(URLRouter(
             # restaurant_app.routing.websocket_urlpatterns # Old routes
             waitlist.routing.websocket_urlpatterns # New waitlist routes
-        )
+            + customer_interface.routing.websocket_urlpatterns
+        ))
     ),
 })
 
@@ -43,4 +43,17 @@ DATABASES = {
         default = os.environ['DATABASE_URL'],
         conn_max_age = 600
     )
-}
\ No newline at end of file
+}
+
+# Several daphne workers share the waitlist groups through the database we already run
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'realtime.layers.PostgresChannelLayer',
+        'CONFIG': {
+            'database': 'default',
+            'expiry': 60,
+            'group_expiry': 86400,
+            'capacity': 100,
+        },
+    },
+}
@@ -51,10 +51,13 @@ INSTALLED_APPS = [
     'reservation',
     'customer_interface',
     'notifications',
+    'realtime',
 ]
 
 ASGI_APPLICATION = 'Qwait.asgi.application' 
 
+# In-memory only reaches sockets held by this process. With more than one daphne worker use
+# realtime.layers.PostgresChannelLayer (as deployment_settings does), which fans out over LISTEN/NOTIFY.
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels.layers.InMemoryChannelLayer",
@@ -38,10 +38,9 @@ urlpatterns = [
     path('api/waitlist/', include('waitlist.urls')),
     path('api/', include('reservation.urls')), # Include reservation URLs
     path('api/notifications/', include('notifications.urls')), # Added notifications URLs
-    # Add other app URLs here as they are refactored, e.g.:
-    # path('api/parties/', include('parties.urls')),
-    # path('api/analytics/', include('analytics.urls')),
-    # path('api/recent/', include('recent.urls')),
+    path('api/', include('parties.urls')), # /api/restaurants/<id>/parties/ and /api/parties/<id>/
+    path('api/analytics/', include('analytics.urls')),
+    path('api/recent/', include('recent.urls')),
 ]
 
 if settings.DEBUG:
@@ -1,3 +1,21 @@
 from django.contrib import admin
+from .models import HourlyWaitlistRollup, DailyWaitlistRollup, DailyWaitSketch
 
-# Register your models here.
+# Rollups are maintained by analytics.utils / rebuild_analytics; the admin is for inspection only
+@admin.register(DailyWaitlistRollup)
+class DailyWaitlistRollupAdmin(admin.ModelAdmin):
+    list_display = ('restaurant', 'date', 'arrivals', 'seated', 'removed', 'cancelled', 'covers')
+    list_filter = ('restaurant',)
+    date_hierarchy = 'date'
+
+@admin.register(HourlyWaitlistRollup)
+class HourlyWaitlistRollupAdmin(admin.ModelAdmin):
+    list_display = ('restaurant', 'hour', 'arrivals', 'seated', 'removed', 'cancelled', 'covers')
+    list_filter = ('restaurant',)
+    date_hierarchy = 'hour'
+
+@admin.register(DailyWaitSketch)
+class DailyWaitSketchAdmin(admin.ModelAdmin):
+    list_display = ('restaurant', 'date', 'party_size_bucket', 'count')
+    list_filter = ('restaurant', 'party_size_bucket')
+    date_hierarchy = 'date'
@@ -1,3 +1,76 @@
 from django.db import models
+from auth_settings.models import Restaurant
 
-# Create your models here.
+class WaitlistRollup(models.Model):
+    """
+    Counters for one restaurant and one time bucket, kept current by analytics.utils as
+    waitlist entries arrive and leave the queue. Arrivals and the party-size mix are counted
+    in the bucket of the arrival; seated/removed/cancelled and the wait figures in the bucket
+    of the completion. Waits are for seated parties only, in seconds.
+    """
+    arrivals = models.PositiveIntegerField(default=0)
+    covers = models.PositiveIntegerField(default=0) # Guests across all arriving parties
+    seated = models.PositiveIntegerField(default=0)
+    removed = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    # Party-size mix of arrivals (same buckets as waitlist.estimator)
+    party_size_1_2 = models.PositiveIntegerField(default=0)
+    party_size_3_4 = models.PositiveIntegerField(default=0)
+    party_size_5_6 = models.PositiveIntegerField(default=0)
+    party_size_7_plus = models.PositiveIntegerField(default=0)
+    wait_sum_seconds = models.BigIntegerField(default=0)
+    wait_min_seconds = models.BigIntegerField(blank=True, null=True)
+    wait_max_seconds = models.BigIntegerField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+
+class HourlyWaitlistRollup(WaitlistRollup):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='hourly_rollups')
+    hour = models.DateTimeField() # Start of the hour, local time
+
+    def __str__(self):
+        return f"Restaurant {self.restaurant_id} @ {self.hour:%Y-%m-%d %H:00}"
+
+    class Meta:
+        ordering = ['hour']
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'hour'], name='analytics_hourly_rollup_uniq'),
+        ]
+
+
+class DailyWaitlistRollup(WaitlistRollup):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField() # Local date
+
+    def __str__(self):
+        return f"Restaurant {self.restaurant_id} @ {self.date}"
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'date'], name='analytics_daily_rollup_uniq'),
+        ]
+
+
+class DailyWaitSketch(models.Model):
+    """
+    Quantile sketch (analytics.sketches.WaitSketch) of seated-party waits in seconds for one
+    restaurant, local date and party-size bucket. Longer periods merge these instead of
+    reading WaitlistEntry rows.
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='wait_sketches')
+    date = models.DateField()
+    party_size_bucket = models.PositiveSmallIntegerField() # Same buckets as waitlist.estimator
+    count = models.PositiveIntegerField(default=0)
+    sketch = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Restaurant {self.restaurant_id} @ {self.date} bucket {self.party_size_bucket}: {self.count} waits"
+
+    class Meta:
+        ordering = ['date', 'party_size_bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'date', 'party_size_bucket'], name='analytics_wait_sketch_uniq'),
+        ]
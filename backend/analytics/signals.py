@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from waitlist.models import WaitlistEntry
+from .utils import record_waitlist_entry
+
+@receiver(post_save, sender=WaitlistEntry)
+def update_rollups(sender, instance, created, **kwargs):
+    """Keep hourly/daily rollups current in the same transaction as the entry write."""
+    record_waitlist_entry(instance, created=created)
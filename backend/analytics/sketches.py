@@ -0,0 +1,68 @@
+"""
+Mergeable quantile sketch for wait times.
+
+A DDSketch-style log-bucketed histogram: a value x lands in bucket ceil(log_gamma(x)), so
+every quantile it reports is within RELATIVE_ACCURACY of a real observed value, and two
+sketches merge by adding bucket counts. A day of waits for one party-size bucket is a
+few dozen (index, count) pairs, small enough to live in a JSONField row per day.
+"""
+import math
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+MIN_VALUE = 1.0 # Seconds; shorter waits are counted as zero
+
+
+class WaitSketch:
+    def __init__(self, bins=None, zero_count=0):
+        self.bins = dict(bins or {}) # bucket index -> count
+        self.zero_count = zero_count
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value, count=1):
+        if value < MIN_VALUE:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / LOG_GAMMA)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other):
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        return self
+
+    def clamp(self):
+        """Drop buckets emptied (or overdrawn) by merging in removals, i.e. add() with a negative count."""
+        self.bins = {index: count for index, count in self.bins.items() if count > 0}
+        self.zero_count = max(self.zero_count, 0)
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), or None for an empty sketch."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Midpoint of (gamma^(i-1), gamma^i] in the relative-error sense
+                return 2 * GAMMA ** index / (GAMMA + 1)
+        return 2 * GAMMA ** max(self.bins) / (GAMMA + 1)
+
+    def to_dict(self):
+        # JSON object keys must be strings
+        return {'zero': self.zero_count, 'bins': {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls({int(index): count for index, count in data.get('bins', {}).items()}, data.get('zero', 0))
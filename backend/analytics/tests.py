@@ -1,3 +1,175 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from auth_settings.models import CustomUser, Restaurant
+from waitlist.models import WaitlistEntry
+from .models import DailyWaitlistRollup, DailyWaitSketch, HourlyWaitlistRollup
+from .sketches import RELATIVE_ACCURACY, WaitSketch
+
+
+class WaitlistRollupTests(TestCase):
+    """Rollups follow entry transitions incrementally and agree with a full rebuild."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        # Midday two days ago, local time, so no wait crosses a day boundary
+        self.joined = (timezone.localtime() - timedelta(days=2)).replace(hour=12, minute=5, second=0, microsecond=0)
+
+    def add_entry(self, people_count, final_status=None, waited_minutes=0):
+        entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='5550000000',
+            people_count=people_count, timestamp=self.joined
+        )
+        if final_status:
+            entry.status = final_status
+            entry.completion_time = self.joined + timedelta(minutes=waited_minutes)
+            entry.save()
+        return entry
+
+    def snapshot(self):
+        fields = ('arrivals', 'covers', 'seated', 'removed', 'cancelled', 'party_size_1_2', 'party_size_3_4',
+                  'party_size_5_6', 'party_size_7_plus', 'wait_sum_seconds', 'wait_min_seconds', 'wait_max_seconds')
+        return (
+            list(DailyWaitlistRollup.objects.order_by('date').values('date', *fields)),
+            list(HourlyWaitlistRollup.objects.order_by('hour').values('hour', *fields)),
+        )
+
+    def test_transitions_update_rollups(self):
+        self.add_entry(2, 'SERVED', waited_minutes=10)
+        self.add_entry(4, 'SERVED', waited_minutes=30)
+        self.add_entry(7, 'REMOVED', waited_minutes=5)
+        waiting = self.add_entry(3)
+        waiting.notes = 'edited' # Re-saving without a status change counts nothing
+        waiting.save()
+
+        daily = DailyWaitlistRollup.objects.get(restaurant=self.restaurant, date=timezone.localtime(self.joined).date())
+        self.assertEqual((daily.arrivals, daily.covers, daily.seated, daily.removed), (4, 16, 2, 1))
+        self.assertEqual((daily.party_size_1_2, daily.party_size_3_4, daily.party_size_7_plus), (1, 2, 1))
+        self.assertEqual((daily.wait_sum_seconds, daily.wait_min_seconds, daily.wait_max_seconds), (2400, 600, 1800))
+        self.assertEqual(HourlyWaitlistRollup.objects.filter(restaurant=self.restaurant).count(), 1)
+
+    def test_rebuild_matches_incremental(self):
+        self.add_entry(2, 'SERVED', waited_minutes=70) # Completes in a later hour than it arrived
+        self.add_entry(5, 'CANCELED', waited_minutes=3)
+        self.add_entry(1)
+        incremental = self.snapshot()
+
+        sketches = list(DailyWaitSketch.objects.values('date', 'party_size_bucket', 'count', 'sketch'))
+        call_command('rebuild_analytics', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(list(DailyWaitSketch.objects.values('date', 'party_size_bucket', 'count', 'sketch')), sketches)
+
+    def test_reversed_transitions_match_rebuild(self):
+        served_again = self.add_entry(2, 'SERVED', waited_minutes=20)
+        for new_status in ('WAITING', 'SERVED'): # Host undoes a seating, then seats them for real
+            served_again.status = new_status
+            served_again.save()
+        reseated = self.add_entry(4, 'SERVED', waited_minutes=40)
+        reseated.status = 'REMOVED'
+        reseated.save()
+        # The bulk action takes completions back the same way
+        bulk = self.add_entry(3, 'SERVED', waited_minutes=10)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        response = client.post('/api/waitlist/entries/bulk/', {'operations': [{'id': bulk.id, 'status': 'REMOVED'}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        daily = DailyWaitlistRollup.objects.get(restaurant=self.restaurant)
+        self.assertEqual((daily.seated, daily.removed), (1, 2))
+        self.assertEqual((daily.wait_sum_seconds, daily.wait_min_seconds, daily.wait_max_seconds), (1200, 1200, 1200))
+        self.assertEqual(DailyWaitSketch.objects.get(restaurant=self.restaurant).count, 1)
+
+        incremental = self.snapshot()
+        sketches = list(DailyWaitSketch.objects.values('date', 'party_size_bucket', 'count', 'sketch'))
+        call_command('rebuild_analytics', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(list(DailyWaitSketch.objects.values('date', 'party_size_bucket', 'count', 'sketch')), sketches)
+
+    def test_api_range_query(self):
+        self.add_entry(2, 'SERVED', waited_minutes=12)
+        self.add_entry(6)
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        day = timezone.localtime(self.joined).date().isoformat()
+
+        # Token, restaurant, series and totals
+        with self.assertNumQueries(4):
+            response = client.get('/api/analytics/', {'start': day, 'end': day})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['arrivals'], 2)
+        self.assertEqual(response.data['totals']['party_sizes']['5_6'], 1)
+        self.assertEqual(response.data['totals']['wait']['avg_minutes'], 12.0)
+        self.assertEqual(len(response.data['series']), 1)
+
+        response = client.get('/api/analytics/', {'start': day, 'end': day, 'granularity': 'hour'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(row['arrivals'] for row in response.data['series']), 2)
+
+        response = client.get('/api/analytics/', {'start': day, 'end': '2000-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class WaitSketchTests(TestCase):
+    """Sketch quantiles stay within the relative-accuracy bound, including after merges."""
+
+    def exact_quantile(self, values, q):
+        ordered = sorted(values)
+        return ordered[int(q * (len(ordered) - 1))]
+
+    def test_quantiles_within_relative_error(self):
+        values = [30 + (i * 7919) % 5400 for i in range(5000)] # 30s .. 90min, scrambled
+        halves = WaitSketch(), WaitSketch()
+        for i, value in enumerate(values):
+            halves[i % 2].add(value)
+        # Merging through the stored JSON form must behave like one sketch of everything
+        merged = WaitSketch.from_dict(halves[0].to_dict()).merge(WaitSketch.from_dict(halves[1].to_dict()))
+        self.assertEqual(merged.count, len(values))
+        for q in (0.5, 0.9, 0.99):
+            exact = self.exact_quantile(values, q)
+            self.assertLessEqual(abs(merged.quantile(q) - exact) / exact, RELATIVE_ACCURACY * 1.01)
+
+    def test_empty_and_zero(self):
+        self.assertIsNone(WaitSketch().quantile(0.5))
+        sketch = WaitSketch()
+        sketch.add(0)
+        self.assertEqual(sketch.quantile(0.99), 0.0)
+
+
+class WaitPercentilesAPITests(TestCase):
+    def test_week_merges_daily_sketches(self):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        monday = (timezone.localtime() - timedelta(days=14)).replace(hour=12, minute=0, second=0, microsecond=0)
+        monday -= timedelta(days=monday.weekday())
+        # Waits of 1..20 minutes spread over the week
+        for minutes in range(1, 21):
+            joined = monday + timedelta(days=minutes % 7)
+            entry = WaitlistEntry.objects.create(
+                restaurant=restaurant, customer_name='Guest', phone_number='5550000000', people_count=2, timestamp=joined
+            )
+            entry.status = 'SERVED'
+            entry.completion_time = joined + timedelta(minutes=minutes)
+            entry.save()
+        self.assertEqual(DailyWaitSketch.objects.filter(restaurant=restaurant).count(), 7)
 
-# Create your tests here.
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        day = monday.date()
+        response = client.get('/api/analytics/wait-percentiles/', {
+            'start': day.isoformat(), 'end': (day + timedelta(days=6)).isoformat(), 'period': 'week'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['series']), 1)
+        week = response.data['series'][0]
+        self.assertEqual((week['period'], week['count']), (day, 20))
+        self.assertAlmostEqual(week['p50_minutes'], 10, delta=0.2)
+        self.assertAlmostEqual(week['p99_minutes'], 19, delta=0.3) # Nearest-rank on 20 values
+        self.assertEqual(response.data['overall']['count'], 20)
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import WaitlistAnalyticsAPIView, WaitTimePercentilesAPIView
+
+urlpatterns = [
+    path('', WaitlistAnalyticsAPIView.as_view(), name='waitlist_analytics_api'), # ?start=&end=&granularity=day|hour
+    path('wait-percentiles/', WaitTimePercentilesAPIView.as_view(), name='wait_percentiles_api'), # ?start=&end=&period=day|week|month
+]
@@ -0,0 +1,199 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Max, Min, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from waitlist.estimator import party_size_bucket
+from waitlist.models import WaitlistEntry
+from .models import HourlyWaitlistRollup, DailyWaitlistRollup, DailyWaitSketch
+from .sketches import WaitSketch
+
+logger = logging.getLogger(__name__)
+
+# Terminal WaitlistEntry status -> rollup counter. CANCELED is what customers leaving the queue get.
+COMPLETION_COUNTERS = {
+    'SERVED': 'seated',
+    'REMOVED': 'removed',
+    'CANCELED': 'cancelled',
+}
+PARTY_SIZE_COUNTERS = ('party_size_1_2', 'party_size_3_4', 'party_size_5_6', 'party_size_7_plus')
+COUNTER_FIELDS = ('arrivals', 'covers', 'seated', 'removed', 'cancelled') + PARTY_SIZE_COUNTERS
+
+def hour_bucket(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+def day_bucket(moment):
+    return timezone.localtime(moment).date()
+
+def _buckets(moment):
+    return ((HourlyWaitlistRollup, 'hour', hour_bucket(moment)), (DailyWaitlistRollup, 'date', day_bucket(moment)))
+
+
+class RollupAccumulator:
+    """
+    Collects counter increments per (rollup model, restaurant, bucket) in memory, then either
+    applies them to existing rows with atomic F() updates (live path) or builds fresh rows
+    (rebuild path). Both paths share the bucketing, so backfilled and live numbers agree.
+    Seated waits also go into per-day, per-party-size quantile sketches.
+    A completion added with sign=-1 takes one back (the entry left that status again): counters,
+    wait sums and sketches are subtracted, and since min/max can't be un-merged, the live path
+    recomputes them for that bucket from the entries themselves.
+    """
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: {'wait_min_seconds': None, 'wait_max_seconds': None, 'wait_sum_seconds': 0})
+        self.sketches = defaultdict(WaitSketch) # (restaurant_id, date, party_size_bucket) -> WaitSketch
+        self.taken_back = set() # Delta keys whose min/max must be recomputed
+
+    def _delta(self, model, key_field, bucket, restaurant_id):
+        return self.deltas[(model, key_field, bucket, restaurant_id)]
+
+    def add_arrival(self, restaurant_id, timestamp, people_count):
+        for model, key_field, bucket in _buckets(timestamp):
+            delta = self._delta(model, key_field, bucket, restaurant_id)
+            delta['arrivals'] = delta.get('arrivals', 0) + 1
+            delta['covers'] = delta.get('covers', 0) + people_count
+            size_field = PARTY_SIZE_COUNTERS[party_size_bucket(people_count)]
+            delta[size_field] = delta.get(size_field, 0) + 1
+
+    def add_completion(self, restaurant_id, status, timestamp, completion_time, people_count, sign=1):
+        counter = COMPLETION_COUNTERS.get(status)
+        if counter is None or completion_time is None:
+            return
+        wait = int((completion_time - timestamp).total_seconds()) if status == 'SERVED' else None
+        if wait is not None and wait < 0:
+            wait = None # Clock skew / hand-edited rows: count the seating, not the wait
+        for model, key_field, bucket in _buckets(completion_time):
+            delta = self._delta(model, key_field, bucket, restaurant_id)
+            delta[counter] = delta.get(counter, 0) + sign
+            if wait is not None:
+                delta['wait_sum_seconds'] += sign * wait
+                if sign < 0:
+                    self.taken_back.add((model, key_field, bucket, restaurant_id))
+                else:
+                    delta['wait_min_seconds'] = wait if delta['wait_min_seconds'] is None else min(delta['wait_min_seconds'], wait)
+                    delta['wait_max_seconds'] = wait if delta['wait_max_seconds'] is None else max(delta['wait_max_seconds'], wait)
+        if wait is not None:
+            self.sketches[(restaurant_id, day_bucket(completion_time), party_size_bucket(people_count))].add(wait, count=sign)
+
+    def apply(self):
+        """Upsert every collected delta. Call inside the transaction that made the change."""
+        for (model, key_field, bucket, restaurant_id), delta in self.deltas.items():
+            lookup = {'restaurant_id': restaurant_id, key_field: bucket}
+            if model.objects.filter(**lookup).update(**self._update_kwargs(delta)):
+                continue
+            try:
+                with transaction.atomic(): # Savepoint: a concurrent insert of the same bucket must not poison the outer transaction
+                    model.objects.create(**lookup, **self._create_kwargs(delta))
+            except IntegrityError:
+                model.objects.filter(**lookup).update(**self._update_kwargs(delta))
+        for key in self.taken_back:
+            self._recompute_wait_bounds(*key)
+        self.deltas.clear()
+        self.taken_back.clear()
+
+        for (restaurant_id, date, size_bucket), sketch in self.sketches.items():
+            lookup = {'restaurant_id': restaurant_id, 'date': date, 'party_size_bucket': size_bucket}
+            # A sketch can't be merged in SQL, so lock the row, merge in Python and write it back
+            with transaction.atomic():
+                row = DailyWaitSketch.objects.select_for_update().filter(**lookup).first()
+                if row is None:
+                    sketch.clamp() # Nothing stored to take removals back from
+                    if not sketch.count:
+                        continue
+                    try:
+                        with transaction.atomic():
+                            DailyWaitSketch.objects.create(**lookup, count=sketch.count, sketch=sketch.to_dict())
+                        continue
+                    except IntegrityError:
+                        row = DailyWaitSketch.objects.select_for_update().get(**lookup)
+                merged = WaitSketch.from_dict(row.sketch).merge(sketch).clamp()
+                if not merged.count:
+                    row.delete() # Every wait in it was taken back; a rebuild wouldn't have the row either
+                    continue
+                row.count, row.sketch = merged.count, merged.to_dict()
+                row.save(update_fields=['count', 'sketch'])
+        self.sketches.clear()
+
+    @staticmethod
+    def _recompute_wait_bounds(model, key_field, bucket, restaurant_id):
+        """Min/max seated wait of one bucket, from the SERVED entries it covers (the same ones a rebuild counts)."""
+        if key_field == 'hour':
+            start, end = bucket, bucket + timedelta(hours=1)
+        else:
+            start = timezone.make_aware(datetime.combine(bucket, time.min))
+            end = timezone.make_aware(datetime.combine(bucket + timedelta(days=1), time.min))
+        wait = ExpressionWrapper(F('completion_time') - F('timestamp'), output_field=DurationField())
+        bounds = (
+            WaitlistEntry.objects
+            .filter(restaurant_id=restaurant_id, status='SERVED', completion_time__gte=start, completion_time__lt=end)
+            .filter(completion_time__gte=F('timestamp')) # Negative waits aren't counted, as in add_completion
+            .aggregate(low=Min(wait), high=Max(wait))
+        )
+        seconds = lambda duration: None if duration is None else int(duration.total_seconds())
+        model.objects.filter(restaurant_id=restaurant_id, **{key_field: bucket}).update(
+            wait_min_seconds=seconds(bounds['low']), wait_max_seconds=seconds(bounds['high'])
+        )
+
+    def build_rows(self):
+        """Unsaved rollup and sketch instances for bulk_create (rebuild_analytics)."""
+        rows = [
+            model(restaurant_id=restaurant_id, **{key_field: bucket}, **self._create_kwargs(delta))
+            for (model, key_field, bucket, restaurant_id), delta in self.deltas.items()
+        ]
+        rows += [
+            DailyWaitSketch(
+                restaurant_id=restaurant_id, date=date, party_size_bucket=size_bucket,
+                count=sketch.count, sketch=sketch.to_dict()
+            )
+            for (restaurant_id, date, size_bucket), sketch in self.sketches.items()
+        ]
+        return rows
+
+    @staticmethod
+    def _create_kwargs(delta):
+        # A take-back with no row to take it from (history older than the rollups) counts as nothing
+        return {field: max(value, 0) for field, value in delta.items() if value is not None}
+
+    @staticmethod
+    def _update_kwargs(delta):
+        kwargs = {field: F(field) + delta[field] for field in COUNTER_FIELDS if delta.get(field)}
+        if delta['wait_sum_seconds']:
+            kwargs['wait_sum_seconds'] = F('wait_sum_seconds') + delta['wait_sum_seconds']
+        if delta['wait_min_seconds'] is not None:
+            kwargs['wait_min_seconds'] = Least(Coalesce(F('wait_min_seconds'), Value(delta['wait_min_seconds'])), Value(delta['wait_min_seconds']))
+            kwargs['wait_max_seconds'] = Greatest(Coalesce(F('wait_max_seconds'), Value(delta['wait_max_seconds'])), Value(delta['wait_max_seconds']))
+        return kwargs
+
+
+def _add_status_change(accumulator, entry):
+    """Count a move into a terminal status, and take back the completion of the status the entry left."""
+    previous_status = getattr(entry, 'previous_status', None)
+    if previous_status == entry.status:
+        return
+    previous = getattr(entry, 'previous_completion', None)
+    if previous_status in COMPLETION_COUNTERS and previous is not None:
+        timestamp, completion_time, people_count = previous
+        accumulator.add_completion(entry.restaurant_id, previous_status, timestamp, completion_time, people_count, sign=-1)
+    if entry.status in COMPLETION_COUNTERS:
+        accumulator.add_completion(entry.restaurant_id, entry.status, entry.timestamp, entry.completion_time, entry.people_count)
+
+def record_waitlist_entry(entry, created=False):
+    """post_save hook: count a new arrival and/or a status change into or out of a terminal status."""
+    accumulator = RollupAccumulator()
+    if created:
+        accumulator.add_arrival(entry.restaurant_id, entry.timestamp, entry.people_count)
+    _add_status_change(accumulator, entry)
+    accumulator.apply()
+
+def record_completions(entries):
+    """Batch counterpart for writes that bypass post_save (the waitlist bulk action). Each entry
+    carries previous_status and previous_completion, set the way WaitlistEntry.save() sets them."""
+    accumulator = RollupAccumulator()
+    for entry in entries:
+        _add_status_change(accumulator, entry)
+    accumulator.apply()
@@ -1,3 +1,165 @@
-from django.shortcuts import render
+from datetime import datetime, time, timedelta
 
-# Create your views here.
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from waitlist.permissions import IsRestaurantOwner
+from .models import HourlyWaitlistRollup, DailyWaitlistRollup, DailyWaitSketch
+from .sketches import WaitSketch
+from .utils import COUNTER_FIELDS, PARTY_SIZE_COUNTERS
+
+DEFAULT_RANGE_DAYS = 7
+MAX_RANGE_DAYS = {'day': 731, 'hour': 31} # Keep hourly series to a month of points
+PERCENTILES = (50, 90, 99)
+PERIOD_STARTS = {
+    'day': lambda day: day,
+    'week': lambda day: day - timedelta(days=day.weekday()), # Monday
+    'month': lambda day: day.replace(day=1),
+}
+
+def _wait_summary(row):
+    """Seated-party wait figures in minutes from a rollup row or aggregate dict."""
+    seated = row['seated'] or 0
+    return {
+        'avg_minutes': round(row['wait_sum_seconds'] / seated / 60, 1) if seated else None,
+        'min_minutes': round(row['wait_min_seconds'] / 60, 1) if row['wait_min_seconds'] is not None else None,
+        'max_minutes': round(row['wait_max_seconds'] / 60, 1) if row['wait_max_seconds'] is not None else None,
+    }
+
+def _format_row(row):
+    return {
+        **{field: row[field] or 0 for field in COUNTER_FIELDS if field not in PARTY_SIZE_COUNTERS},
+        'party_sizes': {field.replace('party_size_', ''): row[field] or 0 for field in PARTY_SIZE_COUNTERS},
+        'wait': _wait_summary(row),
+    }
+
+def _percentiles(sketch):
+    return {
+        f'p{p}_minutes': round(value / 60, 1) if (value := sketch.quantile(p / 100)) is not None else None
+        for p in PERCENTILES
+    }
+
+def parse_date_range(request, max_days):
+    """Inclusive local (start, end) from ?start=&end=, defaulting to the last DEFAULT_RANGE_DAYS days.
+    Raises ValueError with a client-facing message."""
+    def parse(name, default):
+        value = request.query_params.get(name)
+        if not value:
+            return default
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f'{name} must be a date (YYYY-MM-DD).')
+        return parsed
+
+    end = parse('end', timezone.localdate())
+    start = parse('start', end - timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    if start > end:
+        raise ValueError('start must not be after end.')
+    if (end - start).days + 1 > max_days:
+        raise ValueError(f'At most {max_days} days per request.')
+    return start, end
+
+class WaitlistAnalyticsAPIView(APIView):
+    """
+    Date-range waitlist analytics for the owner's restaurant, answered from the rollup tables:
+    GET /api/analytics/?start=YYYY-MM-DD&end=YYYY-MM-DD&granularity=day|hour
+    Both dates are inclusive, local time; the default is the last 7 days by day.
+    """
+    permission_classes = [IsAuthenticated, IsRestaurantOwner]
+
+    def get(self, request):
+        restaurant = request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in MAX_RANGE_DAYS:
+            return Response({'error': 'granularity must be day or hour.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            start, end = parse_date_range(request, MAX_RANGE_DAYS[granularity])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if granularity == 'day':
+            rollups = DailyWaitlistRollup.objects.filter(restaurant=restaurant, date__range=(start, end))
+            period_field = 'date'
+        else:
+            range_start = timezone.make_aware(datetime.combine(start, time.min))
+            range_end = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+            rollups = HourlyWaitlistRollup.objects.filter(restaurant=restaurant, hour__gte=range_start, hour__lt=range_end)
+            period_field = 'hour'
+
+        value_fields = COUNTER_FIELDS + ('wait_sum_seconds', 'wait_min_seconds', 'wait_max_seconds')
+        series = [
+            {'period': row[period_field], **_format_row(row)}
+            for row in rollups.order_by(period_field).values(period_field, *value_fields)
+        ]
+        # Totals always come from the daily table: at most MAX_RANGE_DAYS['day'] rows
+        totals = DailyWaitlistRollup.objects.filter(restaurant=restaurant, date__range=(start, end)).aggregate(
+            **{field: Sum(field) for field in COUNTER_FIELDS},
+            wait_sum_seconds=Sum('wait_sum_seconds'),
+            wait_min_seconds=Min('wait_min_seconds'),
+            wait_max_seconds=Max('wait_max_seconds'),
+        )
+        if totals['wait_sum_seconds'] is None:
+            totals['wait_sum_seconds'] = 0
+
+        return Response({
+            'restaurant_id': restaurant.id,
+            'start': start,
+            'end': end,
+            'granularity': granularity,
+            'totals': _format_row(totals),
+            'series': series,
+        })
+
+
+class WaitTimePercentilesAPIView(APIView):
+    """
+    p50/p90/p99 seated-party waits for the owner's restaurant, merged from the daily sketches:
+    GET /api/analytics/wait-percentiles/?start=&end=&period=day|week|month&by_party_size=1
+    Weeks start on Monday; partial periods at either end only cover the requested dates.
+    """
+    permission_classes = [IsAuthenticated, IsRestaurantOwner]
+
+    def get(self, request):
+        restaurant = request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        period = request.query_params.get('period', 'day')
+        if period not in PERIOD_STARTS:
+            return Response({'error': 'period must be day, week or month.'}, status=status.HTTP_400_BAD_REQUEST)
+        by_party_size = request.query_params.get('by_party_size') in ('1', 'true')
+        try:
+            start, end = parse_date_range(request, MAX_RANGE_DAYS['day'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        period_start = PERIOD_STARTS[period]
+        merged = {} # (period start, party size bucket or None) -> WaitSketch
+        overall = WaitSketch()
+        rows = DailyWaitSketch.objects.filter(
+            restaurant=restaurant, date__range=(start, end)
+        ).values_list('date', 'party_size_bucket', 'sketch')
+        for day, size_bucket, data in rows:
+            sketch = WaitSketch.from_dict(data)
+            key = (period_start(day), size_bucket if by_party_size else None)
+            merged.setdefault(key, WaitSketch()).merge(sketch)
+            overall.merge(sketch)
+
+        series = []
+        for (starts_on, size_bucket), sketch in sorted(merged.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+            point = {'period': starts_on, 'count': sketch.count, **_percentiles(sketch)}
+            if by_party_size:
+                point['party_size'] = PARTY_SIZE_COUNTERS[size_bucket].replace('party_size_', '')
+            series.append(point)
+
+        return Response({
+            'restaurant_id': restaurant.id,
+            'start': start,
+            'end': end,
+            'period': period,
+            'overall': {'count': overall.count, **_percentiles(overall)},
+            'series': series,
+        })
@@ -31,6 +31,7 @@ class RestaurantAdmin(admin.ModelAdmin):
     search_fields = ('name', 'user__email', 'phone')
     list_filter = ('created_at',)
     raw_id_fields = ('user',) # Useful for OneToOneField to CustomUser
+    readonly_fields = Restaurant.COUNTER_FIELDS # Shown for debugging; Restaurant.save() never writes them
 
     def user_email(self, obj):
         return obj.user.email
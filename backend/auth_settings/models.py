@@ -65,12 +65,31 @@ class Restaurant(models.Model):
     max_queue_size = models.IntegerField(default=50) # This might belong to a WaitlistConfig model
     sms_notifications = models.BooleanField(default=False) # This might belong to a NotificationConfig model
 
+    # Monotonic counter bumped on every waitlist write; keys the cached waitlist snapshot (see waitlist.cache)
+    waitlist_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Same idea for reservations; drives ETags on the reservation list (see reservation.signals)
+    reservation_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Sequence number of the last WebSocket frame sent to this restaurant's waitlist group (see waitlist.broadcast)
+    waitlist_seq = models.PositiveBigIntegerField(default=0, editable=False)
+    # Only ever moved forward by atomic UPDATE ... SET x = x + 1; save() never writes them back
+    COUNTER_FIELDS = ('waitlist_version', 'reservation_version', 'waitlist_seq')
+
     # related_name for WaitlistEntry.restaurant is 'waitlist_entries'
     # related_name for Reservation.restaurant is 'reservations'
     # related_name for Party.restaurant is 'parties_app_entries'
     
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # A full save of an existing row would rewind the counters to whatever this instance loaded,
+        # bringing back old ETags and snapshots and reusing frame seqs
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
     # active_queue_count was previously here, using self.waitlist_entries (from waitlist.models)
     # If Restaurant model needs this method, it would require importing WaitlistEntry
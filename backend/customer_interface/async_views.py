@@ -0,0 +1,213 @@
+"""
+Native async versions of the read-only public customer endpoints.
+
+Under daphne a sync DRF view holds a worker thread for the whole request, so a burst
+of QR scans queues up behind the thread pool. These views run on the event loop and
+only leave it for the individual async ORM queries. Response bodies match the sync
+views in views.py (which stay available via CUSTOMER_INTERFACE_ASYNC_VIEWS = False).
+"""
+import logging
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.utils import timezone
+from django.views import View
+from rest_framework.authentication import get_authorization_header
+
+from auth_settings.models import Restaurant
+from notifications.utils import normalize_phone
+from realtime.auth import get_token_user
+from waitlist.models import WaitlistEntry
+from waitlist.serializers import CustomerWaitlistEntrySerializer
+from waitlist.estimator import aestimate_wait_minutes
+from waitlist.utils import aget_queue_position
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCustomerView(View):
+    """
+    Base for async customer views: GET only, and 404s rendered as JSON the same way
+    DRF renders them for the sync views ({'detail': ...}).
+    """
+    http_method_names = ['get', 'options']
+    token_required = False # Mirrors the sync view's IsAuthenticated, for views that keep it
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.token_required:
+            denied = await self.check_token(request)
+            if denied is not None:
+                return denied
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404 as exc:
+            return JsonResponse({'detail': str(exc) or 'Not found.'}, status=404)
+
+    async def check_token(self, request):
+        """The 401 DRF's TokenAuthentication + IsAuthenticated would give, or None if the token is good."""
+        keyword, _, key = get_authorization_header(request).decode(errors='replace').partition(' ')
+        if keyword.lower() != 'token' or not key.strip():
+            detail = 'Authentication credentials were not provided.'
+        elif await get_token_user(key.strip()) is None:
+            detail = 'Invalid token.'
+        else:
+            return None
+        response = JsonResponse({'detail': detail}, status=401)
+        response['WWW-Authenticate'] = 'Token'
+        return response
+
+
+class AsyncScanQRView(AsyncCustomerView):
+    """Async ScanQRAPIView."""
+    async def get(self, request, restaurant_id):
+        restaurant = await aget_object_or_404(Restaurant.objects.only('id', 'name'), id=restaurant_id)
+
+        return JsonResponse({
+            'success': True,
+            'restaurant': {
+                'id': restaurant.id,
+                'name': restaurant.name
+            },
+            'join_queue_url_segment': f"/join-queue/{restaurant_id}/"
+        })
+
+
+class AsyncJoinQueueView(AsyncCustomerView):
+    """Async JoinQueueAPIView."""
+    async def get(self, request, restaurant_id):
+        restaurant = await aget_object_or_404(
+            Restaurant.objects.only('id', 'name', 'address', 'phone'), id=restaurant_id
+        )
+
+        referrer = request.META.get('HTTP_REFERER', '')
+        is_qr_scan = 'qr' in referrer or request.GET.get('qr') == '1'
+
+        queue_size = await WaitlistEntry.objects.filter(restaurant=restaurant, status='WAITING').acount()
+
+        return JsonResponse({
+            'success': True,
+            'restaurant': {
+                'id': restaurant.id,
+                'name': restaurant.name,
+                'address': restaurant.address,
+                'phone': restaurant.phone
+            },
+            'is_qr_scan': is_qr_scan,
+            'queue_size': queue_size
+        })
+
+
+class AsyncQueueConfirmationView(AsyncCustomerView):
+    """Async QueueConfirmationAPIView."""
+    async def get(self, request, restaurant_id, queue_entry_id):
+        restaurant = await aget_object_or_404(Restaurant, id=restaurant_id)
+        entry = await aget_object_or_404(WaitlistEntry, id=queue_entry_id, restaurant=restaurant)
+
+        if entry.status != 'WAITING':
+            return JsonResponse({
+                'success': True,
+                'restaurant': {
+                    'id': restaurant.id,
+                    'name': restaurant.name
+                },
+                'queue_entry': CustomerWaitlistEntrySerializer(entry).data,
+                'position': 0,
+                'estimated_wait_time': 0,
+                'active': False
+            })
+
+        position, queue_size = await aget_queue_position(entry)
+
+        estimated_wait = await aestimate_wait_minutes(restaurant.id, entry.people_count, position)
+
+        return JsonResponse({
+            'success': True,
+            'restaurant': {
+                'id': restaurant.id,
+                'name': restaurant.name,
+                'address': restaurant.address,
+                'phone': restaurant.phone
+            },
+            'queue_entry': CustomerWaitlistEntrySerializer(entry).data,
+            'position': position,
+            'estimated_wait_time': estimated_wait,
+            'queue_size': queue_size
+        })
+
+
+class AsyncQueueStatusView(AsyncCustomerView):
+    """Async QueueStatusAPIView."""
+    async def get(self, request, restaurant_id, entry_id):
+        restaurant = await aget_object_or_404(Restaurant, id=restaurant_id)
+        entry = await aget_object_or_404(WaitlistEntry, id=entry_id, restaurant=restaurant)
+
+        if entry.status != 'WAITING':
+            return JsonResponse({
+                'success': True,
+                'restaurant': {
+                    'id': restaurant.id,
+                    'name': restaurant.name
+                },
+                'entry': CustomerWaitlistEntrySerializer(entry).data,
+                'position': 0,
+                'wait_time': 0,
+                'active': False
+            })
+
+        position, queue_size = await aget_queue_position(entry)
+
+        estimated_wait = await aestimate_wait_minutes(restaurant.id, entry.people_count, position)
+
+        time_in_queue = timezone.now() - entry.timestamp
+        minutes_in_queue = int(time_in_queue.total_seconds() / 60)
+
+        return JsonResponse({
+            'success': True,
+            'restaurant': {
+                'id': restaurant.id,
+                'name': restaurant.name
+            },
+            'entry': CustomerWaitlistEntrySerializer(entry).data,
+            'position': position,
+            'wait_time': estimated_wait,
+            'queue_size': queue_size,
+            'minutes_in_queue': minutes_in_queue,
+            'active': True
+        })
+
+
+class AsyncCheckPhoneView(AsyncCustomerView):
+    """Async CheckPhoneAPIView. Authenticated like it: the answer names the waiting guest."""
+    token_required = True
+
+    async def get(self, request, restaurant_id, phone_number):
+        logger.debug(f"Checking phone number {phone_number} for restaurant ID {restaurant_id}")
+
+        # Existence check only; skip loading the whole restaurant row
+        if not await Restaurant.objects.filter(id=restaurant_id).aexists():
+            raise Http404('No Restaurant matches the given query.')
+
+        phone_key = normalize_phone(phone_number)
+        entry = None
+        if phone_key: # '' would match every waiting entry whose phone has no digits
+            entry = await WaitlistEntry.objects.filter(
+                restaurant_id=restaurant_id,
+                phone_e164=phone_key,
+                status='WAITING'
+            ).only('id', 'customer_name').afirst()
+
+        response_data = {'exists': entry is not None}
+        if entry:
+            response_data['entry_id'] = entry.id
+            response_data['customer_name'] = entry.customer_name
+            logger.debug(f"Found existing entry with ID {entry.id} for phone {phone_number}")
+        else:
+            logger.debug(f"No existing entry found for phone {phone_number}")
+
+        return JsonResponse(response_data)
+
+
+def use_async_views():
+    """Whether customer_interface.urls routes the read-only endpoints to the async views."""
+    return getattr(settings, 'CUSTOMER_INTERFACE_ASYNC_VIEWS', True)
@@ -0,0 +1,127 @@
+# customer_interface/consumers.py
+"""
+Customer-facing queue socket: ws/queue/<restaurant_id>/<entry_id>
+
+Replaces polling /api/customer/queue-status/ from the confirmation page. Each worker process
+keeps one watcher channel per restaurant that has connected customers; the watcher is a member
+of the restaurant's waitlist group, so it sees every (coalesced) queue change. On each change it
+computes every subscribed entry's position and estimate in one pass over the WAITING queue
+(waitlist.estimator.aqueue_statuses) and pushes each customer only their own
+{position, wait_time, status, queue_size}, and only when it changed.
+"""
+import asyncio
+import json
+import logging
+
+from channels.exceptions import ChannelFull
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+
+from waitlist.broadcast import broadcaster, waitlist_group
+from waitlist.estimator import aqueue_statuses
+from waitlist.models import WaitlistEntry
+
+logger = logging.getLogger(__name__)
+
+
+class _RestaurantWatch:
+    def __init__(self, channel):
+        self.channel = channel # Member of waitlist_<restaurant_id>
+        self.subscribers = {} # consumer channel name -> [entry id, last pushed payload]
+        self.task = None # Receives the group's frames
+        self.pass_task = None # Running recompute, if any
+        self.dirty = False # A change arrived while pass_task was running
+
+
+class QueuePositionHub:
+    """Per-process registry of customer sockets, grouped by restaurant. Use from the consumers' event loop."""
+
+    def __init__(self):
+        self.watches = {} # restaurant id -> _RestaurantWatch
+        self._loop = None
+
+    async def subscribe(self, restaurant_id, entry_id, channel_name):
+        channel_layer = get_channel_layer()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop: # Old loop is gone along with its tasks
+            self.watches = {}
+            self._loop = loop
+        watch = self.watches.get(restaurant_id)
+        if watch is None or watch.task.done():
+            watch = self.watches[restaurant_id] = _RestaurantWatch(await channel_layer.new_channel())
+            watch.task = loop.create_task(self._watch(restaurant_id, watch, channel_layer))
+        # Re-adding refreshes the membership, so a long-lived watcher never hits the layer's group_expiry
+        await channel_layer.group_add(waitlist_group(restaurant_id), watch.channel)
+        watch.subscribers[channel_name] = [entry_id, None]
+        self.refresh(restaurant_id) # The new subscriber has nothing pushed yet, so it gets its first update
+
+    async def unsubscribe(self, restaurant_id, channel_name):
+        watch = self.watches.get(restaurant_id)
+        if watch is None:
+            return
+        watch.subscribers.pop(channel_name, None)
+        if not watch.subscribers:
+            del self.watches[restaurant_id]
+            watch.task.cancel()
+            await get_channel_layer().group_discard(waitlist_group(restaurant_id), watch.channel)
+
+    async def _watch(self, restaurant_id, watch, channel_layer):
+        while True:
+            await channel_layer.receive(watch.channel) # The frame itself doesn't matter, only that the queue changed
+            self.refresh(restaurant_id)
+
+    def refresh(self, restaurant_id):
+        watch = self.watches.get(restaurant_id)
+        if watch is None:
+            return
+        if watch.pass_task is not None and not watch.pass_task.done():
+            watch.dirty = True # Folded into one more pass when the current one finishes
+            return
+        watch.pass_task = asyncio.get_running_loop().create_task(self._push(restaurant_id, watch))
+
+    async def _push(self, restaurant_id, watch):
+        channel_layer = get_channel_layer()
+        while True:
+            watch.dirty = False
+            try:
+                statuses = await aqueue_statuses(restaurant_id, [entry_id for entry_id, _ in watch.subscribers.values()])
+            except Exception:
+                logger.exception(f"Queue position pass failed for restaurant {restaurant_id}")
+                return
+            for channel_name, subscriber in list(watch.subscribers.items()):
+                payload = statuses.get(subscriber[0])
+                if payload is None or payload == subscriber[1]:
+                    continue
+                try:
+                    await channel_layer.send(channel_name, {'type': 'queue.position', 'data': payload})
+                except ChannelFull:
+                    continue # Slow client; the next change carries the latest numbers anyway
+                subscriber[1] = payload
+            if not watch.dirty:
+                return
+
+
+queue_position_hub = QueuePositionHub()
+
+
+class QueuePositionConsumer(AsyncWebsocketConsumer):
+    """ Pushes {'type': 'queue.position', 'data': {position, wait_time, status, queue_size}} for one entry. """
+
+    async def connect(self):
+        kwargs = self.scope['url_route']['kwargs']
+        self.restaurant_id = int(kwargs['restaurant_id'])
+        self.entry_id = int(kwargs['entry_id'])
+        # A worker may hold only customer sockets; its broadcasts must still flush on this loop to reach the watchers
+        broadcaster.attach(asyncio.get_running_loop())
+        if not await WaitlistEntry.objects.filter(id=self.entry_id, restaurant_id=self.restaurant_id).aexists():
+            await self.close(code=4404)
+            return
+        await self.accept()
+        await queue_position_hub.subscribe(self.restaurant_id, self.entry_id, self.channel_name)
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'entry_id'):
+            await queue_position_hub.unsubscribe(self.restaurant_id, self.channel_name)
+
+    async def queue_position(self, event):
+        await self.send(text_data=json.dumps({'type': 'queue.position', 'data': event['data']}))
@@ -0,0 +1,144 @@
+# customer_interface/management/commands/bench_customer_views.py
+import asyncio
+import statistics
+import threading
+import time
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import AsyncRequestFactory
+from rest_framework.authtoken.models import Token
+
+from auth_settings.models import Restaurant
+from customer_interface import async_views, views
+from waitlist.models import WaitlistEntry
+
+# endpoint name -> (sync view class, async view class)
+ENDPOINTS = {
+    'scan_qr': (views.ScanQRAPIView, async_views.AsyncScanQRView),
+    'join_queue': (views.JoinQueueAPIView, async_views.AsyncJoinQueueView),
+    'queue_confirmation': (views.QueueConfirmationAPIView, async_views.AsyncQueueConfirmationView),
+    'queue_status': (views.QueueStatusAPIView, async_views.AsyncQueueStatusView),
+    'check_phone': (views.CheckPhoneAPIView, async_views.AsyncCheckPhoneView),
+}
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/s, latency and worker-thread usage of the sync and async '
+        'customer_interface views, dispatched the way Django\'s ASGI handler does'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, help='Restaurant id to query (defaults to the restaurant of the newest waiting entry)')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS), help='Limit to these endpoints (repeatable)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+
+        entry = self.get_sample_entry(options['restaurant'])
+        kwargs = {
+            'scan_qr': {'restaurant_id': entry.restaurant_id},
+            'join_queue': {'restaurant_id': entry.restaurant_id},
+            'queue_confirmation': {'restaurant_id': entry.restaurant_id, 'queue_entry_id': entry.id},
+            'queue_status': {'restaurant_id': entry.restaurant_id, 'entry_id': entry.id},
+            'check_phone': {'restaurant_id': entry.restaurant_id, 'phone_number': entry.phone_number},
+        }
+
+        # check_phone needs a token; the public views ignore it
+        self.headers = {'authorization': f"Token {Token.objects.get_or_create(user_id=entry.restaurant.user_id)[0].key}"}
+
+        self.stdout.write(
+            f"Restaurant {entry.restaurant_id}, {options['requests']} requests per run, "
+            f"concurrency {options['concurrency']}"
+        )
+        self.stdout.write(f"{'endpoint':<20} {'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'threads':>8} {'errors':>7}")
+
+        for name in options['endpoint'] or ENDPOINTS:
+            sync_cls, async_cls = ENDPOINTS[name]
+            for mode, view in (('sync', sync_cls.as_view()), ('async', async_cls.as_view())):
+                result = asyncio.run(self.run(view, mode == 'async', kwargs[name], options['requests'], options['concurrency']))
+                self.stdout.write(
+                    f"{name:<20} {mode:<6} {result['rps']:>9.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+                    f"{result['p99']:>8.1f} {result['threads']:>8} {result['errors']:>7}"
+                )
+
+        self.stdout.write(
+            "threads = peak extra OS threads during the run. Sync views hold one for the whole "
+            "request; async views only borrow one per ORM query."
+        )
+
+    def get_sample_entry(self, restaurant_id):
+        restaurants = Restaurant.objects.all()
+        if restaurant_id:
+            restaurants = restaurants.filter(id=restaurant_id)
+        entry = WaitlistEntry.objects.filter(
+            restaurant__in=restaurants, status='WAITING'
+        ).order_by('-timestamp').first()
+        if entry is None:
+            raise CommandError('Need a restaurant with at least one WAITING entry to benchmark against')
+        return entry
+
+    async def run(self, view, is_async, view_kwargs, total, concurrency):
+        factory = AsyncRequestFactory()
+        path = '/bench/'
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        def call_sync(request):
+            # What ASGIHandler does for a sync view: the view *and* rendering run in the worker thread
+            try:
+                response = view(request, **view_kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                return response
+            finally:
+                close_old_connections()
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                request = factory.get(path, headers=self.headers)
+                start = time.perf_counter()
+                # Django gives every ASGI request its own thread-sensitive context
+                async with ThreadSensitiveContext():
+                    if is_async:
+                        response = await view(request, **view_kwargs)
+                        await sync_to_async(close_old_connections)()
+                    else:
+                        response = await sync_to_async(call_sync)(request)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+        baseline = threading.active_count()
+        peak = baseline
+        done = asyncio.Event()
+
+        async def sample_threads():
+            nonlocal peak
+            while not done.is_set():
+                peak = max(peak, threading.active_count())
+                await asyncio.sleep(0.002)
+
+        sampler = asyncio.create_task(sample_threads())
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+
+        latencies.sort()
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'rps': total / elapsed if elapsed else 0.0,
+            'p50': quantiles[49],
+            'p95': quantiles[94],
+            'p99': quantiles[98],
+            'threads': peak - baseline,
+            'errors': errors,
+        }
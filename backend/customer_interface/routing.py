@@ -0,0 +1,8 @@
+from django.urls import re_path
+from . import consumers
+
+websocket_urlpatterns = [
+    # Customer's own place in the queue, pushed instead of polled
+    # Path: /ws/queue/<restaurant_id>/<entry_id>
+    re_path(r'ws/queue/(?P<restaurant_id>\d+)/(?P<entry_id>\d+)$', consumers.QueuePositionConsumer.as_asgi()),
+]
@@ -1,3 +1,232 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from auth_settings.models import CustomUser, Restaurant
+from waitlist.estimator import aqueue_statuses
+from waitlist.models import WaitlistEntry
+from . import async_views, routing, views
+from .consumers import queue_position_hub
+
+
+class AsyncCustomerViewParityTests(TestCase):
+    """The async customer views must return exactly what the sync DRF views return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        cls.restaurant = Restaurant.objects.create(user=user, name='Test Restaurant', address='1 Main St', phone='5550000')
+        cls.entries = [
+            WaitlistEntry.objects.create(
+                restaurant=cls.restaurant, customer_name=f'Guest {i}', phone_number=f'555200{i:04d}', people_count=2
+            )
+            for i in range(3)
+        ]
+        cls.served = WaitlistEntry.objects.create(
+            restaurant=cls.restaurant, customer_name='Done', phone_number='5553000000', people_count=2, status='SERVED'
+        )
+        cls.auth = {'authorization': f'Token {Token.objects.create(user=user).key}'}
+
+    def assertSameResponse(self, sync_cls, async_cls, headers=None, **kwargs):
+        request = RequestFactory().get('/', headers=headers)
+        sync_response = sync_cls.as_view()(request, **kwargs)
+        sync_response.render()
+        async_response = async_to_sync(async_cls.as_view())(RequestFactory().get('/', headers=headers), **kwargs)
+
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+
+    def test_scan_qr(self):
+        self.assertSameResponse(views.ScanQRAPIView, async_views.AsyncScanQRView, restaurant_id=self.restaurant.id)
+
+    def test_join_queue(self):
+        self.assertSameResponse(views.JoinQueueAPIView, async_views.AsyncJoinQueueView, restaurant_id=self.restaurant.id)
+
+    def test_queue_confirmation(self):
+        for entry in (self.entries[1], self.served):
+            self.assertSameResponse(
+                views.QueueConfirmationAPIView, async_views.AsyncQueueConfirmationView,
+                restaurant_id=self.restaurant.id, queue_entry_id=entry.id
+            )
+
+    def test_queue_status(self):
+        for entry in (self.entries[2], self.served):
+            self.assertSameResponse(
+                views.QueueStatusAPIView, async_views.AsyncQueueStatusView,
+                restaurant_id=self.restaurant.id, entry_id=entry.id
+            )
+
+    def test_check_phone(self):
+        for phone in ('5552000001', '+1 (555) 200-0001', '5559999999'):
+            self.assertSameResponse(
+                views.CheckPhoneAPIView, async_views.AsyncCheckPhoneView, headers=self.auth,
+                restaurant_id=self.restaurant.id, phone_number=phone
+            )
+
+    def test_check_phone_needs_a_valid_token(self):
+        # It names the waiting guest, so unlike the other reads it isn't public
+        for headers in (None, {'authorization': 'Token not-a-token'}):
+            self.assertSameResponse(
+                views.CheckPhoneAPIView, async_views.AsyncCheckPhoneView, headers=headers,
+                restaurant_id=self.restaurant.id, phone_number='5552000001'
+            )
+            response = async_to_sync(async_views.AsyncCheckPhoneView.as_view())(
+                RequestFactory().get('/', headers=headers), restaurant_id=self.restaurant.id, phone_number='5552000001'
+            )
+            self.assertEqual(response.status_code, 401)
+
+    def test_not_found(self):
+        self.assertSameResponse(
+            views.QueueStatusAPIView, async_views.AsyncQueueStatusView,
+            restaurant_id=self.restaurant.id, entry_id=999999
+        )
+        self.assertSameResponse(
+            views.CheckPhoneAPIView, async_views.AsyncCheckPhoneView, headers=self.auth,
+            restaurant_id=999999, phone_number='5552000001'
+        )
+
+
+class JoinQueueDuplicateTests(TestCase):
+    """Duplicate joins are found by normalized phone, however the number is typed."""
+
+    def test_formatted_duplicate_is_rejected(self):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        entry = WaitlistEntry.objects.create(restaurant=restaurant, customer_name='Guest', phone_number='5552000001', people_count=2)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        url = f'/api/customer/join-queue/{restaurant.id}/submit/'
+        response = client.post(url, {'customer_name': 'Guest', 'phone_number': '+1 (555) 200-0001', 'people_count': 2}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['entry_id'], entry.id)
+
+        # A number that merely contains the waiting one's digits is a different guest
+        response = client.post(url, {'customer_name': 'Other', 'phone_number': '555200000', 'people_count': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_phones_without_digits_match_nothing(self):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        WaitlistEntry.objects.create(restaurant=restaurant, customer_name='Walk In', phone_number='walk-in', people_count=2)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        request = lambda: RequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        response = views.CheckPhoneAPIView.as_view()(request(), restaurant_id=restaurant.id, phone_number='abc')
+        self.assertEqual(response.data, {'exists': False})
+        response = async_to_sync(async_views.AsyncCheckPhoneView.as_view())(request(), restaurant_id=restaurant.id, phone_number='abc')
+        self.assertEqual(json.loads(response.content), {'exists': False})
+
+        response = client.post(
+            f'/api/customer/join-queue/{restaurant.id}/submit/',
+            {'customer_name': 'Other', 'phone_number': 'none', 'people_count': 2}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('entry_id', response.data)
+        self.assertEqual(WaitlistEntry.objects.count(), 1)
+
+
+class CustomerEntryExposureTests(TestCase):
+    """The public read endpoints show only the party's basics; writes still need an account."""
+
+    def test_public_reads_are_narrow_and_writes_need_authentication(self):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        entry = WaitlistEntry.objects.create(
+            restaurant=restaurant, customer_name='Guest', phone_number='5552000001', people_count=2, notes='Window seat'
+        )
+        client = APIClient()
+
+        for url, key in ((f'/api/customer/queue-status/{restaurant.id}/{entry.id}/', 'entry'),
+                         (f'/api/customer/queue-confirmation/{restaurant.id}/{entry.id}/', 'queue_entry')):
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(set(response.json()[key]), {'id', 'customer_name', 'people_count', 'status', 'timestamp'})
+
+        response = client.post(f'/api/customer/leave-queue/{restaurant.id}/{entry.id}/', {}, format='json')
+        self.assertEqual(response.status_code, 401)
+        response = client.post(
+            f'/api/customer/join-queue/{restaurant.id}/submit/',
+            {'customer_name': 'Other', 'phone_number': '5552000002', 'people_count': 2}, format='json'
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(WaitlistEntry.objects.get(id=entry.id).status, 'WAITING')
+        self.assertEqual(WaitlistEntry.objects.count(), 1)
+
+
+class QueuePositionSocketTests(TransactionTestCase):
+    """
+    Customers get their own position pushed when the restaurant's queue changes.
+    The consumer's database_sync_to_async closes its connection, so this can't run inside TestCase's transaction.
+    """
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        self.entries = [
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name=f'Guest {i}', phone_number=f'555400{i:04d}', people_count=2 + i
+            )
+            for i in range(4)
+        ]
+
+    def test_one_pass_matches_queue_status_endpoint(self):
+        self.entries[1].status = 'SERVED'
+        self.entries[1].save()
+        ids = [entry.id for entry in self.entries] + [999999]
+        statuses = async_to_sync(aqueue_statuses)(self.restaurant.id, ids)
+
+        for entry in self.entries:
+            polled = APIClient().get(f'/api/customer/queue-status/{self.restaurant.id}/{entry.id}/').json()
+            pushed = statuses[entry.id]
+            self.assertEqual((pushed['position'], pushed['wait_time']), (polled['position'], polled['wait_time']))
+            self.assertEqual(pushed['status'], polled['entry']['status'])
+        self.assertEqual(statuses[999999]['status'], 'REMOVED')
+
+    def connect(self, entry):
+        return WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns), f'ws/queue/{self.restaurant.id}/{entry.id}')
+
+    def host_request(self, method, path, data):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=self.restaurant.user)[0].key}')
+        response = getattr(client, method)(path, data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_pushes_own_position_on_queue_change(self):
+        first, second, last = self.entries[0], self.entries[1], self.entries[3]
+        host_request = database_sync_to_async(self.host_request)
+
+        async def scenario():
+            communicator = self.connect(last)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            initial = await communicator.receive_json_from()
+            self.assertEqual((initial['type'], initial['data']['position'], initial['data']['status']), ('queue.position', 4, 'WAITING'))
+
+            # A real host write: committed, then broadcast through the coalescing dispatcher
+            await host_request('post', f'/api/waitlist/entries/{first.id}/set_status/', {'status': 'SERVED'})
+            moved = await communicator.receive_json_from()
+            self.assertEqual(moved['data']['position'], 3)
+            self.assertEqual(moved['data']['queue_size'], 3)
+
+            # A change that doesn't move this customer pushes nothing
+            await host_request('patch', f'/api/waitlist/entries/{second.id}/', {'notes': 'edited'})
+            self.assertTrue(await communicator.receive_nothing(timeout=0.5))
+            await communicator.disconnect()
+            self.assertNotIn(self.restaurant.id, queue_position_hub.watches)
+
+        async_to_sync(scenario)()
+
+    def test_unknown_entry_is_rejected(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns), f'ws/queue/{self.restaurant.id}/999999')
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+        async_to_sync(scenario)()
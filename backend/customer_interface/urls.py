@@ -10,15 +10,38 @@ from .views import (
     QueueLeftAPIView,
     CheckPhoneAPIView
 )
+from .async_views import (
+    AsyncScanQRView,
+    AsyncJoinQueueView,
+    AsyncQueueConfirmationView,
+    AsyncQueueStatusView,
+    AsyncCheckPhoneView,
+    use_async_views
+)
+
+# Read-only public endpoints are served by the native async views under ASGI;
+# set CUSTOMER_INTERFACE_ASYNC_VIEWS = False to fall back to the sync DRF views.
+if use_async_views():
+    scan_qr_view = AsyncScanQRView.as_view()
+    join_queue_view = AsyncJoinQueueView.as_view()
+    queue_confirmation_view = AsyncQueueConfirmationView.as_view()
+    queue_status_view = AsyncQueueStatusView.as_view()
+    check_phone_view = AsyncCheckPhoneView.as_view()
+else:
+    scan_qr_view = ScanQRAPIView.as_view()
+    join_queue_view = JoinQueueAPIView.as_view()
+    queue_confirmation_view = QueueConfirmationAPIView.as_view()
+    queue_status_view = QueueStatusAPIView.as_view()
+    check_phone_view = CheckPhoneAPIView.as_view()
 
 urlpatterns = [
     path('home/', CustomerHomeAPIView.as_view(), name='customer_home_api'),
-    path('scan-qr/<int:restaurant_id>/', ScanQRAPIView.as_view(), name='scan_qr_api'),
-    path('join-queue/<int:restaurant_id>/', JoinQueueAPIView.as_view(), name='join_queue_api'),
+    path('scan-qr/<int:restaurant_id>/', scan_qr_view, name='scan_qr_api'),
+    path('join-queue/<int:restaurant_id>/', join_queue_view, name='join_queue_api'),
     path('join-queue/<int:restaurant_id>/submit/', JoinQueueSubmitAPIView.as_view(), name='join_queue_submit_api'),
-    path('queue-confirmation/<int:restaurant_id>/<int:queue_entry_id>/', QueueConfirmationAPIView.as_view(), name='queue_confirmation_api'),
-    path('queue-status/<int:restaurant_id>/<int:entry_id>/', QueueStatusAPIView.as_view(), name='queue_status_api'), # entry_id consistent with view
+    path('queue-confirmation/<int:restaurant_id>/<int:queue_entry_id>/', queue_confirmation_view, name='queue_confirmation_api'),
+    path('queue-status/<int:restaurant_id>/<int:entry_id>/', queue_status_view, name='queue_status_api'), # entry_id consistent with view
     path('leave-queue/<int:restaurant_id>/<int:entry_id>/', LeaveQueueAPIView.as_view(), name='leave_queue_api'), # entry_id consistent with view
     path('queue-left/<int:restaurant_id>/', QueueLeftAPIView.as_view(), name='queue_left_api'),
-    path('check-phone/<int:restaurant_id>/<str:phone_number>/', CheckPhoneAPIView.as_view(), name='check_phone_api'),
+    path('check-phone/<int:restaurant_id>/<str:phone_number>/', check_phone_view, name='check_phone_api'),
 ] 
\ No newline at end of file
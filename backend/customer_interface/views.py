@@ -1,15 +1,20 @@
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
+from django.db import IntegrityError
 from django.db.models import Q
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import AllowAny
 from auth_settings.models import Restaurant # New import
 from waitlist.models import WaitlistEntry # Changed from QueueEntry
-from waitlist.serializers import WaitlistEntrySerializer # Changed from QueueEntrySerializer
+from waitlist.serializers import CustomerWaitlistEntrySerializer # Public pages get the narrow serializer
+from waitlist.broadcast import broadcast_waitlist_update
+from waitlist.utils import get_queue_position
+from waitlist.estimator import estimate_wait_minutes, quote_new_entry
+from notifications.utils import normalize_phone
 import json
 import logging
-import re
 from django.conf import settings
 
 # Import Django signals
@@ -22,8 +27,6 @@ queue_entry_created = Signal() # This might need to be re-evaluated if it's stil
 logger = logging.getLogger(__name__)
 
 # Imports for WebSocket broadcast
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
 class CustomerHomeAPIView(APIView):
     """API endpoint for customer home page data."""
@@ -38,6 +41,9 @@ class ScanQRAPIView(APIView):
     API endpoint for QR code scanning.
     Returns restaurant info and redirects to join queue.
     """
+    # Public, like the async version in async_views.py that serves this route by default
+    permission_classes = [AllowAny]
+
     def get(self, request, restaurant_id):
         restaurant = get_object_or_404(Restaurant, id=restaurant_id)
         
@@ -59,6 +65,8 @@ class JoinQueueAPIView(APIView):
     API endpoint for join queue page data.
     Returns restaurant info and current queue size.
     """
+    permission_classes = [AllowAny]
+
     def get(self, request, restaurant_id):
         restaurant = get_object_or_404(Restaurant, id=restaurant_id)
         
@@ -103,60 +111,62 @@ class JoinQueueSubmitAPIView(APIView):
                 }
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        clean_phone = re.sub(r'\D', '', phone_number)
-        
-        existing_entry = WaitlistEntry.objects.filter(
+        # Blank keys are outside waitlist_one_waiting_per_phone, and probing for one would match every
+        # digitless phone a host typed in ("walk-in")
+        phone_key = normalize_phone(phone_number)
+        if not phone_key:
+            return Response({
+                'success': False,
+                'error': 'Please enter a valid phone number',
+                'validation_errors': {'phone_number': ['Enter a phone number with digits']}
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # One probe of waitlist_one_waiting_per_phone; formatting differences don't matter
+        waiting = WaitlistEntry.objects.filter(
             restaurant=restaurant,
-            phone_number__contains=clean_phone, # Consider exact match or more robust cleaning
+            phone_e164=phone_key,
             status='WAITING'
-        ).first()
-        
-        if existing_entry:
+        ).only('id', 'customer_name')
+
+        def duplicate_response(existing_entry):
             return Response({
                 'success': False,
                 'error': f"This phone number is already in the queue (for {existing_entry.customer_name})",
                 'duplicate': True,
                 'entry_id': existing_entry.id
             }, status=status.HTTP_409_CONFLICT)
+
+        existing_entry = waiting.first()
+        if existing_entry:
+            return duplicate_response(existing_entry)
         
         try:
-            entry = WaitlistEntry.objects.create(
-                restaurant=restaurant,
-                customer_name=customer_name,
-                phone_number=phone_number,
-                people_count=int(people_count),
-                notes=notes,
-                status='WAITING',
-                timestamp=timezone.now()
-            )
-            
-            channel_layer = get_channel_layer()
-            group_name = f"waitlist_{restaurant.id}" 
-            # Use WaitlistEntrySerializer
-            message_data = WaitlistEntrySerializer(entry).data 
+            people_count = int(people_count)
+            try:
+                entry = WaitlistEntry.objects.create(
+                    restaurant=restaurant,
+                    customer_name=customer_name,
+                    phone_number=phone_number,
+                    people_count=people_count,
+                    notes=notes,
+                    status='WAITING',
+                    source='QR',
+                    quoted_time=quote_new_entry(restaurant.id, people_count),
+                    timestamp=timezone.now()
+                )
+            except IntegrityError:
+                # Lost a race with a concurrent join from the same phone; the constraint kept one
+                existing_entry = waiting.first()
+                if existing_entry is None:
+                    raise
+                return duplicate_response(existing_entry)
             
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    'type': 'send.waitlist.update', # Match consumer method name
-                    'data': message_data
-                }
-            )
-            logger.info(f"Sent Channels update to group {group_name} for new entry {entry.id}")
+            # Delivered after commit by the waitlist broadcaster, off the request path
+            broadcast_waitlist_update(restaurant.id, entry)
 
-            queue_entries = WaitlistEntry.objects.filter(
-                restaurant=restaurant, 
-                status='WAITING'
-            ).order_by('timestamp')
-            
-            position = 0
-            for i, e in enumerate(queue_entries):
-                if e.id == entry.id:
-                    position = i + 1
-                    break
+            position, queue_size = get_queue_position(entry)
             
-            avg_wait_time = getattr(restaurant, 'avg_wait_time', 15) 
-            estimated_wait = position * avg_wait_time
+            estimated_wait = estimate_wait_minutes(restaurant.id, entry.people_count, position)
             
             # queue_entry_created.send(sender=WaitlistEntry, instance=entry, restaurant=restaurant) # Re-evaluate signal usage
             
@@ -167,6 +177,7 @@ class JoinQueueSubmitAPIView(APIView):
                 'success': True,
                 'queue_entry_id': entry.id,
                 'position': position,
+                'queue_size': queue_size,
                 'estimated_wait_time': estimated_wait,
                 # The redirect URL should ideally be handled by the frontend
                 'confirmation_url_segment': f"/join-queue/{restaurant_id}/queue-confirmation/{entry.id}/"
@@ -185,6 +196,8 @@ class QueueConfirmationAPIView(APIView):
     API endpoint for queue confirmation page data.
     Returns entry details, position in line, and estimated wait time.
     """
+    permission_classes = [AllowAny]
+
     def get(self, request, restaurant_id, queue_entry_id):
         restaurant = get_object_or_404(Restaurant, id=restaurant_id)
         entry = get_object_or_404(WaitlistEntry, id=queue_entry_id, restaurant=restaurant)
@@ -196,25 +209,15 @@ class QueueConfirmationAPIView(APIView):
                     'id': restaurant.id,
                     'name': restaurant.name
                 },
-                'queue_entry': WaitlistEntrySerializer(entry).data, # Use serializer
+                'queue_entry': CustomerWaitlistEntrySerializer(entry).data, # Use serializer
                 'position': 0,
                 'estimated_wait_time': 0,
                 'active': False
             })
         
-        queue_entries = WaitlistEntry.objects.filter(
-            restaurant=restaurant, 
-            status='WAITING'
-        ).order_by('timestamp')
+        position, queue_size = get_queue_position(entry)
         
-        position = 0
-        for i, e in enumerate(queue_entries):
-            if e.id == entry.id:
-                position = i + 1
-                break
-        
-        avg_wait_time = getattr(restaurant, 'avg_wait_time', 15)
-        estimated_wait = position * avg_wait_time
+        estimated_wait = estimate_wait_minutes(restaurant.id, entry.people_count, position)
         
         return Response({
             'success': True,
@@ -224,10 +227,10 @@ class QueueConfirmationAPIView(APIView):
                 'address': restaurant.address,
                 'phone': restaurant.phone
             },
-            'queue_entry': WaitlistEntrySerializer(entry).data, # Use serializer
+            'queue_entry': CustomerWaitlistEntrySerializer(entry).data, # Use serializer
             'position': position,
             'estimated_wait_time': estimated_wait,
-            'queue_size': queue_entries.count()
+            'queue_size': queue_size
         })
 
 class QueueStatusAPIView(APIView):
@@ -235,6 +238,8 @@ class QueueStatusAPIView(APIView):
     API endpoint for checking queue status.
     Returns real-time position in line and estimated wait time.
     """
+    permission_classes = [AllowAny]
+
     def get(self, request, restaurant_id, entry_id): # Parameter renamed to entry_id for consistency
         restaurant = get_object_or_404(Restaurant, id=restaurant_id)
         
@@ -257,25 +262,15 @@ class QueueStatusAPIView(APIView):
                     'id': restaurant.id,
                     'name': restaurant.name
                 },
-                'entry': WaitlistEntrySerializer(entry).data, # Use serializer
+                'entry': CustomerWaitlistEntrySerializer(entry).data, # Use serializer
                 'position': 0,
                 'wait_time': 0,
                 'active': False
             })
         
-        queue_entries = WaitlistEntry.objects.filter(
-            restaurant=restaurant, 
-            status='WAITING'
-        ).order_by('timestamp')
+        position, queue_size = get_queue_position(entry)
         
-        position = 0
-        for i, e in enumerate(queue_entries):
-            if e.id == entry.id:
-                position = i + 1
-                break
-        
-        avg_wait_time = getattr(restaurant, 'avg_wait_time', 15)
-        estimated_wait = position * avg_wait_time
+        estimated_wait = estimate_wait_minutes(restaurant.id, entry.people_count, position)
         
         time_in_queue = timezone.now() - entry.timestamp
         minutes_in_queue = int(time_in_queue.total_seconds() / 60)
@@ -286,10 +281,10 @@ class QueueStatusAPIView(APIView):
                 'id': restaurant.id,
                 'name': restaurant.name
             },
-            'entry': WaitlistEntrySerializer(entry).data, # Use serializer
+            'entry': CustomerWaitlistEntrySerializer(entry).data, # Use serializer
             'position': position,
             'wait_time': estimated_wait,
-            'queue_size': queue_entries.count(),
+            'queue_size': queue_size,
             'minutes_in_queue': minutes_in_queue,
             'active': True
         })
@@ -311,29 +306,8 @@ class LeaveQueueAPIView(APIView):
         entry.save()
         
         # --- Send WebSocket Update for removal/cancellation ---
-        channel_layer = get_channel_layer()
-        group_name = f"waitlist_{restaurant.id}"
-        
-        # Option 1: Send full updated list (if consumer expects it)
-        # updated_waitlist_entries = WaitlistEntry.objects.filter(restaurant=restaurant, status='WAITING').order_by('timestamp')
-        # serialized_entries = WaitlistEntrySerializer(updated_waitlist_entries, many=True).data
-        # async_to_sync(channel_layer.group_send)(
-        #     group_name,
-        #     {
-        #         'type': 'send.waitlist.update', # Or a specific type for full list update
-        #         'data': serialized_entries
-        #     }
-        # )
-
-        # Option 2: Send a specific removal message (preferred if consumer handles it)
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'send.waitlist.remove', # Consumer needs to handle this type
-                'data': {'id': entry.id} # Send ID of removed entry
-            }
-        )
-        logger.info(f"Sent Channels update to group {group_name} for removed entry {entry.id}")
+        # Delivered after commit by the waitlist broadcaster, off the request path
+        broadcast_waitlist_update(restaurant.id, event_type='send.waitlist.remove', removed_id=entry.id)
         # --- End WebSocket Update ---
         
         # Consider using settings for FRONTEND_URL
@@ -362,20 +336,21 @@ class QueueLeftAPIView(APIView):
 class CheckPhoneAPIView(APIView):
     """
     API endpoint to check if a phone number exists in the waitlist for a specific restaurant.
+    Stays on the default IsAuthenticated: it answers with the guest's name and entry id.
     """
+
     def get(self, request, restaurant_id, phone_number):
         logger.debug(f"Checking phone number {phone_number} for restaurant ID {restaurant_id}")
         
         restaurant = get_object_or_404(Restaurant, id=restaurant_id)
         
-        # Clean the phone number for a more robust check if necessary, e.g., removing non-digits
-        # clean_phone_number = re.sub(r'\D', '', phone_number)
-        
+        phone_key = normalize_phone(phone_number)
+        # A phone without digits has no key; '' would match every host-entered "walk-in"
         entry = WaitlistEntry.objects.filter(
             restaurant=restaurant,
-            phone_number__iexact=phone_number, # Case-insensitive exact match, or use __contains if partial match is desired
+            phone_e164=phone_key, # Same key the unique WAITING constraint uses
             status='WAITING'
-        ).first()
+        ).first() if phone_key else None
         
         response_data = {'exists': entry is not None}
         if entry:
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import NotificationJob
 
-# Register your models here.
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'restaurant', 'entry', 'notification_type', 'status', 'attempts', 'next_attempt_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'notification_type', 'restaurant')
+    readonly_fields = ('results', 'created_at', 'finished_at', 'sms_sent_at', 'email_sent_at', 'locked_until')
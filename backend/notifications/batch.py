@@ -0,0 +1,149 @@
+# notifications/batch.py
+"""
+Paging several parties at once ("notify the next N").
+
+Unlike the single-entry endpoint, a batch is delivered while the host waits, because the host wants
+to know who was reached. Each party still gets a NotificationJob, created as already leased
+(SENDING), so a process that dies mid-batch leaves the jobs to the workers once the lease runs out.
+The parties are picked in the transaction that creates their jobs, with their rows locked (skipping
+rows another batch holds) and leaving out anyone with an open job, so two hosts pressing "notify
+next 3" at once page six different parties rather than the same three twice.
+The first attempt for every job goes through one process-wide bounded thread pool, and each
+provider's rate_limit paces the pool. Afterwards the jobs and entries are written with one
+bulk_update each, and the host sockets get a single 'send.waitlist.bulk' frame. Retryable failures
+stay PENDING and the notification workers pick them up. As in process_job, only jobs whose lease is
+still ours are written back: one a worker reclaimed after a slow send belongs to that worker. A job
+whose send could no longer finish inside its lease is not attempted at all, but left to the workers.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from recent.utils import record_events
+from waitlist.broadcast import broadcast_waitlist_update
+from waitlist.cache import bump_waitlist_version
+from waitlist.models import WaitlistEntry
+from waitlist.serializers import WaitlistEntrySerializer
+from waitlist.utils import active_waitlist_queryset
+from .models import NotificationJob
+from .utils import SEND_TIMEOUT_SECONDS
+from .worker import JOB_ATTEMPT_FIELDS, LEASE_SECONDS, MAX_ATTEMPTS, attempt_job, job_event, notification_pool, settle_job
+
+logger = logging.getLogger(__name__)
+
+SEND_THREADS = getattr(settings, 'NOTIFICATION_SEND_THREADS', 8) # Shared by all batches in the process
+BATCH_MAX = getattr(settings, 'NOTIFICATION_BATCH_MAX', 50) # Most parties one request may page
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SEND_THREADS, thread_name_prefix='notification-send')
+        return _executor
+
+OPEN_JOB_STATUSES = ('PENDING', 'SENDING') # A party with one of these is already being paged
+
+def next_waiting_entries(restaurant_id, skip_notified=True):
+    """WAITING entries in queue order (priority, timestamp, id), by default only ones not paged yet; for notify_entries."""
+    queryset = active_waitlist_queryset(restaurant_id)
+    if skip_notified:
+        queryset = queryset.filter(notified_at__isnull=True)
+    return queryset
+
+def notify_entries(restaurant_id, entries, build_message, limit=None, providers=None, retry_base=None):
+    """
+    Page up to `limit` of `entries` (a queryset of one restaurant's WAITING entries, in queue order)
+    and return (the entries claimed, their jobs), both in that order. The queryset is read inside
+    the transaction that creates the jobs; entries locked by, or with an open job from, another batch
+    are passed over. build_message(entry) returns the job's fields (notification_type,
+    phone_number/sms_body, email_to/email_subject/email_text/email_html), or None to leave the entry out.
+    """
+    lease = timezone.now() + timedelta(seconds=LEASE_SECONDS)
+    with transaction.atomic(): # Committed before sending, so the workers can recover the jobs
+        claimable = (
+            entries.exclude(notification_jobs__status__in=OPEN_JOB_STATUSES)
+            .select_for_update(skip_locked=True, of=('self',))
+        )
+        claimed = list(claimable if limit is None else claimable[:limit])
+        jobs = [
+            NotificationJob(
+                restaurant_id=restaurant_id,
+                entry=entry,
+                max_attempts=MAX_ATTEMPTS,
+                status='SENDING',
+                locked_until=lease,
+                **message
+            )
+            for entry, message in ((entry, build_message(entry)) for entry in claimed)
+            if message is not None
+        ]
+        if not jobs:
+            return claimed, []
+        jobs = NotificationJob.objects.bulk_create(jobs)
+
+    providers = providers or notification_pool.providers
+    def attempt(job):
+        # The batch created these leases itself, so no worker can claim a job before its lease runs
+        # out; a job still queued behind slow sends that late is left to the workers, not sent twice
+        if job.locked_until - timezone.now() < timedelta(seconds=SEND_TIMEOUT_SECONDS * len(job.channels)):
+            return None
+        return attempt_job(job, providers)
+    delivered = list(get_executor().map(attempt, jobs))
+
+    now = timezone.now()
+    for job, channels in zip(jobs, delivered):
+        if channels is not None:
+            settle_job(job, now, retry_base)
+
+    with transaction.atomic():
+        # Only the lease holder may write; the row locks keep workers from reclaiming meanwhile
+        held = set(
+            NotificationJob.objects.select_for_update()
+            .filter(id__in=[job.id for job in jobs], status='SENDING', locked_until=lease)
+            .values_list('id', flat=True)
+        )
+        settled, entries = [], []
+        for job, channels in zip(jobs, delivered):
+            if channels is None:
+                logger.warning(f"Notification job {job.id}: too little of its lease left to send; leaving it to the workers")
+                continue # Still SENDING; reclaimed once the lease runs out
+            if job.id not in held:
+                logger.warning(f"Notification job {job.id}: lease expired during the batch; leaving it to its new worker")
+                job.status = 'SENDING' # What the response reports: a worker has it now
+                continue
+            entry = job.entry
+            entry.notification_attempts = F('notification_attempts') + 1
+            entry.updated_at = now
+            for channel in channels:
+                entry.notified_at = getattr(job, f'{channel}_sent_at')
+                setattr(entry, f'notified_{channel}_at', entry.notified_at)
+            settled.append(job)
+            entries.append(entry)
+        if not settled:
+            return claimed, jobs
+
+        NotificationJob.objects.bulk_update(settled, JOB_ATTEMPT_FIELDS)
+        WaitlistEntry.objects.bulk_update(
+            entries, ['notification_attempts', 'notified_at', 'notified_sms_at', 'notified_email_at', 'updated_at']
+        )
+        bump_waitlist_version(restaurant_id)
+        record_events([job_event(job) for job in settled if job.finished_at is not None])
+        # One frame for the whole batch; the entries are re-read so notification_attempts is a number again
+        updated = active_waitlist_queryset(restaurant_id).filter(id__in=[entry.id for entry in entries])
+        broadcast_waitlist_update(
+            restaurant_id,
+            event_type='send.waitlist.bulk',
+            data={'updated': WaitlistEntrySerializer(updated, many=True).data, 'removed': []},
+        )
+        if any(job.status == 'PENDING' for job in settled):
+            transaction.on_commit(notification_pool.wake) # Retries are the workers' job
+    return claimed, jobs
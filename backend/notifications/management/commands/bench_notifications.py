@@ -0,0 +1,90 @@
+# notifications/management/commands/bench_notifications.py
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from auth_settings.models import Restaurant
+from notifications.models import NotificationJob
+from notifications.providers import FakeProvider
+from notifications.worker import NotificationWorkerPool
+
+class Command(BaseCommand):
+    help = (
+        'Offline throughput benchmark for the notification queue: enqueues --jobs jobs (tied to no entry) and '
+        'delivers them through the fake provider on --threads workers, reporting jobs/s and queue-to-delivery latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=1000, help='Jobs to enqueue (default 1000)')
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads (default 4)')
+        parser.add_argument('--type', choices=['sms', 'email', 'both'], default='sms', help='notification_type of the jobs (default sms)')
+        parser.add_argument('--latency-ms', type=float, default=100, help='Simulated provider round trip per message (default 100)')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of sends that fail retryably (default 0)')
+        parser.add_argument('--retry-base', type=float, default=0.05, help='Backoff base in seconds for the benchmark (default 0.05)')
+        parser.add_argument('--restaurant', type=int, help='Restaurant the jobs belong to (defaults to the first one)')
+        parser.add_argument('--timeout', type=float, default=300, help='Give up after this many seconds (default 300)')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark jobs instead of deleting them')
+
+    def handle(self, *args, **options):
+        if options['jobs'] < 1 or options['threads'] < 1:
+            raise CommandError('--jobs and --threads must be positive')
+        restaurants = Restaurant.objects.order_by('id')
+        restaurant = restaurants.filter(id=options['restaurant']).first() if options['restaurant'] else restaurants.first()
+        if restaurant is None:
+            raise CommandError('No restaurant to attach the benchmark jobs to')
+
+        jobs = NotificationJob.objects.bulk_create([
+            NotificationJob(
+                restaurant=restaurant,
+                notification_type=options['type'],
+                phone_number=f'+1555{index:07d}',
+                sms_body=f'Benchmark message {index}',
+                email_to=f'bench{index}@example.com',
+                email_subject='Benchmark',
+                email_text=f'Benchmark message {index}',
+            )
+            for index in range(options['jobs'])
+        ])
+        ids = [job.id for job in jobs]
+        fake = FakeProvider(latency_ms=options['latency_ms'], failure_rate=options['failure_rate'])
+        pool = NotificationWorkerPool(
+            threads=options['threads'], poll_interval=0.05, retry_base=options['retry_base'],
+            providers={'sms': fake, 'email': fake},
+            only=Q(id__in=ids), # Never touch real jobs waiting in the same table
+        )
+        self.stdout.write(
+            f"{len(ids)} {options['type']} jobs, {options['threads']} threads, "
+            f"{options['latency_ms']:g} ms provider latency, {options['failure_rate']:.0%} failures"
+        )
+
+        started = time.perf_counter()
+        pool.start()
+        unfinished = NotificationJob.objects.filter(id__in=ids, finished_at__isnull=True)
+        try:
+            while unfinished.exists():
+                if time.perf_counter() - started > options['timeout']:
+                    raise CommandError(f"Timed out with {unfinished.count()} jobs unfinished")
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - started
+        finally:
+            pool.stop()
+
+        finished = NotificationJob.objects.filter(id__in=ids)
+        latencies = sorted(
+            (job.finished_at - job.created_at).total_seconds() * 1000
+            for job in finished.only('created_at', 'finished_at')
+        )
+        stats = pool.stats()
+        self.stdout.write(
+            f"Delivered in {elapsed:.2f}s: {len(ids) / elapsed:.1f} jobs/s, "
+            f"{stats['attempts']} attempts ({stats['retried']} retried), "
+            f"{stats['sent']} sent, {stats['failed']} failed"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Queue-to-delivery ms p50={statistics.median(latencies):.0f} "
+            f"p95={latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.0f} max={latencies[-1]:.0f}"
+        ))
+        if not options['keep']:
+            finished.delete()
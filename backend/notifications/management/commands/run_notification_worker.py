@@ -0,0 +1,37 @@
+# notifications/management/commands/run_notification_worker.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.worker import POLL_INTERVAL, NotificationWorkerPool
+
+class Command(BaseCommand):
+    help = (
+        'Deliver queued notifications (notifications.NotificationJob) on --threads worker threads until '
+        'interrupted. Any number of these can run next to each other and next to in-process workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads (default 4)')
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='Seconds between checks for due jobs when idle')
+        parser.add_argument('--once', action='store_true', help='Deliver the jobs due now in this thread, then exit')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['poll_interval'] <= 0:
+            raise CommandError('--threads and --poll-interval must be positive')
+        pool = NotificationWorkerPool(threads=options['threads'], poll_interval=options['poll_interval'])
+
+        if options['once']:
+            handled = pool.run_until_idle()
+            self.stdout.write(self.style.SUCCESS(f"Processed {handled} job attempt(s): {pool.stats()}"))
+            return
+
+        pool.start()
+        self.stdout.write(f"Delivering notifications on {options['threads']} thread(s); Ctrl-C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        pool.stop()
+        self.stdout.write(self.style.SUCCESS(f"Stopped: {pool.stats()}"))
@@ -1,3 +1,66 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+from auth_settings.models import Restaurant
+
+class NotificationJob(models.Model):
+    """
+    One queued customer notification (SMS, email or both), delivered by notifications.worker.
+    Messages are rendered when the job is enqueued, so the worker needs nothing but this row.
+    A job is due once next_attempt_at has passed; a worker leases it (SENDING, locked_until) while
+    sending, and a lease that runs out (the worker died) makes it due again.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'), # Waiting for its first attempt or a retry
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'), # At least one channel was delivered
+        ('FAILED', 'Failed'), # Nothing delivered, and no retries left
+    ]
+    TYPE_CHOICES = [
+        ('sms', 'SMS'),
+        ('email', 'Email'),
+        ('both', 'SMS and email'),
+    ]
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='notification_jobs')
+    # Null for jobs not tied to an entry (benchmarks), or once the entry has been deleted
+    entry = models.ForeignKey('waitlist.WaitlistEntry', on_delete=models.SET_NULL, blank=True, null=True, related_name='notification_jobs')
+    notification_type = models.CharField(max_length=5, choices=TYPE_CHOICES, default='sms')
+    phone_number = models.CharField(max_length=20, blank=True)
+    sms_body = models.TextField(blank=True)
+    email_to = models.EmailField(blank=True)
+    email_subject = models.CharField(max_length=255, blank=True)
+    email_text = models.TextField(blank=True)
+    email_html = models.TextField(blank=True)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True) # Lease held by the worker sending it
+    sms_sent_at = models.DateTimeField(blank=True, null=True)
+    email_sent_at = models.DateTimeField(blank=True, null=True)
+    results = models.JSONField(default=dict, blank=True) # Last provider result per channel: {'sms': {...}, 'email': {...}}
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Notification job #{self.id} ({self.notification_type}, {self.get_status_display()})"
+
+    @property
+    def channels(self):
+        return ['sms', 'email'] if self.notification_type == 'both' else [self.notification_type]
+
+    def pending_channels(self):
+        """Channels still to deliver: not sent yet, and not failed for good on an earlier attempt."""
+        pending = []
+        for channel in self.channels:
+            result = self.results.get(channel) or {}
+            if getattr(self, f'{channel}_sent_at') is None and result.get('retryable', True):
+                pending.append(channel)
+        return pending
+
+    class Meta:
+        indexes = [
+            # Workers poll for due jobs: status = PENDING/SENDING ordered by next_attempt_at
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_job_due_idx'),
+        ]
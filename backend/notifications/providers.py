@@ -0,0 +1,160 @@
+# notifications/providers.py
+"""
+Delivery backends for the notification worker. A provider has send_sms(to, body) and/or
+send_email(to, subject, text, html); both return {'success': bool, ...} and, on failure,
+'retryable' so the worker knows whether to back off and try again or give up.
+
+Providers are shared by all worker threads and keep their clients per thread: one Twilio Client
+(see notifications.utils.get_twilio_client) and one open SMTP connection, reused across messages.
+Pick them with NOTIFICATION_SMS_PROVIDER ('twilio' or 'fake') and NOTIFICATION_EMAIL_PROVIDER
+('smtp' or 'fake'). The fake provider delivers nothing, which makes it the one to benchmark with.
+
+Each real provider carries a rate_limit shared by every thread in the process, so a batch of
+pages can't exceed what Twilio or the SMTP relay accepts; the fake one is unlimited.
+"""
+import itertools
+import logging
+import random
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from .utils import SEND_TIMEOUT_SECONDS, send_sms_via_twilio
+
+logger = logging.getLogger(__name__)
+
+# Errors that won't go away by trying again
+PERMANENT_SMS_ERRORS = {'sms_disabled', 'twilio_config_error', 'twilio_not_installed'}
+SMS_RATE_PER_SECOND = getattr(settings, 'NOTIFICATION_SMS_RATE_PER_SECOND', 10) # 0 for no limit
+EMAIL_RATE_PER_SECOND = getattr(settings, 'NOTIFICATION_EMAIL_RATE_PER_SECOND', 10)
+
+
+class RateLimiter:
+    """Token bucket shared by threads: `rate` sends per second, bursts of up to one second's worth."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a send is allowed."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait) # Outside the lock, so other threads can refill and take tokens meanwhile
+
+
+class TwilioSMSProvider:
+    name = 'twilio'
+    rate_limit = RateLimiter(SMS_RATE_PER_SECOND) # Class-wide: one budget for the process
+
+    def send_sms(self, to, body):
+        result = send_sms_via_twilio(to, body)
+        if not result.get('success'):
+            status = result.get('status')
+            # Twilio rejects bad numbers and bodies with a 4xx; only throttling and server errors are worth retrying
+            result['retryable'] = result.get('error') not in PERMANENT_SMS_ERRORS and (
+                status is None or status == 429 or status >= 500
+            )
+        return result
+
+
+class SMTPEmailProvider:
+    name = 'smtp'
+    rate_limit = RateLimiter(EMAIL_RATE_PER_SECOND)
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = get_connection(fail_silently=False, timeout=SEND_TIMEOUT_SECONDS)
+            connection.open() # Stays open for this thread's next messages
+        return connection
+
+    def send_email(self, to, subject, text, html):
+        if not getattr(settings, 'EMAIL_ENABLED', False):
+            return {'success': False, 'error': 'email_disabled', 'retryable': False}
+        try:
+            message = EmailMultiAlternatives(subject, text, settings.DEFAULT_FROM_EMAIL, [to], connection=self._connection())
+            if html:
+                message.attach_alternative(html, 'text/html')
+            message.send()
+        except smtplib.SMTPRecipientsRefused as e:
+            return {'success': False, 'error': 'email_recipient_refused', 'details': str(e), 'retryable': False}
+        except Exception as e:
+            logger.error(f"Error sending email to {to} with subject '{subject}': {str(e)}")
+            self.close() # The connection may be dead; the retry opens a fresh one
+            return {'success': False, 'error': 'email_send_error', 'details': str(e), 'retryable': True}
+        logger.info(f"Email sent to {to} with subject '{subject}'.")
+        return {'success': True}
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+class FakeProvider:
+    """
+    Stands in for both Twilio and SMTP offline: waits latency_ms per message (a provider round trip)
+    and fails a failure_rate fraction of sends with a retryable error. Keeps the last messages in `sent`.
+    """
+    name = 'fake'
+    rate_limit = None
+
+    def __init__(self, latency_ms=None, failure_rate=None, keep=1000):
+        self.latency = (getattr(settings, 'NOTIFICATION_FAKE_LATENCY_MS', 0) if latency_ms is None else latency_ms) / 1000
+        self.failure_rate = getattr(settings, 'NOTIFICATION_FAKE_FAILURE_RATE', 0.0) if failure_rate is None else failure_rate
+        self.keep = keep
+        self.sent = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _deliver(self, message):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            return {'success': False, 'error': 'fake_failure', 'retryable': True}
+        with self._lock:
+            sid = f'FAKE{next(self._ids)}'
+            self.sent.append(message)
+            del self.sent[:-self.keep]
+        return {'success': True, 'sid': sid}
+
+    def send_sms(self, to, body):
+        return self._deliver({'channel': 'sms', 'to': to, 'body': body})
+
+    def send_email(self, to, subject, text, html):
+        return self._deliver({'channel': 'email', 'to': to, 'subject': subject, 'text': text})
+
+
+SMS_PROVIDERS = {'twilio': TwilioSMSProvider, 'fake': FakeProvider}
+EMAIL_PROVIDERS = {'smtp': SMTPEmailProvider, 'fake': FakeProvider}
+
+def get_providers():
+    """{'sms': provider, 'email': provider} from settings; one fake instance serves both channels."""
+    sms_name = getattr(settings, 'NOTIFICATION_SMS_PROVIDER', 'twilio')
+    email_name = getattr(settings, 'NOTIFICATION_EMAIL_PROVIDER', 'smtp')
+    sms = SMS_PROVIDERS[sms_name]()
+    email = sms if email_name == sms_name == 'fake' else EMAIL_PROVIDERS[email_name]()
+    return {'sms': sms, 'email': email}
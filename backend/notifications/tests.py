@@ -1,3 +1,280 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from auth_settings.models import CustomUser, Restaurant
+from recent.models import ActivityEvent
+from waitlist.models import WaitlistEntry
+from .models import NotificationJob
+from .providers import FakeProvider, RateLimiter
+from .worker import NotificationWorkerPool, claim_jobs, enqueue_notification, notification_pool
+
+
+class RefusingEmailProvider:
+    """Email backend that rejects every recipient for good."""
+
+    def send_email(self, to, subject, text, html):
+        return {'success': False, 'error': 'email_recipient_refused', 'retryable': False}
+
+
+class NotificationQueueTests(TestCase):
+    """The API only enqueues; workers deliver, retry with backoff and stamp the entry."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='host@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='5550102000', people_count=2
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.fake = FakeProvider(latency_ms=0, failure_rate=0)
+
+    def pool(self, **kwargs):
+        return NotificationWorkerPool(threads=0, providers={'sms': self.fake, 'email': self.fake}, **kwargs)
+
+    def enqueue(self, notification_type='sms', **message):
+        message = {'phone_number': self.entry.phone_number, 'sms_body': 'Your table is ready', **message}
+        return enqueue_notification(self.restaurant.id, self.entry.id, notification_type, **message)
+
+    def test_send_returns_job_id_without_delivering(self):
+        response = self.client.post('/api/notifications/send/', {
+            'entry_id': self.entry.id, 'restaurant_id': self.restaurant.id, 'notification_type': 'sms',
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = NotificationJob.objects.get(id=response.data['job_id'])
+        self.assertEqual((job.status, job.attempts, job.entry_id), ('PENDING', 0, self.entry.id))
+        self.assertIn(self.restaurant.name, job.sms_body)
+        self.assertEqual(self.fake.sent, [])
+
+        status_response = self.client.get(f'/api/notifications/jobs/{job.id}/')
+        self.assertEqual(status_response.data['status'], 'PENDING')
+
+    def test_delivery_stamps_entry_and_logs_event(self):
+        job = self.enqueue()
+        self.assertEqual(self.pool().run_until_idle(), 1)
+
+        job.refresh_from_db()
+        self.entry.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('SENT', 1))
+        self.assertEqual(job.results['sms']['sid'], 'FAKE1')
+        self.assertEqual(self.entry.notification_attempts, 1)
+        self.assertIsNotNone(self.entry.notified_at)
+        self.assertEqual(self.entry.notified_sms_at, self.entry.notified_at)
+        self.assertIsNone(self.entry.notified_email_at)
+        self.assertTrue(ActivityEvent.objects.filter(kind='notification.sent', object_id=self.entry.id).exists())
+
+    def test_retryable_failure_backs_off_then_gives_up(self):
+        self.fake.failure_rate = 1.0
+        job = self.enqueue()
+        job.max_attempts = 2
+        job.save(update_fields=['max_attempts'])
+        pool = self.pool(retry_base=10)
+
+        before = timezone.now()
+        pool.run_until_idle()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('PENDING', 1))
+        # First retry waits base * 2^0 = 10s, jittered down to no less than half
+        self.assertGreaterEqual(job.next_attempt_at, before + timedelta(seconds=5))
+        self.assertLessEqual(job.next_attempt_at, timezone.now() + timedelta(seconds=10))
+        self.assertEqual(pool.run_until_idle(), 0) # Not due yet
+
+        NotificationJob.objects.filter(id=job.id).update(next_attempt_at=timezone.now())
+        pool.run_until_idle()
+        job.refresh_from_db()
+        self.entry.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+        self.assertEqual(self.entry.notification_attempts, 2)
+        self.assertIsNone(self.entry.notified_at)
+        self.assertTrue(ActivityEvent.objects.filter(kind='notification.failed', object_id=self.entry.id).exists())
+        self.assertEqual(pool.stats(), {'attempts': 2, 'sent': 0, 'failed': 1, 'retried': 1})
+
+    def test_permanent_failure_on_one_channel_keeps_the_other(self):
+        job = self.enqueue('both', email_to='guest@example.com', email_subject='Ready', email_text='Ready')
+        pool = NotificationWorkerPool(threads=0, providers={'sms': self.fake, 'email': RefusingEmailProvider()})
+        pool.run_until_idle()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('SENT', 1)) # No retry for a refused recipient
+        self.assertIsNotNone(job.sms_sent_at)
+        self.assertIsNone(job.email_sent_at)
+        self.assertEqual(job.results['email']['error'], 'email_recipient_refused')
+
+    def test_job_taken_over_during_the_batch_is_not_sent_twice(self):
+        first, second = self.enqueue(), self.enqueue()
+        reclaimed = []
+        class SlowProvider(FakeProvider):
+            def send_sms(provider, to, body):
+                if not reclaimed: # The first send outlives the second job's lease and a worker takes it over
+                    NotificationJob.objects.filter(id=second.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+                    reclaimed.extend(claim_jobs(limit=1))
+                return super().send_sms(to, body)
+        provider = SlowProvider(latency_ms=0, failure_rate=0)
+        pool = NotificationWorkerPool(threads=0, batch_size=2, providers={'sms': provider, 'email': provider})
+
+        self.assertEqual(pool.process_batch(), 2)
+        self.assertEqual(len(provider.sent), 1)
+        self.assertEqual([job.id for job in reclaimed], [second.id])
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.attempts, second.locked_until), ('SENDING', 0, reclaimed[0].locked_until))
+        self.assertEqual(NotificationJob.objects.get(id=first.id).status, 'SENT')
+        self.assertEqual(pool.stats()['attempts'], 1)
+
+    def test_claim_skips_leased_jobs_until_the_lease_runs_out(self):
+        job = self.enqueue()
+        claimed, = claim_jobs(lease_seconds=60)
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual(claim_jobs(), []) # Another worker holds it
+
+        NotificationJob.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([reclaimed.id for reclaimed in claim_jobs()], [job.id]) # Its worker died
+
+
+class NotifyNextPartiesTests(TestCase):
+    """One request pages several parties: concurrent first attempt, bulk writes, one broadcast."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='host@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        now = timezone.now()
+        self.walk_ins = [
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name=f'Guest {i}', phone_number=f'555010{i:04d}',
+                people_count=2, timestamp=now - timedelta(minutes=30 - i)
+            )
+            for i in range(4)
+        ]
+        self.reservation = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Booked', phone_number='5550109999', people_count=4,
+            priority=WaitlistEntry.PRIORITY_RESERVATION, source='RESERVATION'
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.fake = FakeProvider(latency_ms=0, failure_rate=0)
+        providers = mock.patch.object(notification_pool, '_providers', {'sms': self.fake, 'email': self.fake})
+        providers.start()
+        self.addCleanup(providers.stop)
+        broadcast = mock.patch('notifications.batch.broadcast_waitlist_update')
+        self.broadcast = broadcast.start()
+        self.addCleanup(broadcast.stop)
+
+    def notify(self, **data):
+        return self.client.post('/api/notifications/notify-next/', {'restaurant_id': self.restaurant.id, **data}, format='json')
+
+    def test_next_n_in_queue_order_skipping_notified(self):
+        WaitlistEntry.objects.filter(id=self.walk_ins[0].id).update(notified_at=timezone.now())
+        response = self.notify(count=3)
+        self.assertEqual(response.status_code, 200)
+        expected = [self.reservation.id, self.walk_ins[1].id, self.walk_ins[2].id]
+        self.assertEqual([row['entry_id'] for row in response.data['notified']], expected)
+        self.assertTrue(all(row['status'] == 'SENT' for row in response.data['notified']))
+        self.assertEqual(len(self.fake.sent), 3)
+
+        for entry in WaitlistEntry.objects.filter(id__in=expected):
+            self.assertEqual(entry.notification_attempts, 1)
+            self.assertIsNotNone(entry.notified_sms_at)
+            self.assertEqual(entry.notified_at, entry.notified_sms_at)
+        self.assertEqual(ActivityEvent.objects.filter(kind='notification.sent').count(), 3)
+
+        self.broadcast.assert_called_once()
+        _, kwargs = self.broadcast.call_args
+        self.assertEqual(kwargs['event_type'], 'send.waitlist.bulk')
+        self.assertEqual(sorted(entry['id'] for entry in kwargs['data']['updated']), sorted(expected))
+
+    def test_explicit_ids_and_email_addresses(self):
+        WaitlistEntry.objects.filter(id=self.walk_ins[3].id).update(status='SERVED')
+        ids = [self.walk_ins[2].id, self.walk_ins[1].id, self.walk_ins[3].id]
+        response = self.notify(
+            entry_ids=ids, notification_type='both', customer_emails={str(self.walk_ins[1].id): 'guest1@example.com'},
+            text_template='notifications/missing.txt',
+        )
+        self.assertEqual(response.status_code, 400) # Templates are rendered before anything is sent
+        self.assertEqual(self.fake.sent, [])
+
+        with mock.patch('notifications.views.render_to_string', return_value='Your table is ready'):
+            response = self.notify(entry_ids=ids, notification_type='both', customer_emails={str(self.walk_ins[1].id): 'guest1@example.com'})
+        notified = {row['entry_id']: row for row in response.data['notified']}
+        self.assertEqual(list(notified), [self.walk_ins[1].id, self.walk_ins[2].id]) # Queue order, not request order
+        self.assertEqual((notified[self.walk_ins[1].id]['sms'], notified[self.walk_ins[1].id]['email']), (True, True))
+        self.assertEqual(notified[self.walk_ins[2].id]['notification_type'], 'sms') # No address on file
+        self.assertEqual(response.data['skipped'], [{'entry_id': self.walk_ins[3].id, 'reason': 'not_waiting'}])
+
+    def test_failed_sends_are_left_to_the_workers(self):
+        self.fake.failure_rate = 1.0
+        response = self.notify(count=2)
+        self.assertEqual([row['status'] for row in response.data['notified']], ['PENDING', 'PENDING'])
+        self.assertFalse(response.data['success'])
+        jobs = NotificationJob.objects.filter(id__in=[row['job_id'] for row in response.data['notified']])
+        self.assertTrue(all(job.attempts == 1 and job.locked_until is None for job in jobs))
+        self.assertEqual(WaitlistEntry.objects.get(id=self.reservation.id).notification_attempts, 1)
+        self.assertIsNone(WaitlistEntry.objects.get(id=self.reservation.id).notified_at)
+
+    def test_job_reclaimed_mid_send_is_left_to_its_new_worker(self):
+        reclaimed = []
+        class SlowProvider(FakeProvider):
+            def send_sms(provider, to, body):
+                if not reclaimed: # The first send outlives the lease and a worker takes the job over
+                    NotificationJob.objects.filter(phone_number=to).update(locked_until=timezone.now() - timedelta(seconds=1))
+                    reclaimed.extend(claim_jobs(limit=1))
+                return super().send_sms(to, body)
+        inline = mock.Mock(map=map) # Send in this thread so the provider can touch the test database
+        with mock.patch.object(notification_pool, '_providers', {'sms': SlowProvider(latency_ms=0, failure_rate=0)}), \
+                mock.patch('notifications.batch.get_executor', return_value=inline):
+            response = self.notify(count=2)
+
+        first, second = response.data['notified']
+        self.assertEqual((first['job_id'], first['status']), (reclaimed[0].id, 'SENDING'))
+        self.assertEqual(second['status'], 'SENT')
+        job = NotificationJob.objects.get(id=first['job_id'])
+        self.assertEqual((job.status, job.attempts, job.locked_until), ('SENDING', 0, reclaimed[0].locked_until))
+        self.assertEqual(WaitlistEntry.objects.get(id=first['entry_id']).notification_attempts, 0)
+        self.assertEqual(WaitlistEntry.objects.get(id=second['entry_id']).notification_attempts, 1)
+
+    def test_jobs_without_time_left_on_their_lease_are_not_sent(self):
+        with mock.patch('notifications.batch.LEASE_SECONDS', 1): # Less than a send may take
+            response = self.notify(count=2)
+        self.assertEqual([row['status'] for row in response.data['notified']], ['SENDING', 'SENDING'])
+        self.assertEqual(self.fake.sent, [])
+        jobs = NotificationJob.objects.filter(id__in=[row['job_id'] for row in response.data['notified']])
+        self.assertTrue(all(job.status == 'SENDING' and job.attempts == 0 for job in jobs)) # The workers' once the lease is up
+        self.broadcast.assert_not_called()
+
+    def test_second_batch_skips_parties_the_first_is_paging(self):
+        with mock.patch('notifications.batch.LEASE_SECONDS', 1): # First batch's jobs stay open (SENDING)
+            first = self.notify(count=2)
+        first_ids = [row['entry_id'] for row in first.data['notified']]
+        self.assertEqual(first_ids, [self.reservation.id, self.walk_ins[0].id])
+
+        second = self.notify(count=2)
+        self.assertEqual([row['entry_id'] for row in second.data['notified']], [self.walk_ins[1].id, self.walk_ins[2].id])
+        self.assertEqual(len(self.fake.sent), 2) # Nobody paged twice
+
+        response = self.notify(entry_ids=[self.walk_ins[0].id, self.walk_ins[3].id])
+        self.assertEqual([row['entry_id'] for row in response.data['notified']], [self.walk_ins[3].id])
+        self.assertEqual(response.data['skipped'], [{'entry_id': self.walk_ins[0].id, 'reason': 'notification_in_progress'}])
+
+    def test_customer_emails_must_be_a_mapping(self):
+        response = self.notify(count=1, notification_type='both', customer_emails=['guest@example.com'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(NotificationJob.objects.count(), 0)
+
+    def test_count_is_bounded(self):
+        self.assertEqual(self.notify(count=0).status_code, 400)
+        self.assertEqual(self.notify(count=10_000).status_code, 400)
+
+
+class RateLimiterTests(TestCase):
 
-# Create your tests here.
+    def test_sends_are_paced_after_the_burst(self):
+        limiter = RateLimiter(20)
+        started = time.monotonic()
+        for _ in range(30):
+            limiter.acquire()
+        # 20 from the initial burst, then 10 more at 20/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import SendNotificationAPIView
+from .views import SendNotificationAPIView, NotificationJobAPIView, NotifyNextPartiesAPIView
 
 urlpatterns = [
     path('send/', SendNotificationAPIView.as_view(), name='send_notification_api'),
+    path('notify-next/', NotifyNextPartiesAPIView.as_view(), name='notify_next_parties_api'),
+    path('jobs/<int:job_id>/', NotificationJobAPIView.as_view(), name='notification_job_api'),
 ] 
\ No newline at end of file
@@ -3,27 +3,43 @@ from django.conf import settings
 from django.template.loader import render_to_string
 import logging
 import re
+import threading
 
 logger = logging.getLogger(__name__)
 
+_twilio = threading.local() # One Client (and HTTP session) per thread, reused across messages
+# Seconds one provider call may take; a job's two channels must fit well inside NOTIFICATION_LEASE_SECONDS
+SEND_TIMEOUT_SECONDS = getattr(settings, 'NOTIFICATION_SEND_TIMEOUT_SECONDS', 10)
+
 def format_phone_for_notifications(phone_number_str):
     """
     Prepares a phone number for notification services (e.g., Twilio E.164 format).
     Assumes US numbers if no country code is apparent.
     """
     digits = re.sub(r'\D', '', phone_number_str)
-    if len(digits) == 10: # Assume US number without country code
+    if phone_number_str.strip().startswith('+'): # Already in some international format
+        return f"+{digits}"
+    elif len(digits) == 10: # Assume US number without country code
         return f"+1{digits}"
     elif len(digits) == 11 and digits.startswith('1'): # US number with 1 prefix
         return f"+{digits}"
-    elif digits.startswith('+'): # Already in some international format
-        return digits
     else: # Unknown format, try to prefix with + if it looks like it might be a full number with country code
         # This is a basic guess; robust international phone number validation is complex.
         if len(digits) > 10:
             return f"+{digits}"
     return phone_number_str # Fallback to original if unsure
 
+def normalize_phone(phone_number_str):
+    """
+    Lookup key stored alongside raw phone numbers (WaitlistEntry, Reservation, Party), so that
+    '(555) 010-2000' and '+1 555 010 2000' match with one index probe. E.164 where
+    format_phone_for_notifications can place the number, otherwise just its digits; '' if blank.
+    """
+    if not phone_number_str or not phone_number_str.strip():
+        return ''
+    formatted = format_phone_for_notifications(phone_number_str)
+    return (formatted if formatted.startswith('+') else re.sub(r'\D', '', formatted))[:24]
+
 def send_email_notification(
     recipient_list,
     subject,
@@ -73,12 +89,11 @@ def send_sms_via_twilio(to_phone_number, body):
         return {"success": False, "error": "twilio_config_error"}
 
     try:
-        from twilio.rest import Client
+        client = get_twilio_client(account_sid, auth_token)
     except ImportError:
         logger.error("Twilio Python library is not installed. pip install twilio")
         return {"success": False, "error": "twilio_not_installed"}
 
-    client = Client(account_sid, auth_token)
     formatted_to_number = format_phone_for_notifications(to_phone_number)
 
     try:
@@ -91,5 +106,16 @@ def send_sms_via_twilio(to_phone_number, body):
         return {"success": True, "sid": message.sid, "status": message.status}
     except Exception as e:
         logger.error(f"Twilio SMS sending failed to {formatted_to_number}: {str(e)}")
-        # Consider parsing TwilioException for more specific error codes if available
-        return {"success": False, "error": "twilio_send_error", "details": str(e)} 
\ No newline at end of file
+        # status is the HTTP status for TwilioRestException (e.g. 400 bad number, 429, 5xx)
+        return {"success": False, "error": "twilio_send_error", "details": str(e), "status": getattr(e, 'status', None)}
+
+def get_twilio_client(account_sid, auth_token):
+    """This thread's Twilio Client, created on first use so its connection pool is kept between messages."""
+    client = getattr(_twilio, 'client', None)
+    if client is None or getattr(_twilio, 'account', None) != (account_sid, auth_token):
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
+        # Without a timeout a hung request outlives the job's lease and another worker sends it again
+        client = _twilio.client = Client(account_sid, auth_token, http_client=TwilioHttpClient(timeout=SEND_TIMEOUT_SECONDS))
+        _twilio.account = (account_sid, auth_token)
+    return client
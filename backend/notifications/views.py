@@ -3,14 +3,17 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.shortcuts import get_object_or_404
-from django.conf import settings
 import logging
-from django.utils import timezone
+from django.db import transaction
+from django.template.loader import render_to_string
 
-from .utils import send_email_notification, send_sms_via_twilio
+from .batch import BATCH_MAX, next_waiting_entries, notify_entries
+from .models import NotificationJob
+from .worker import enqueue_notification
 # from restaurant_app.models import Restaurant # Old import
 from auth_settings.models import Restaurant # New import
 from waitlist.models import WaitlistEntry # To fetch entry details for context
+from waitlist.utils import active_waitlist_queryset
 # Import your permission class, e.g., IsRestaurantOwnerOrStaff from reservation.views or a common place
 # For now, using a placeholder or simple IsAuthenticated.
 # from reservation.views import IsRestaurantOwnerOrStaff # Example: if it was in reservation app
@@ -49,23 +52,66 @@ class IsRestaurantOwnerOrStaff(permissions.BasePermission):
             return False
         return True # Should be unreachable if logic is correct
 
+class NotificationMessageError(Exception):
+    def __init__(self, error, details=''):
+        super().__init__(error)
+        self.error = error
+        self.details = details
+
+def build_notification_message(data, restaurant, waitlist_entry, notification_type, customer_email):
+    """
+    The NotificationJob message fields for one entry, rendered from the request data. Messages are
+    rendered now, so the job carries everything the worker needs. Raises NotificationMessageError.
+    """
+    customer_name = waitlist_entry.customer_name
+    message = {}
+    if notification_type in ['sms', 'both']:
+        message['phone_number'] = waitlist_entry.phone_number
+        message['sms_body'] = data.get('message') or \
+            f"Hello {customer_name}, your table at {restaurant.name} is ready! Please proceed to the host stand."
+
+    if notification_type in ['email', 'both']:
+        if not customer_email: # Make sure there is an email to send to
+            raise NotificationMessageError("customer_email_not_provided")
+        email_context = dict(data.get('email_context') or {}) # Copied: batches render it once per entry
+        # Ensure essential context for templates
+        email_context.update({
+            'customer_name': customer_name,
+            'restaurant_name': restaurant.name,
+            'entry_details': waitlist_entry, # Pass the whole entry for more flexibility in template
+        })
+        # Template paths should be defined in settings or constants
+        # Using placeholder paths for now
+        text_template = data.get('text_template', 'notifications/emails/customer_notification.txt')
+        html_template = data.get('html_template', 'notifications/emails/customer_notification.html')
+        try:
+            message['email_text'] = render_to_string(text_template, email_context)
+            message['email_html'] = render_to_string(html_template, email_context)
+        except Exception as e:
+            logger.error(f"Could not render notification email for entry {waitlist_entry.id}: {str(e)}")
+            raise NotificationMessageError("email_template_error", str(e))
+        message['email_to'] = customer_email
+        message['email_subject'] = data.get('subject', f"Update from {restaurant.name}")
+    return message
+
 class SendNotificationAPIView(APIView):
     """
-    API endpoint to send notifications (SMS, Email) to a customer associated with a WaitlistEntry.
+    API endpoint to queue notifications (SMS, Email) to a customer associated with a WaitlistEntry.
     Expects 'entry_id', 'notification_type' ('sms', 'email', or 'both'), 
     and optional 'message' (for SMS) or 'subject', 'email_context' (for email) in request body.
+    Returns 202 with a job_id straight away; delivery happens on the notification workers
+    (see notifications.worker) and can be followed at /api/notifications/jobs/<job_id>/.
     """
     permission_classes = [IsRestaurantOwnerOrStaff] # Protect this endpoint
 
     def post(self, request, *args, **kwargs):
         entry_id = request.data.get('entry_id')
         notification_type = request.data.get('notification_type', 'sms').lower()
-        # Restaurant object should be set on view by permission class or fetched here
-        # restaurant = getattr(self, 'restaurant', None) 
-        # For now, re-fetch based on entry_id for safety, or ensure permission class sets it.
 
         if not entry_id:
             return Response({"error": "entry_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if notification_type not in ['sms', 'email', 'both']:
+            return Response({"error": "notification_type must be 'sms', 'email' or 'both'"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             waitlist_entry = WaitlistEntry.objects.select_related('restaurant').get(pk=entry_id)
@@ -79,89 +125,124 @@ class SendNotificationAPIView(APIView):
         if not (current_restaurant.user == request.user or request.user.is_staff):
              return Response({"error": "Permission denied for this restaurant/entry."}, status=status.HTTP_403_FORBIDDEN)
 
-        customer_name = waitlist_entry.customer_name
-        customer_phone = waitlist_entry.phone_number
         # customer_email = waitlist_entry.customer_email # Assuming QueueEntry has an email field or relation
         # For demonstration, let's assume a placeholder email or that it needs to be passed in request
         customer_email = request.data.get('customer_email', 'customer@example.com') 
 
-        sms_sent = False
-        email_sent = False
-        sms_details = {}
-        email_details = {}
-
-        if notification_type in ['sms', 'both']:
-            sms_message_body = request.data.get('message')
-            if not sms_message_body:
-                sms_message_body = f"Hello {customer_name}, your table at {current_restaurant.name} is ready! Please proceed to the host stand."
-            
-            sms_result = send_sms_via_twilio(customer_phone, sms_message_body)
-            sms_sent = sms_result.get('success', False)
-            sms_details = sms_result
-            if sms_sent:
-                # Mark entry as notified if your model has such a field
-                if hasattr(waitlist_entry, 'notified_sms_at'): # Example field
-                    waitlist_entry.notified_sms_at = timezone.now()
-                elif hasattr(waitlist_entry, 'notified'):
-                    waitlist_entry.notified = True # Generic notified flag
-                # waitlist_entry.save() # Save if changes made
-
-        if notification_type in ['email', 'both']:
-            email_subject = request.data.get('subject', f"Update from {current_restaurant.name}")
-            email_context = request.data.get('email_context', {})
-            
-            # Ensure essential context for templates
-            email_context.update({
-                'customer_name': customer_name,
-                'restaurant_name': current_restaurant.name,
-                'entry_details': waitlist_entry, # Pass the whole entry for more flexibility in template
-                # Add more default context if needed by your templates
-            })
-            
-            # Template paths should be defined in settings or constants
-            # Using placeholder paths for now
-            text_template = request.data.get('text_template', 'notifications/emails/customer_notification.txt')
-            html_template = request.data.get('html_template', 'notifications/emails/customer_notification.html')
-            
-            if customer_email: # Make sure there is an email to send to
-                email_sent = send_email_notification(
-                    recipient_list=[customer_email],
-                    subject=email_subject,
-                    text_template_path=text_template,
-                    html_template_path=html_template,
-                    context=email_context
-                )
-                email_details = {"success": email_sent, "recipient": customer_email}
-                if email_sent and hasattr(waitlist_entry, 'notified_email_at'): # Example field
-                    waitlist_entry.notified_email_at = timezone.now()
-                    # waitlist_entry.save() # Save if changes made
+        try:
+            message = build_notification_message(request.data, current_restaurant, waitlist_entry, notification_type, customer_email)
+        except NotificationMessageError as e:
+            return Response({"error": e.error, "details": e.details}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The job row commits before a worker is woken (enqueue_notification uses on_commit)
+        with transaction.atomic():
+            job = enqueue_notification(current_restaurant.id, waitlist_entry.id, notification_type, **message)
+
+        return Response({
+            "success": True,
+            "message": "Notification queued.",
+            "job_id": job.id,
+            "status": job.status,
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class NotificationJobAPIView(APIView):
+    """ Delivery status of one queued notification: GET /api/notifications/jobs/<job_id>/ """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(NotificationJob.objects.select_related('restaurant'), pk=job_id)
+        if not (job.restaurant.user == request.user or request.user.is_staff):
+            return Response({"error": "Permission denied for this restaurant/entry."}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            "job_id": job.id,
+            "entry_id": job.entry_id,
+            "notification_type": job.notification_type,
+            "status": job.status,
+            "attempts": job.attempts,
+            "next_attempt_at": job.next_attempt_at if job.status == 'PENDING' else None,
+            "sms_sent_at": job.sms_sent_at,
+            "email_sent_at": job.email_sent_at,
+            "results": job.results,
+            "created_at": job.created_at,
+            "finished_at": job.finished_at,
+        })
+
+
+class NotifyNextPartiesAPIView(APIView):
+    """
+    Page several parties in one call: POST /api/notifications/notify-next/
+    Expects 'restaurant_id' and either 'count' (the next N WAITING entries in queue order, skipping
+    ones already notified unless 'include_notified' is set) or 'entry_ids'. Takes the same
+    'notification_type', 'message', 'subject', 'email_context' as send/, plus 'customer_emails'
+    ({entry_id: email}) for email; entries without an address are skipped for email-only batches.
+    Delivery is attempted before responding (see notifications.batch); failures that can be retried
+    are left to the notification workers. Parties another batch is paging at the same time are passed
+    over ('notification_in_progress' when asked for by id).
+    """
+    permission_classes = [IsRestaurantOwnerOrStaff]
+
+    def post(self, request, *args, **kwargs):
+        restaurant = self.restaurant # Set by IsRestaurantOwnerOrStaff from restaurant_id
+        notification_type = str(request.data.get('notification_type', 'sms')).lower()
+        if notification_type not in ['sms', 'email', 'both']:
+            return Response({"error": "notification_type must be 'sms', 'email' or 'both'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        entry_ids = request.data.get('entry_ids')
+        try:
+            if entry_ids is not None:
+                entry_ids = [int(entry_id) for entry_id in entry_ids]
+                count = len(entry_ids)
             else:
-                email_details = {"success": False, "error": "customer_email_not_provided"}
-        
-        # Save waitlist_entry if any notification-related fields were updated
-        # For example, if 'notified' or specific timestamp fields were set.
-        # Consider what fields on WaitlistEntry should be updated upon notification.
-        # Example: if entry.notified has been set to True by SMS part.
-        if hasattr(waitlist_entry, 'notified') and (sms_sent and notification_type in ['sms', 'both']):
-            waitlist_entry.save(update_fields=['notified'])
-        elif (hasattr(waitlist_entry, 'notified_sms_at') and sms_sent) or \
-             (hasattr(waitlist_entry, 'notified_email_at') and email_sent):
-            update_fields = []
-            if hasattr(waitlist_entry, 'notified_sms_at') and sms_sent: update_fields.append('notified_sms_at')
-            if hasattr(waitlist_entry, 'notified_email_at') and email_sent: update_fields.append('notified_email_at')
-            if update_fields: waitlist_entry.save(update_fields=update_fields)
-
-        if sms_sent or email_sent:
-            return Response({
-                "success": True, 
-                "message": "Notification process attempted.",
-                "sms_status": sms_details,
-                "email_status": email_details
-            }, status=status.HTTP_200_OK)
+                count = int(request.data.get('count', 0))
+        except (TypeError, ValueError):
+            return Response({"error": "count must be a number and entry_ids a list of ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= count <= BATCH_MAX:
+            return Response({"error": f"Between 1 and {BATCH_MAX} parties can be notified at once"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if entry_ids is not None:
+            entries, limit = active_waitlist_queryset(restaurant).filter(id__in=entry_ids), None # Queue order, WAITING only
         else:
-            return Response({
-                "success": False, 
-                "message": "Failed to send any notification or notification type not supported.",
-                "sms_status": sms_details,
-                "email_status": email_details
-            }, status=status.HTTP_400_BAD_REQUEST)
+            entries, limit = next_waiting_entries(restaurant.id, skip_notified=not request.data.get('include_notified')), count
+        skipped = []
+
+        customer_emails = request.data.get('customer_emails') or {}
+        if not isinstance(customer_emails, dict) or not all(isinstance(email, str) for email in customer_emails.values()):
+            return Response({"error": "customer_emails must map entry ids to email addresses"}, status=status.HTTP_400_BAD_REQUEST)
+        customer_emails = {str(entry_id): email for entry_id, email in customer_emails.items()}
+        def build_message(entry):
+            customer_email = customer_emails.get(str(entry.id))
+            if notification_type == 'email' and not customer_email:
+                skipped.append({"entry_id": entry.id, "reason": "customer_email_not_provided"})
+                return None
+            entry_type = notification_type if customer_email else 'sms' # 'both' without an address is SMS only
+            message = build_notification_message(request.data, restaurant, entry, entry_type, customer_email)
+            message['notification_type'] = entry_type
+            return message
+
+        try:
+            entries, jobs = notify_entries(restaurant.id, entries, build_message, limit=limit)
+        except NotificationMessageError as e:
+            return Response({"error": e.error, "details": e.details}, status=status.HTTP_400_BAD_REQUEST)
+        missing = [entry_id for entry_id in entry_ids or [] if entry_id not in {entry.id for entry in entries}]
+        if missing:
+            # Still waiting means another batch is paging them right now
+            waiting = set(active_waitlist_queryset(restaurant).filter(id__in=missing).values_list('id', flat=True))
+            skipped = [
+                {"entry_id": entry_id, "reason": "notification_in_progress" if entry_id in waiting else "not_waiting"}
+                for entry_id in missing
+            ] + skipped
+
+        return Response({
+            "success": any(job.status == 'SENT' for job in jobs),
+            "notified": [{
+                "entry_id": job.entry_id,
+                "customer_name": job.entry.customer_name,
+                "job_id": job.id,
+                "notification_type": job.notification_type,
+                "status": job.status, # SENT, FAILED, PENDING when a retry is scheduled, or SENDING if a worker took the job over
+                "sms": job.sms_sent_at is not None,
+                "email": job.email_sent_at is not None,
+            } for job in jobs],
+            "skipped": skipped,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,276 @@
+# notifications/worker.py
+"""
+Outbound notification queue.
+
+The API enqueues a NotificationJob and returns its id straight away; delivery happens off the
+request path, either on this process's worker threads (NOTIFICATION_WORKER_THREADS, woken when
+the enqueuing transaction commits) or in `manage.py run_notification_worker` (set the threads to 0
+in web processes then). Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED and a lease,
+so any number of threads and processes can share the table. The lease is renewed right before each
+job is sent, and a job whose lease has meanwhile passed to another worker is not sent again.
+
+Each attempt increments the entry's notification_attempts; a delivery stamps notified_at (and
+notified_sms_at / notified_email_at) and is broadcast to the host's waitlist sockets. Retryable
+failures are tried again after an exponential backoff (with jitter, so jobs that failed together
+during a provider outage don't all retry together) until max_attempts.
+"""
+import logging
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from recent.models import ActivityEvent
+from recent.utils import record_events
+from waitlist.broadcast import broadcast_waitlist_update
+from waitlist.cache import bump_waitlist_version
+from waitlist.models import WaitlistEntry
+from .models import NotificationJob
+from .providers import get_providers
+
+logger = logging.getLogger(__name__)
+
+WORKER_THREADS = getattr(settings, 'NOTIFICATION_WORKER_THREADS', 2) # In-process workers; 0 leaves jobs to the management command
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+RETRY_BASE_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 5) # Delay after the first failed attempt, doubled each time
+RETRY_MAX_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_MAX_SECONDS', 600)
+LEASE_SECONDS = getattr(settings, 'NOTIFICATION_LEASE_SECONDS', 60) # A job still SENDING after this is assumed abandoned
+BATCH_SIZE = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 10) # Jobs claimed per query
+POLL_INTERVAL = getattr(settings, 'NOTIFICATION_POLL_INTERVAL', 5) # Seconds between checks for due retries
+
+# Written back after every attempt
+JOB_ATTEMPT_FIELDS = ['status', 'attempts', 'next_attempt_at', 'locked_until', 'sms_sent_at', 'email_sent_at', 'results', 'finished_at']
+
+def retry_delay(attempts, base=None):
+    """Seconds to wait after the `attempts`-th failed attempt: base * 2^(attempts-1), capped, 50-100% jittered."""
+    base = RETRY_BASE_SECONDS if base is None else base
+    delay = min(base * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+def enqueue_notification(restaurant_id, entry_id=None, notification_type='sms', **message):
+    """
+    Queue a rendered notification (phone_number/sms_body and/or email_to/email_subject/email_text/
+    email_html) and return the job. Workers are woken when the surrounding transaction commits.
+    """
+    job = NotificationJob.objects.create(
+        restaurant_id=restaurant_id,
+        entry_id=entry_id,
+        notification_type=notification_type,
+        max_attempts=MAX_ATTEMPTS,
+        **message
+    )
+    transaction.on_commit(notification_pool.wake)
+    return job
+
+def claim_jobs(limit=BATCH_SIZE, lease_seconds=LEASE_SECONDS, only=None):
+    """
+    Lease up to `limit` due jobs for this worker: pending ones whose time has come, and abandoned
+    ones. `only` (a Q) narrows the candidates, e.g. to a benchmark's own jobs.
+    """
+    now = timezone.now()
+    due = NotificationJob.objects.filter(Q(status='PENDING', next_attempt_at__lte=now) | Q(status='SENDING', locked_until__lt=now))
+    if only is not None:
+        due = due.filter(only)
+    with transaction.atomic():
+        jobs = list(
+            due.select_for_update(skip_locked=True) # Other workers skip the rows we take
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+        if jobs:
+            lease = now + timedelta(seconds=lease_seconds)
+            NotificationJob.objects.filter(id__in=[job.id for job in jobs]).update(status='SENDING', locked_until=lease)
+            for job in jobs:
+                job.status, job.locked_until = 'SENDING', lease
+    return jobs
+
+def renew_lease(job, lease_seconds=LEASE_SECONDS):
+    """
+    Extend our lease on a claimed job right before sending it, with one conditional UPDATE. False if
+    the lease ran out while earlier jobs of the batch were sent and another worker has taken this one.
+    """
+    lease = timezone.now() + timedelta(seconds=lease_seconds)
+    renewed = NotificationJob.objects.filter(id=job.id, status='SENDING', locked_until=job.locked_until).update(locked_until=lease)
+    if renewed:
+        job.locked_until = lease
+    return bool(renewed)
+
+def _send(job, channel, providers):
+    provider = providers[channel]
+    rate_limit = getattr(provider, 'rate_limit', None)
+    if rate_limit is not None:
+        rate_limit.acquire()
+    try:
+        if channel == 'sms':
+            return provider.send_sms(job.phone_number, job.sms_body)
+        return provider.send_email(job.email_to, job.email_subject, job.email_text, job.email_html)
+    except Exception as e:
+        logger.exception(f"Notification job {job.id}: {channel} provider raised")
+        return {'success': False, 'error': 'provider_error', 'details': str(e), 'retryable': True}
+
+def attempt_job(job, providers):
+    """Send every channel still pending once; returns the channels delivered. No database access."""
+    job.attempts += 1
+    delivered = []
+    for channel in job.pending_channels():
+        result = _send(job, channel, providers)
+        job.results[channel] = result
+        if result.get('success'):
+            setattr(job, f'{channel}_sent_at', timezone.now())
+            delivered.append(channel)
+    return delivered
+
+def settle_job(job, now, retry_base=None):
+    """After an attempt: schedule the retry, or finish the job as SENT/FAILED. Releases the lease in memory."""
+    if job.pending_channels() and job.attempts < job.max_attempts:
+        job.status = 'PENDING'
+        job.next_attempt_at = now + timedelta(seconds=retry_delay(job.attempts, retry_base))
+    else:
+        job.status = 'SENT' if (job.sms_sent_at or job.email_sent_at) else 'FAILED'
+        job.finished_at = now
+    job.locked_until = None
+
+def job_event(job):
+    """Unsaved activity event for a finished job."""
+    return ActivityEvent(
+        restaurant_id=job.restaurant_id,
+        kind='notification.sent' if job.status == 'SENT' else 'notification.failed',
+        object_id=job.entry_id,
+        data={'job': job.id, 'type': job.notification_type, 'attempts': job.attempts,
+              'sms': job.sms_sent_at is not None, 'email': job.email_sent_at is not None},
+    )
+
+def process_job(job, providers, retry_base=None):
+    """
+    One delivery attempt for a claimed job: send every channel still pending, then either schedule
+    the retry or finish the job, and stamp the entry, all in one transaction. Returns None, without
+    sending anything, if another worker took the job over first.
+    """
+    if not renew_lease(job):
+        logger.warning(f"Notification job {job.id}: lease expired before the attempt; leaving it to its new worker")
+        return None
+    delivered = attempt_job(job, providers)
+    now = timezone.now()
+    lease = job.locked_until
+    settle_job(job, now, retry_base)
+
+    with transaction.atomic():
+        # Only the lease holder may write; if ours ran out another worker owns the job now
+        updated = NotificationJob.objects.filter(id=job.id, status='SENDING', locked_until=lease).update(
+            **{field: getattr(job, field) for field in JOB_ATTEMPT_FIELDS}
+        )
+        if not updated:
+            logger.warning(f"Notification job {job.id}: lease expired during the attempt; leaving it to its new worker")
+            return job
+        if job.entry_id:
+            stamps = {'notification_attempts': F('notification_attempts') + 1, 'updated_at': now}
+            for channel in delivered:
+                stamps['notified_at'] = stamps[f'notified_{channel}_at'] = getattr(job, f'{channel}_sent_at')
+            WaitlistEntry.objects.filter(id=job.entry_id).update(**stamps) # Skips post_save, so bump and broadcast below
+            bump_waitlist_version(job.restaurant_id)
+            if delivered:
+                entry = WaitlistEntry.objects.filter(id=job.entry_id).first()
+                if entry is not None:
+                    broadcast_waitlist_update(job.restaurant_id, entry)
+        if job.finished_at is not None:
+            record_events([job_event(job)])
+    return job
+
+
+class NotificationWorkerPool:
+    """Worker threads draining the job table. Started on the first wake(), or explicitly by the management command."""
+
+    def __init__(self, threads=None, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL, providers=None, retry_base=None, only=None):
+        self.threads = WORKER_THREADS if threads is None else threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.only = only # Q limiting which jobs this pool takes (see claim_jobs)
+        self._providers = providers # Resolved lazily so settings overrides apply
+        self._workers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'attempts': 0, 'sent': 0, 'failed': 0, 'retried': 0}
+
+    @property
+    def providers(self):
+        with self._lock:
+            if self._providers is None:
+                self._providers = get_providers()
+            return self._providers
+
+    def start(self):
+        with self._lock:
+            self._stopping.clear()
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.threads:
+                worker = threading.Thread(target=self._run, name=f'notification-worker-{len(self._workers)}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def wake(self):
+        """A job was queued: make sure workers are running and get one of them polling now."""
+        if self.threads < 1:
+            return
+        self.start()
+        self._wakeup.set()
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def process_batch(self):
+        """Claim and process one batch in the calling thread; returns how many jobs it handled."""
+        jobs = claim_jobs(self.batch_size, only=self.only)
+        for job in jobs:
+            if process_job(job, self.providers, self.retry_base) is None:
+                continue # Taken over by another worker
+            with self._stats_lock:
+                self._stats['attempts'] += 1
+                if job.status == 'PENDING':
+                    self._stats['retried'] += 1
+                else:
+                    self._stats['sent' if job.status == 'SENT' else 'failed'] += 1
+        return len(jobs)
+
+    def run_until_idle(self):
+        """Process due jobs in the calling thread until none are left (tests, `--once`)."""
+        total = 0
+        while True:
+            handled = self.process_batch()
+            if not handled:
+                return total
+            total += handled
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                close_old_connections()
+                try:
+                    handled = self.process_batch()
+                except Exception:
+                    logger.exception('Notification worker batch failed')
+                    handled = 0
+                if not handled:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            for provider in set(self.providers.values()):
+                if hasattr(provider, 'close'):
+                    provider.close() # This thread's SMTP connection
+            connection.close()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+notification_pool = NotificationWorkerPool()
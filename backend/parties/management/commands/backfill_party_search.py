@@ -0,0 +1,32 @@
+# parties/management/commands/backfill_party_search.py
+from django.core.management.base import BaseCommand, CommandError
+
+from parties.models import Party
+
+class Command(BaseCommand):
+    help = 'Fill Party.name_normalized/phone_digits/phone_e164 (the directory search and visit lookup keys) for rows written before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk_update (default 2000)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        last_id, updated = 0, 0
+        while True:
+            # Walk by primary key so each batch is an index range, however large the table
+            batch = list(Party.objects.filter(id__gt=last_id).order_by('id').only('id', 'name', 'phone', 'name_normalized', 'phone_digits', 'phone_e164')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            stale = []
+            for party in batch:
+                keys = lambda: (party.name_normalized, party.phone_digits, party.phone_e164)
+                current = keys()
+                party.set_search_fields()
+                if keys() != current:
+                    stale.append(party)
+            if stale:
+                Party.objects.bulk_update(stale, ['name_normalized', 'phone_digits', 'phone_e164'])
+                updated += len(stale)
+        self.stdout.write(self.style.SUCCESS(f"Updated search keys on {updated} parties."))
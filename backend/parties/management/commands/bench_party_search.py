@@ -0,0 +1,136 @@
+# parties/management/commands/bench_party_search.py
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from auth_settings.models import CustomUser, Restaurant
+from parties.models import Party
+from parties.serializers import PartySerializer
+from parties.utils import party_list_querysets, search_parties
+
+TARGET_MS = 50
+PAGE_SIZE = 50
+FIRST_NAMES = (
+    'Aarav', 'Aditi', 'Amelia', 'Ananya', 'Arjun', 'Carlos', 'Chloe', 'Daniel', 'Diya', 'Elena', 'Ethan',
+    'Fatima', 'Grace', 'Hannah', 'Ishaan', 'Jack', 'José', 'Kabir', 'Liam', 'Maya', 'Meera', 'Noah',
+    'Olivia', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Sara', 'Sofia', 'Vikram', 'Zoë',
+)
+LAST_NAMES = (
+    'Agarwal', 'Bose', 'Brown', 'Chen', 'Das', 'García', 'Gupta', 'Iyer', 'Jones', 'Kapoor', 'Khan',
+    'Kumar', 'Lee', 'Mehta', 'Müller', 'Nair', 'Patel', 'Rao', 'Reddy', 'Shah', 'Singh', 'Smith',
+)
+
+class Command(BaseCommand):
+    help = (
+        'Time the guest-directory queries (prefix search, sorts, deep keyset pages) against a restaurant '
+        'with --parties synthetic parties, through the same code path as PartyListAPIView'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, help='Benchmark an existing restaurant instead of seeding a throwaway one')
+        parser.add_argument('--parties', type=int, default=100000, help='Synthetic parties to seed (default 100000)')
+        parser.add_argument('--queries', type=int, default=200, help='Queries per scenario (default 200)')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded restaurant for reuse with --restaurant')
+        parser.add_argument('--explain', action='store_true', help='Print the query plan of each scenario')
+
+    def handle(self, *args, **options):
+        if options['queries'] < 1 or options['parties'] < 1:
+            raise CommandError('--queries and --parties must be positive')
+
+        seeded = None
+        if options['restaurant']:
+            restaurant = Restaurant.objects.filter(pk=options['restaurant']).first()
+            if restaurant is None:
+                raise CommandError(f"Restaurant {options['restaurant']} not found")
+        else:
+            restaurant = seeded = self.seed(options['parties'])
+
+        try:
+            total = Party.objects.filter(restaurant=restaurant).count()
+            self.stdout.write(f"Restaurant {restaurant.id}: {total} parties, {options['queries']} queries per scenario")
+            self.stdout.write(f"{'scenario':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'rows':>6}")
+            over = []
+            for name, make_args in self.scenarios(restaurant.id, random.Random(7)).items():
+                if self.run_scenario(restaurant.id, name, make_args, options) >= TARGET_MS:
+                    over.append(name)
+            if over:
+                self.stdout.write(self.style.WARNING(f"p95 over {TARGET_MS}ms: {', '.join(over)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Every scenario's p95 is under {TARGET_MS}ms."))
+        finally:
+            if seeded is not None and not options['keep']:
+                seeded.user.delete() # Cascades to the restaurant and its parties
+            elif seeded is not None:
+                self.stdout.write(f"Kept restaurant {seeded.id}; rerun with --restaurant {seeded.id}")
+
+    def scenarios(self, restaurant_id, rng):
+        # Cursors 20 pages in, so deep pages are measured as well as the first
+        deep = {}
+        for sort in ('-last_visit', '-visits', 'name'):
+            cursor = None
+            for _ in range(20):
+                _, cursor = search_parties(restaurant_id, sort=sort, cursor=cursor, limit=PAGE_SIZE)
+                if cursor is None:
+                    break
+            deep[sort] = cursor
+
+        return {
+            'first page -last_visit': lambda: {'sort': '-last_visit'},
+            'first page -visits': lambda: {'sort': '-visits'},
+            'page 21 -last_visit': lambda: {'sort': '-last_visit', 'cursor': deep['-last_visit']},
+            'page 21 -visits': lambda: {'sort': '-visits', 'cursor': deep['-visits']},
+            'page 21 name': lambda: {'sort': 'name', 'cursor': deep['name']},
+            'name prefix (2 chars)': lambda: {'search': rng.choice(FIRST_NAMES)[:2]},
+            'name prefix (full)': lambda: {'search': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[:3]}"},
+            'name prefix, -visits': lambda: {'search': rng.choice(FIRST_NAMES)[:3], 'sort': '-visits'},
+            'phone prefix (4 digits)': lambda: {'search': f"9{rng.randrange(1000):03d}"},
+            'phone prefix (7 digits)': lambda: {'search': f"9{rng.randrange(1000000):06d}"},
+        }
+
+    def run_scenario(self, restaurant_id, name, make_args, options):
+        """Times search + serialization (what the view does per request); returns the p95 in ms."""
+        timings, rows = [], 0
+        for _ in range(options['queries']):
+            kwargs = make_args()
+            started = time.perf_counter()
+            parties, _ = search_parties(restaurant_id, limit=PAGE_SIZE, **kwargs)
+            PartySerializer(parties, many=True).data
+            timings.append((time.perf_counter() - started) * 1000)
+            rows = max(rows, len(parties))
+        timings.sort()
+        quantile = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))]
+        self.stdout.write(
+            f"{name:<26} {statistics.median(timings):>8.2f} {quantile(0.95):>8.2f} "
+            f"{quantile(0.99):>8.2f} {timings[-1]:>8.2f} {rows:>6}"
+        )
+        if options['explain']:
+            for parties in party_list_querysets(restaurant_id, **make_args()):
+                self.stdout.write(parties[:PAGE_SIZE + 1].explain())
+        return quantile(0.95)
+
+    def seed(self, count):
+        self.stdout.write(f"Seeding {count} parties...")
+        user = CustomUser.objects.create_user(email=f'bench-parties-{time.time_ns()}@example.invalid', password=None)
+        restaurant = Restaurant.objects.create(user=user, name='Party search benchmark')
+        rng = random.Random(42)
+        now = timezone.now()
+        parties = []
+        for phone in rng.sample(range(9000000000, 10000000000), count): # Unique 10-digit numbers
+            party = Party(
+                restaurant=restaurant,
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                phone=str(phone),
+                visits=rng.randrange(0, 40),
+                # 5% never visited, to exercise the NULL ordering of last_visit
+                last_visit=None if rng.random() < 0.05 else now - timedelta(minutes=rng.randrange(60 * 24 * 730)),
+            )
+            party.set_search_fields() # bulk_create skips save()
+            parties.append(party)
+        with transaction.atomic():
+            Party.objects.bulk_create(parties, batch_size=5000)
+        return restaurant
@@ -1,20 +1,67 @@
+import unicodedata
+
 from django.db import models
 # from restaurant_app.models import Restaurant # Old import
 from auth_settings.models import Restaurant # New import
+from notifications.utils import normalize_phone
+
+def normalize_party_name(name):
+    """Search key for a party name: case-folded, accents stripped, whitespace collapsed."""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())[:100]
+
+def party_phone_digits(phone):
+    """Search key for a phone number: digits only, so '+1 (555) 010' matches a '555' search."""
+    return ''.join(char for char in (phone or '') if char.isdigit())[:20]
 
 class Party(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='parties_app_entries') # Changed related_name to avoid clash
     name = models.CharField(max_length=100)
-    phone = models.CharField(max_length=15) # Consider adding validators
+    phone = models.CharField(max_length=20) # Same as WaitlistEntry.phone_number, which visits are copied from
     visits = models.PositiveIntegerField(default=0)
     last_visit = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
+    # Denormalized search keys, kept in sync by save() and set_search_fields() (bulk paths)
+    name_normalized = models.CharField(max_length=100, blank=True, default='', editable=False)
+    phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False)
+    phone_e164 = models.CharField(max_length=24, blank=True, default='', editable=False) # Matches WaitlistEntry.phone_e164
 
     class Meta:
         unique_together = ['restaurant', 'phone']
         verbose_name_plural = 'Parties'
         ordering = ['-last_visit', 'name']
+        indexes = [
+            # Prefix search: varchar_pattern_ops lets Postgres serve LIKE 'abc%' from the index
+            # under any collation (opclasses are ignored on other databases)
+            models.Index(
+                fields=['restaurant', 'name_normalized'], name='party_name_prefix_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+            models.Index(
+                fields=['restaurant', 'phone_digits'], name='party_phone_prefix_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+            # Keyset sorts; each index also serves the reverse direction with a backward scan
+            models.Index(fields=['restaurant', '-visits', '-id'], name='party_visits_idx'),
+            models.Index(fields=['restaurant', '-last_visit', '-id'], name='party_last_visit_idx'),
+            models.Index(fields=['restaurant', 'name_normalized', 'id'], name='party_name_sort_idx'),
+            # Visit bookkeeping finds a guest's party by normalized phone
+            models.Index(fields=['restaurant', 'phone_e164'], name='party_rest_phone_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.phone}) - {self.restaurant.name}"
+
+    def set_search_fields(self):
+        self.name_normalized = normalize_party_name(self.name)
+        self.phone_digits = party_phone_digits(self.phone)
+        self.phone_e164 = normalize_phone(self.phone)
+
+    def save(self, *args, **kwargs):
+        self.set_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'name_normalized', 'phone_digits', 'phone_e164'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,10 @@
+from rest_framework import serializers
+from .models import Party
+
+class PartySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Party
+        fields = ['id', 'name', 'phone', 'visits', 'last_visit', 'created_at', 'notes']
+        # Phone is the party's identity (unique per restaurant, matched against waitlist entries);
+        # visits/last_visit are maintained from served waitlist entries
+        read_only_fields = ['phone', 'visits', 'last_visit', 'created_at']
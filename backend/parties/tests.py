@@ -1,3 +1,305 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from auth_settings.models import CustomUser, Restaurant
+from notifications.utils import normalize_phone
+from waitlist.models import WaitlistEntry
+from .models import Party
+from .utils import rebuild_restaurant_parties, record_served_visits, search_parties
+
+
+class PartyDirectoryTests(TestCase):
+    """Guest directory: normalized prefix search, keyset pages for each sort, owner-only access."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.url = f'/api/restaurants/{self.restaurant.id}/parties/'
+
+    def make_party(self, name, phone, visits=1, days_ago=1):
+        return Party.objects.create(
+            restaurant=self.restaurant, name=name, phone=phone, visits=visits,
+            last_visit=None if days_ago is None else timezone.now() - timedelta(days=days_ago),
+        )
+
+    def test_search_keys_are_normalized(self):
+        party = self.make_party('  José   GARCÍA ', '+1 (555) 010-2000')
+        self.assertEqual((party.name_normalized, party.phone_digits), ('jose garcia', '15550102000'))
+        party.name = 'Zoë Lee'
+        party.save(update_fields=['name'])
+        party.refresh_from_db()
+        self.assertEqual(party.name_normalized, 'zoe lee')
+
+    def test_prefix_search_on_name_and_phone(self):
+        self.make_party('José García', '5550102000')
+        self.make_party('Joseph Chen', '5559990000')
+        self.make_party('Ana Josefsson', '4440100000')
+
+        names = lambda search: sorted(p['name'] for p in self.client.get(self.url, {'search': search}).data['results'])
+        self.assertEqual(names('jose'), ['Joseph Chen', 'José García']) # Prefix of the name, accent-insensitive
+        self.assertEqual(names('JOSÉ G'), ['José García'])
+        self.assertEqual(names('555-01'), ['José García']) # Phone punctuation is ignored
+        self.assertEqual(names('444'), ['Ana Josefsson'])
+        self.assertEqual(names('xyz'), [])
+
+    def test_keyset_pages_for_each_sort(self):
+        # Ties on visits and a NULL last_visit exercise the id tie-break and NULL ordering
+        for i in range(7):
+            self.make_party(f'Guest {i}', f'555000000{i}', visits=i % 3, days_ago=None if i == 3 else i + 1)
+
+        for sort, key in (
+            ('-visits', lambda p: (-p.visits, -p.id)),
+            ('visits', lambda p: (p.visits, p.id)),
+            ('-last_visit', lambda p: (p.last_visit is None, -(p.last_visit or timezone.now()).timestamp(), -p.id)),
+            ('last_visit', lambda p: (p.last_visit is not None, (p.last_visit or timezone.now()).timestamp(), p.id)),
+            ('name', lambda p: (p.name_normalized, p.id)),
+        ):
+            expected = [p.id for p in sorted(Party.objects.filter(restaurant=self.restaurant), key=key)]
+            seen, cursor = [], None
+            while True:
+                response = self.client.get(self.url, {'sort': sort, 'limit': 3, **({'cursor': cursor} if cursor else {})})
+                self.assertEqual(response.status_code, 200)
+                seen += [p['id'] for p in response.data['results']]
+                cursor = response.data['next_cursor']
+                if not cursor:
+                    break
+            self.assertEqual(seen, expected, sort)
+
+    def test_list_is_one_page_query(self):
+        for i in range(5):
+            self.make_party(f'Guest {i}', f'555000000{i}')
+        # Token, restaurant, one page query; no COUNT(*) or OFFSET
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertTrue(response.data['has_more'])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'sort': 'phone'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, 400)
+        with self.assertRaises(ValueError):
+            search_parties(self.restaurant.id, sort='visits', cursor='WyJhIiwgMV0') # ["a", 1]: wrong value type
+
+    def test_detail_update_delete_and_ownership(self):
+        party = self.make_party('Guest', '5550000000', visits=4)
+        response = self.client.put(f'/api/parties/{party.id}/', {'notes': 'Prefers the patio', 'visits': 99}, format='json')
+        self.assertEqual(response.status_code, 200)
+        party.refresh_from_db()
+        self.assertEqual((party.notes, party.visits), ('Prefers the patio', 4)) # visits is read-only
+
+        other = CustomUser.objects.create_user(email='other@example.com', password='password123')
+        Restaurant.objects.create(user=other, name='Other')
+        intruder = APIClient()
+        intruder.force_authenticate(other)
+        self.assertEqual(intruder.get(self.url).status_code, 403)
+        self.assertEqual(intruder.delete(f'/api/parties/{party.id}/').status_code, 403)
+
+        self.assertEqual(self.client.delete(f'/api/parties/{party.id}/').status_code, 204)
+        self.assertFalse(Party.objects.filter(pk=party.id).exists())
+
+
+class PartyVisitTests(TestCase):
+    """Party stats move only on a transition to SERVED, with one UPDATE after commit."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='5550000000', people_count=2
+        )
+
+    def save_and_commit(self, entry):
+        """Save, then run the on_commit callbacks; returns (party queries in the save, party queries after commit)."""
+        party_queries = lambda context: [q['sql'] for q in context.captured_queries if 'parties_party' in q['sql']]
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as during_save:
+            entry.save()
+        with CaptureQueriesContext(connection) as after_commit:
+            for callback in callbacks:
+                callback()
+        return party_queries(during_save), party_queries(after_commit)
+
+    def test_only_served_transitions_touch_parties(self):
+        self.assertFalse(Party.objects.exists()) # Joining the queue is not a visit
+
+        self.entry.notes = 'Booth please'
+        self.assertEqual(self.save_and_commit(self.entry), ([], []))
+
+        self.entry.status = 'SERVED'
+        during_save, after_commit = self.save_and_commit(self.entry)
+        self.assertEqual(during_save, [])
+        party = Party.objects.get(restaurant=self.restaurant, phone='5550000000')
+        self.assertEqual((party.visits, party.last_visit, party.notes), (1, self.entry.completion_time, 'Booth please'))
+
+        # Saving the already-served entry again must not count another visit
+        self.entry.notes = 'Birthday'
+        self.assertEqual(self.save_and_commit(self.entry), ([], []))
+        self.assertEqual(Party.objects.get(pk=party.pk).visits, 1)
+
+    def test_repeat_visit_is_one_update(self):
+        self.entry.status = 'SERVED'
+        self.save_and_commit(self.entry)
+
+        second = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest Renamed', phone_number='5550000000', people_count=2
+        )
+        second.status = 'SERVED'
+        during_save, after_commit = self.save_and_commit(second)
+        self.assertEqual(during_save, [])
+        self.assertEqual(len(after_commit), 1)
+        self.assertTrue(after_commit[0].startswith('UPDATE'))
+
+        party = Party.objects.get(restaurant=self.restaurant, phone='5550000000')
+        self.assertEqual((party.visits, party.name, party.name_normalized), (2, 'Guest Renamed', 'guest renamed'))
+        self.assertEqual(party.last_visit, second.completion_time)
+
+    def test_party_upsert_failure_does_not_fail_the_committed_write(self):
+        self.entry.status = 'SERVED'
+        with mock.patch('parties.signals.record_party_visit', side_effect=IntegrityError('boom')), \
+                self.assertLogs('django', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.entry.save()
+        self.assertEqual(WaitlistEntry.objects.get(pk=self.entry.pk).status, 'SERVED')
+
+    def test_party_without_backfilled_phone_key_is_counted(self):
+        party = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='5550000000', visits=3)
+        Party.objects.filter(pk=party.pk).update(phone_e164='') # As before backfill_party_search runs
+        self.entry.status = 'SERVED'
+        self.save_and_commit(self.entry)
+
+        party.refresh_from_db()
+        self.assertEqual((party.visits, party.phone_e164), (4, normalize_phone('5550000000')))
+        self.assertEqual(Party.objects.count(), 1)
+
+    def test_spellings_sharing_a_phone_key_count_once(self):
+        first = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='5550000000', visits=1)
+        second = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='(555) 000-0000', visits=1)
+        self.entry.status = 'SERVED'
+        self.save_and_commit(self.entry)
+
+        self.assertEqual(Party.objects.get(pk=first.pk).visits, 2)
+        self.assertEqual(Party.objects.get(pk=second.pk).visits, 1)
+
+    def test_batch_counts_a_party_created_concurrently(self):
+        second = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Other', phone_number='5550000001', people_count=2
+        )
+        select_for_update = Party.objects.select_for_update
+        def racing_select(*args, **kwargs):
+            # Another request's first visit commits between our SELECT and our INSERT
+            Party.objects.create(restaurant=self.restaurant, name='Guest', phone='5550000000', visits=1)
+            return select_for_update(*args, **kwargs).none()
+
+        served = timezone.now()
+        for entry in (self.entry, second):
+            entry.status, entry.completion_time = 'SERVED', served
+        with mock.patch.object(Party.objects, 'select_for_update', racing_select):
+            record_served_visits([self.entry, second])
+
+        self.assertEqual(Party.objects.get(phone='5550000000').visits, 2)
+        self.assertEqual(Party.objects.get(phone='5550000001').visits, 1)
+
+
+    def test_batch_counts_a_party_without_backfilled_phone_key(self):
+        party = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='5550000000', visits=3)
+        Party.objects.filter(pk=party.pk).update(phone_e164='') # As before backfill_party_search runs
+        self.entry.status, self.entry.completion_time = 'SERVED', timezone.now()
+
+        with mock.patch('parties.utils.record_party_visit') as fallback:
+            record_served_visits([self.entry])
+        fallback.assert_not_called() # Found by the batch, not via a conflicting insert
+        party.refresh_from_db()
+        self.assertEqual((party.visits, party.phone_e164), (4, normalize_phone('5550000000')))
+        self.assertEqual(Party.objects.count(), 1)
+
+class RebuildPartiesTests(TestCase):
+    """populate_parties: one windowed read per restaurant and batched writes, whatever the guest count."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        now = timezone.now()
+        rows = []
+        for i in range(30):
+            for visit in range(i % 3 + 1):
+                # Later visits are typed differently; they are still the same guest
+                digits = f'55500{i:05d}'
+                phone = digits if visit == 0 else f'({digits[:3]}) {digits[3:6]}-{digits[6:]}'
+                rows.append(WaitlistEntry(
+                    restaurant=self.restaurant, customer_name=f'Guest {i} v{visit}', phone_number=phone,
+                    phone_e164=normalize_phone(phone), people_count=2, status='SERVED', timestamp=now - timedelta(days=10 - visit),
+                    completion_time=now - timedelta(days=10 - visit, minutes=-20),
+                ))
+        rows.append(WaitlistEntry(restaurant=self.restaurant, customer_name='Still waiting', phone_number='5559999999', people_count=2))
+        WaitlistEntry.objects.bulk_create(rows) # No signals: start from history with no parties
+
+    def test_rebuild_is_set_based_and_idempotent(self):
+        Party.objects.create(restaurant=self.restaurant, name='Old Name', phone='5550000001', visits=99, notes='VIP')
+        # Windowed read, existing parties, one write chunk (savepoint, bulk_update, bulk_create in its own savepoint, release)
+        with self.assertNumQueries(8):
+            stats = rebuild_restaurant_parties(self.restaurant.id, batch_size=100)
+        self.assertEqual((stats['phones'], stats['created'], stats['updated']), (30, 29, 1))
+
+        party = Party.objects.get(restaurant=self.restaurant, phone='5550000001')
+        latest = WaitlistEntry.objects.filter(phone_e164='+15550000001').latest('completion_time')
+        self.assertEqual((party.visits, party.name, party.last_visit, party.notes), (2, 'Guest 1 v1', latest.completion_time, 'VIP'))
+        self.assertEqual(party.name_normalized, 'guest 1 v1')
+        self.assertFalse(Party.objects.filter(phone='5559999999').exists()) # Never served
+
+        stats = rebuild_restaurant_parties(self.restaurant.id)
+        self.assertEqual((stats['created'], stats['updated'], stats['unchanged']), (0, 0, 30))
+
+    def test_rebuild_counts_on_the_party_live_visits_use(self):
+        oldest = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='5550000001', visits=0)
+        newer = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='(555) 000-0001', visits=0)
+        unkeyed = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='5550000002', visits=0)
+        Party.objects.filter(pk=unkeyed.pk).update(phone_e164='') # As before backfill_party_search runs
+        # A key that doesn't match its phone: the party isn't found, and inserting the phone again conflicts
+        stale = Party.objects.create(restaurant=self.restaurant, name='Guest', phone='5550000003', visits=0)
+        Party.objects.filter(pk=stale.pk).update(phone_e164='+19999999999')
+
+        stats = rebuild_restaurant_parties(self.restaurant.id)
+        self.assertEqual((stats['created'], stats['updated']), (27, 2)) # Only rows actually inserted count as created
+        self.assertEqual(Party.objects.count(), 31)
+        self.assertEqual(Party.objects.get(pk=oldest.pk).visits, 2) # The row record_party_visit increments
+        self.assertEqual(Party.objects.get(pk=newer.pk).visits, 0)
+        unkeyed.refresh_from_db()
+        self.assertEqual((unkeyed.visits, unkeyed.phone_e164), (3, '+15550000002'))
+        self.assertEqual(Party.objects.filter(phone_e164='+15550000002').count(), 1)
+
+    def test_command_refuses_unbackfilled_history(self):
+        WaitlistEntry.objects.filter(phone_number='5550000001').update(phone_e164='') # As before backfill_phone_e164 runs
+        with self.assertRaisesMessage(CommandError, 'backfill_phone_e164'):
+            call_command('populate_parties', stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Party.objects.exists()) # Nothing was overwritten with an undercount
+
+        stderr = StringIO()
+        call_command('populate_parties', '--allow-unbackfilled', stdout=StringIO(), stderr=stderr)
+        self.assertIn('1 served entries have no phone_e164', stderr.getvalue())
+
+    def test_command_continues_past_a_failing_restaurant(self):
+        failing = Restaurant.objects.create(
+            user=CustomUser.objects.create_user(email='other@example.com', password='password123'), name='Other'
+        )
+        def rebuild(restaurant_id, batch_size):
+            if restaurant_id == failing.id:
+                raise RuntimeError('boom')
+            return rebuild_restaurant_parties(restaurant_id, batch_size)
 
-# Create your tests here.
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('restaurant_app.management.commands.populate_parties.rebuild_restaurant_parties', side_effect=rebuild):
+            call_command('populate_parties', stdout=stdout, stderr=stderr) # Same handling as --workers > 1
+        self.assertEqual(Party.objects.filter(restaurant=self.restaurant).count(), 30)
+        self.assertIn(f'Restaurant {failing.id} failed: boom', stderr.getvalue())
+        self.assertIn('1/2 restaurants', stdout.getvalue())
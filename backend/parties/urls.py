@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import PartyListAPIView, PartyDetailAPIView
+
+urlpatterns = [
+    # Guest directory for a restaurant: ?search=&sort=&cursor=&limit=
+    path('restaurants/<int:restaurant_id>/parties/', PartyListAPIView.as_view(), name='list_parties'),
+
+    # Retrieve, update (name/notes) or delete a single party
+    path('parties/<int:pk>/', PartyDetailAPIView.as_view(), name='party_detail'),
+]
@@ -0,0 +1,306 @@
+import base64
+import binascii
+import json
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, FirstValue, Greatest
+from django.utils.dateparse import parse_datetime
+
+from notifications.utils import normalize_phone
+from waitlist.models import WaitlistEntry
+from .models import Party, normalize_party_name, party_phone_digits
+
+logger = logging.getLogger(__name__)
+
+def record_party_visit(restaurant_id, phone, name, visited_at, notes=None, count=1):
+    """
+    Count `count` served visits for (restaurant, normalized phone) with a single atomic
+    UPDATE ... SET visits = visits + count, creating the party only when there is none yet.
+    Concurrent visits can't lose increments, and there is no read-modify-write of the row.
+    `notes` only seeds a new party; staff edit existing parties' notes in the directory.
+    """
+    key = normalize_phone(phone)
+    # Rows not yet backfilled have a blank phone_e164, so the phone as stored matches too. Only the
+    # oldest matching party is counted: spellings that share an e164 are separate rows until merged.
+    match = Q(phone=phone) | Q(phone_e164=key) if key else Q(phone=phone)
+    party = Party.objects.filter(match, restaurant_id=restaurant_id).order_by('id').values('id')[:1]
+    for attempt in range(2):
+        updated = Party.objects.filter(id=Subquery(party)).update(
+            visits=F('visits') + count,
+            name=name,
+            name_normalized=normalize_party_name(name), # update() skips save()
+            phone_e164=key, # Backfills a row matched on its phone
+            last_visit=Greatest(Coalesce(F('last_visit'), Value(visited_at)), Value(visited_at)),
+        )
+        if updated or attempt:
+            break
+        try:
+            with transaction.atomic(): # Savepoint: a concurrent first visit must not poison an outer transaction
+                Party.objects.create(
+                    restaurant_id=restaurant_id, phone=phone, name=name, visits=count, last_visit=visited_at, notes=notes or '',
+                )
+            logger.info(f"Created party for {name} ({phone}) at restaurant {restaurant_id}")
+            return
+        except IntegrityError:
+            pass # Lost the race to create it: the other insert is committed, so count this visit on top (once)
+    if not updated:
+        logger.error(f"Could not record visit for {name} ({phone}) at restaurant {restaurant_id}")
+
+def record_served_visits(entries):
+    """
+    Batch Party bookkeeping for WaitlistEntry rows that have just transitioned to SERVED
+    (used where per-save signals don't fire, e.g. bulk_update). Counts one visit per entry,
+    keeps the latest name and last_visit per (restaurant, normalized phone), and writes with one
+    SELECT ... FOR UPDATE, one bulk_update and one bulk_create in its own transaction. If a
+    concurrent first visit created one of the new parties meanwhile, the new ones are counted
+    through record_party_visit instead, so no visit is dropped.
+    """
+    visits = {}
+    for entry in entries:
+        if not entry.phone_number:
+            continue
+        visited_at = entry.completion_time or entry.timestamp
+        key = (entry.restaurant_id, entry.phone_e164 or normalize_phone(entry.phone_number))
+        current = visits.get(key)
+        if current is None:
+            visits[key] = {
+                'count': 1, 'last_visit': visited_at, 'name': entry.customer_name, 'phone': entry.phone_number,
+                'phones': {entry.phone_number},
+            }
+        else:
+            current['count'] += 1
+            current['phones'].add(entry.phone_number)
+            if visited_at >= current['last_visit']:
+                current['last_visit'] = visited_at
+                current['name'] = entry.customer_name
+    if not visits:
+        return
+
+    restaurant_ids = {restaurant_id for restaurant_id, _ in visits}
+    keys = {key for _, key in visits}
+    phones = {phone for visit in visits.values() for phone in visit['phones']}
+    with transaction.atomic():
+        # Same rule as record_party_visit: rows not backfilled yet match on their stored phone, and
+        # of several spellings sharing a key the oldest party is the one that counts
+        existing = {}
+        for party in (
+            Party.objects.select_for_update()
+            .filter(Q(phone_e164__in=keys) | Q(phone_e164='', phone__in=phones), restaurant_id__in=restaurant_ids)
+            .order_by('id')
+        ):
+            existing.setdefault((party.restaurant_id, party.phone_e164 or normalize_phone(party.phone)), party)
+
+        to_update, to_create = [], []
+        for key, visit in visits.items():
+            party = existing.get(key)
+            if party is None:
+                party = Party(
+                    restaurant_id=key[0],
+                    phone=visit['phone'],
+                    name=visit['name'],
+                    visits=visit['count'],
+                    last_visit=visit['last_visit'],
+                )
+                party.set_search_fields() # bulk_create skips save()
+                to_create.append(party)
+                continue
+            party.name = visit['name']
+            party.visits += visit['count']
+            if not party.last_visit or visit['last_visit'] > party.last_visit:
+                party.last_visit = visit['last_visit']
+            party.set_search_fields() # Also backfills phone_e164 on a row matched by its phone
+            to_update.append(party)
+
+        if to_update:
+            Party.objects.bulk_update(to_update, ['name', 'visits', 'last_visit', 'name_normalized', 'phone_digits', 'phone_e164'])
+        if to_create:
+            try:
+                with transaction.atomic(): # Savepoint, so a conflict leaves the updates above intact
+                    Party.objects.bulk_create(to_create)
+            except IntegrityError:
+                for party in to_create:
+                    record_party_visit(party.restaurant_id, party.phone, party.name, party.last_visit, count=party.visits)
+    logger.info(f"Recorded served visits for {len(visits)} parties ({len(to_create)} new)")
+
+def rebuild_restaurant_parties(restaurant_id, batch_size=1000):
+    """
+    Recompute every visited party of one restaurant from its WaitlistEntry history (populate_parties).
+    A single windowed statement yields, per normalized phone: SERVED count, latest visit time and the
+    name and phone as written on the latest visit; rows are then compared with the existing parties and written with chunked
+    bulk_update/bulk_create, one short transaction per chunk. Idempotent, so an interrupted run can
+    simply be repeated. Notes are left alone and parties with no served visit are not touched.
+    Phones are matched to parties the way record_party_visit does it, so the rebuild fills in the
+    row live visits are counted on. Served entries without phone_e164 (not yet backfilled) are left
+    out, so populate_parties refuses to run while any exist. Returns counts for progress reporting.
+    """
+    visited_at = Coalesce('completion_time', 'timestamp')
+    latest_first = [visited_at.desc(), F('id').desc()]
+    by_phone = {'partition_by': [F('phone_e164')]}
+    history = (
+        WaitlistEntry.objects.filter(restaurant_id=restaurant_id, status='SERVED').exclude(phone_e164='')
+        .annotate(
+            served=Window(Count('id'), **by_phone),
+            last_served=Window(Max(visited_at), **by_phone),
+            latest_name=Window(FirstValue('customer_name'), order_by=latest_first, **by_phone),
+            latest_phone=Window(FirstValue('phone_number'), order_by=latest_first, **by_phone),
+        )
+        .values_list('phone_e164', 'served', 'last_served', 'latest_name', 'latest_phone')
+        .distinct()
+        .order_by()
+    )
+    existing = {}
+    for party_id, phone_e164, phone, name, visits, last_visit in (
+        Party.objects.filter(restaurant_id=restaurant_id).order_by('id')
+        .values_list('id', 'phone_e164', 'phone', 'name', 'visits', 'last_visit').iterator(chunk_size=batch_size)
+    ):
+        # As in record_party_visit: rows not backfilled yet match on their stored phone, and of
+        # several spellings sharing a key the oldest party is the one that counts
+        existing.setdefault(phone_e164 or normalize_phone(phone), (party_id, phone, name, visits, last_visit, phone_e164))
+
+    stats = {'restaurant_id': restaurant_id, 'phones': 0, 'created': 0, 'updated': 0, 'unchanged': 0}
+    to_update, to_create = [], []
+
+    def flush():
+        created = len(to_create)
+        with transaction.atomic():
+            if to_update:
+                Party.objects.bulk_update(
+                    to_update, ['name', 'visits', 'last_visit', 'name_normalized', 'phone_digits', 'phone_e164']
+                )
+            if to_create:
+                try:
+                    with transaction.atomic(): # Savepoint, so a conflict leaves the updates above intact
+                        Party.objects.bulk_create(to_create)
+                except IntegrityError:
+                    # A live visit created one of them meanwhile; it is counted on the next run
+                    created = 0
+                    for party in to_create:
+                        try:
+                            with transaction.atomic():
+                                Party.objects.bulk_create([party])
+                            created += 1
+                        except IntegrityError:
+                            pass
+        stats['updated'] += len(to_update)
+        stats['created'] += created
+        to_update.clear()
+        to_create.clear()
+
+    for phone_e164, served, last_served, name, phone in history.iterator(chunk_size=batch_size):
+        stats['phones'] += 1
+        current = existing.get(phone_e164)
+        if current is not None and current[2:5] == (name, served, last_served) and current[5]:
+            stats['unchanged'] += 1
+            continue
+        party = Party(
+            # An existing party keeps its phone as stored; only new ones take the latest spelling
+            id=current[0] if current else None, restaurant_id=restaurant_id, phone=current[1] if current else phone,
+            name=name, visits=served, last_visit=last_served,
+        )
+        party.set_search_fields() # bulk writes skip save()
+        (to_update if current else to_create).append(party)
+        if len(to_update) + len(to_create) >= batch_size:
+            flush()
+    flush()
+    return stats
+
+
+# ?sort= value -> (field, descending). Ties break on id in the same direction.
+PARTY_SORTS = {
+    '-last_visit': ('last_visit', True),
+    'last_visit': ('last_visit', False),
+    '-visits': ('visits', True),
+    'visits': ('visits', False),
+    'name': ('name_normalized', False),
+    '-name': ('name_normalized', True),
+}
+DEFAULT_PARTY_SORT = '-last_visit'
+
+def encode_party_cursor(party, sort):
+    field, _ = PARTY_SORTS[sort]
+    value = getattr(party, field)
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, party.id]).encode()).decode().rstrip('=')
+
+def decode_party_cursor(cursor, sort):
+    """(sort value, id) from an opaque cursor. Raises ValueError for anything malformed."""
+    try:
+        value, party_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('Invalid cursor.')
+    field, _ = PARTY_SORTS[sort]
+    if not isinstance(party_id, int) or (value is not None and not isinstance(value, str if field != 'visits' else int)):
+        raise ValueError('Invalid cursor.')
+    if field == 'last_visit' and value is not None:
+        value = parse_datetime(value)
+        if value is None:
+            raise ValueError('Invalid cursor.')
+    return value, party_id
+
+def _keyset_after(field, descending, value, party_id):
+    """Rows strictly after (value, id) in the sort order."""
+    if descending:
+        # The leading __lte gives the planner an index range; the OR resolves ties
+        return Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(id__lt=party_id))
+    return Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(id__gt=party_id))
+
+def _prefix_filter(field, prefix):
+    """startswith plus the equivalent half-open range [prefix, next prefix): the range lets any
+    btree index seek to the prefix (SQLite won't index a LIKE), startswith keeps exact semantics
+    under collations that order the range differently (on Postgres it's the indexed condition)."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper, f'{field}__startswith': prefix})
+
+def party_list_querysets(restaurant_id, search='', sort=DEFAULT_PARTY_SORT, cursor=None):
+    """
+    Ordered Party querysets behind the guest directory, read one after another. A search with
+    letters is a prefix match on the normalized name; one made only of digits and phone
+    punctuation is a prefix match on the phone digits. Raises ValueError for an unknown sort
+    or a bad cursor.
+
+    last_visit is nullable and databases disagree on where NULLs sort (and SQLite can't index
+    NULLS LAST), so that sort is two segments: visited parties in keyset order, then the
+    never-visited ones by id (first instead when ascending). Each segment is a plain index scan.
+    """
+    if sort not in PARTY_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(PARTY_SORTS)}.")
+    field, descending = PARTY_SORTS[sort]
+    direction = '-' if descending else ''
+    parties = Party.objects.filter(restaurant_id=restaurant_id)
+
+    search = (search or '').strip()
+    if search:
+        digits = party_phone_digits(search)
+        if digits and not any(char.isalpha() for char in search):
+            parties = parties.filter(_prefix_filter('phone_digits', digits))
+        elif normalized := normalize_party_name(search):
+            parties = parties.filter(_prefix_filter('name_normalized', normalized))
+
+    value, party_id = decode_party_cursor(cursor, sort) if cursor else (None, None)
+    if field != 'last_visit':
+        if cursor:
+            parties = parties.filter(_keyset_after(field, descending, value, party_id))
+        return [parties.order_by(f'{direction}{field}', f'{direction}id')]
+
+    visited = parties.filter(last_visit__isnull=False).order_by(f'{direction}last_visit', f'{direction}id')
+    never = parties.filter(last_visit__isnull=True).order_by(f'{direction}id')
+    if not cursor:
+        return [visited, never] if descending else [never, visited]
+    if value is None: # The previous page ended among the never-visited parties
+        never = never.filter(id__lt=party_id) if descending else never.filter(id__gt=party_id)
+        return [never] if descending else [never, visited]
+    visited = visited.filter(_keyset_after(field, descending, value, party_id))
+    return [visited, never] if descending else [visited]
+
+def search_parties(restaurant_id, search='', sort=DEFAULT_PARTY_SORT, cursor=None, limit=50):
+    """One keyset page of the guest directory: (parties, next_cursor). Page N costs the same as page 1."""
+    page = []
+    for parties in party_list_querysets(restaurant_id, search, sort, cursor):
+        page += parties[:limit + 1 - len(page)] # One extra row tells us whether there is a next page
+        if len(page) > limit:
+            break
+    next_cursor = encode_party_cursor(page[limit - 1], sort) if len(page) > limit else None
+    return page[:limit], next_cursor
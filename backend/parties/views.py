@@ -1,3 +1,95 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from auth_settings.models import Restaurant
+from .models import Party
+from .serializers import PartySerializer
+from .utils import DEFAULT_PARTY_SORT, search_parties
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _can_manage(user, restaurant_user_id):
+    return restaurant_user_id == user.pk or user.is_staff
+
+class PartyListAPIView(APIView):
+    """
+    A restaurant's guest directory: GET /api/restaurants/<restaurant_id>/parties/
+    - `?search=` prefix match on the name, or on the phone digits when the term has no letters
+    - `?sort=-last_visit|last_visit|-visits|visits|name|-name` (default -last_visit, never-visited last)
+    - `?cursor=` from the previous page's `next_cursor`, `?limit=` (default 50, max 200)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, restaurant_id):
+        restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
+        if not _can_manage(request.user, restaurant.user_id):
+            return Response({'error': 'You do not have permission to view these parties.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        sort = request.query_params.get('sort', DEFAULT_PARTY_SORT)
+        try:
+            parties, next_cursor = search_parties(
+                restaurant.id,
+                search=request.query_params.get('search', ''),
+                sort=sort,
+                cursor=request.query_params.get('cursor'),
+                limit=limit,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'results': PartySerializer(parties, many=True).data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'sort': sort,
+        })
+
+
+class PartyDetailAPIView(APIView):
+    """
+    GET, PUT/PATCH (name and notes) or DELETE one party: /api/parties/<pk>/
+    PUT is applied as a partial update so the directory can save just the notes.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_party(self, request, pk):
+        party = get_object_or_404(Party.objects.select_related('restaurant'), pk=pk)
+        if not _can_manage(request.user, party.restaurant.user_id):
+            return None
+        return party
+
+    def get(self, request, pk):
+        party = self.get_party(request, pk)
+        if party is None:
+            return Response({'error': 'You do not have permission to view this party.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(PartySerializer(party).data)
+
+    def put(self, request, pk):
+        party = self.get_party(request, pk)
+        if party is None:
+            return Response({'error': 'You do not have permission to edit this party.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = PartySerializer(party, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    patch = put
+
+    def delete(self, request, pk):
+        party = self.get_party(request, pk)
+        if party is None:
+            return Response({'error': 'You do not have permission to delete this party.'}, status=status.HTTP_403_FORBIDDEN)
+        party.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import ChannelMessage
+
+@admin.register(ChannelMessage)
+class ChannelMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at', 'expires_at')
+    readonly_fields = ('payload', 'created_at', 'expires_at')
@@ -0,0 +1,41 @@
+# realtime/auth.py
+"""
+Token authentication for WebSockets. Browsers can't set an Authorization header on a WebSocket,
+so the DRF token the API uses travels as ?token=<key> (an 'Authorization: Token <key>' header is
+accepted too, for other clients). A valid token replaces scope['user']; otherwise the user set by
+AuthMiddlewareStack (session, or AnonymousUser) is left in place.
+"""
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from rest_framework.authtoken.models import Token
+
+@database_sync_to_async
+def get_token_user(key):
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+def token_from_scope(scope):
+    values = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if values:
+        return values[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            keyword, _, key = value.decode().partition(' ')
+            if keyword.lower() == 'token' and key:
+                return key.strip()
+    return None
+
+class TokenAuthMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        key = token_from_scope(scope)
+        if key:
+            user = await get_token_user(key)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await self.app(scope, receive, send)
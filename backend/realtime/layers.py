@@ -0,0 +1,345 @@
+# realtime/layers.py
+"""
+Channel layer that fans messages out across processes through Postgres LISTEN/NOTIFY, so
+several daphne workers can share one waitlist group without running Redis.
+
+Every process keeps its own inboxes and group memberships in memory. group_send delivers to
+the local members straight away and publishes one NOTIFY on a shared channel; every other
+process's listener thread picks it up and delivers to *its* local members. Payloads too large
+for a NOTIFY go through the realtime_channelmessage table and the notification carries the id.
+
+Delivery is at-most-once, like the Redis pub/sub layer: a process whose listener is
+reconnecting misses what was published meanwhile (clients resync on reconnect).
+
+    CHANNEL_LAYERS = {'default': {
+        'BACKEND': 'realtime.layers.PostgresChannelLayer',
+        'CONFIG': {'database': 'default', 'expiry': 60, 'group_expiry': 86400, 'capacity': 100},
+    }}
+"""
+import asyncio
+import json
+import logging
+import re
+import select
+import threading
+import time
+import uuid
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from .models import ChannelMessage
+
+logger = logging.getLogger(__name__)
+
+MAX_NOTIFY_BYTES = 7900 # Postgres rejects payloads of 8000 bytes or more; leave room for the envelope
+CLEANUP_INTERVAL = 30 # Seconds between sweeps of expired memberships, messages, idle inboxes and overflow rows
+NOTIFY_CHANNEL_RE = re.compile(r'^[a-z_][a-z0-9_]{0,62}$')
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _Inbox:
+    """Messages waiting for one local channel, plus the receive() calls parked on it."""
+
+    def __init__(self):
+        self.messages = deque() # (expires_at, message)
+        self.waiters = deque() # asyncio futures, possibly on different event loops
+
+    def idle(self):
+        return not self.messages and not self.waiters
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self, database='default', notify_channel='qwait_channel_layer', expiry=60, group_expiry=86400,
+        capacity=100, channel_capacity=None, poll_interval=1.0, **kwargs
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        if not NOTIFY_CHANNEL_RE.match(notify_channel):
+            raise ValueError('notify_channel must be a lowercase SQL identifier')
+        self.database = database
+        self.notify_channel = notify_channel
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.client_prefix = uuid.uuid4().hex[:12] # Identifies this process's channels and NOTIFYs
+
+        self._lock = threading.Lock() # Inboxes and groups are touched by event loops and the listener thread
+        self._inboxes = {} # channel -> _Inbox
+        self._groups = {} # group -> {channel: joined_at}
+        self._publish_lock = threading.Lock()
+        self._publish_conn = None
+        self._listener = None
+        self._listening = threading.Event()
+        self._closed = False
+        self._last_cleanup = time.monotonic()
+        self.stats = {'published': 0, 'overflow': 0, 'received': 0, 'delivered': 0, 'dropped': 0, 'expired': 0}
+
+    # Connections
+
+    def _connect(self):
+        params = connections[self.database].get_connection_params()
+        params.pop('cursor_factory', None) # Django's cursor class isn't needed on these raw connections
+        conn = psycopg2.connect(**params)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT) # NOTIFY must not wait for a commit
+        return conn
+
+    def _publish(self, envelope):
+        """Blocking: one NOTIFY (plus an overflow row if needed). Runs in an executor thread."""
+        payload = json.dumps(envelope, cls=DjangoJSONEncoder, separators=(',', ':'))
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.closed:
+                        self._publish_conn = self._connect()
+                    with self._publish_conn.cursor() as cursor:
+                        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+                            cursor.execute(
+                                f"INSERT INTO {ChannelMessage._meta.db_table} (payload, created_at, expires_at) "
+                                "VALUES (%s, now(), now() + %s * interval '1 second') RETURNING id",
+                                [payload, self.expiry],
+                            )
+                            payload = json.dumps({'origin': self.client_prefix, 'ref': cursor.fetchone()[0]})
+                            self._count('overflow')
+                        cursor.execute('SELECT pg_notify(%s, %s)', [self.notify_channel, payload])
+                    self._count('published')
+                    return
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # Stale connection (server restart, idle timeout): reconnect once, then give up
+                    self._close_publish_conn()
+                    if attempt:
+                        raise
+
+    def _close_publish_conn(self):
+        if self._publish_conn is not None:
+            try:
+                self._publish_conn.close()
+            except psycopg2.Error:
+                pass
+            self._publish_conn = None
+
+    async def _publish_async(self, envelope):
+        await asyncio.get_running_loop().run_in_executor(None, self._publish, envelope)
+
+    # Listener thread
+
+    def wait_listening(self, timeout=5):
+        """Block until the listener thread has issued LISTEN (tests and the bench harness)."""
+        self._ensure_listener()
+        return self._listening.wait(timeout)
+
+    def _ensure_listener(self):
+        # Only processes that hold channels need to listen; pure publishers (management commands,
+        # sync views under WSGI) never start the thread.
+        if self._listener is None or not self._listener.is_alive():
+            with self._lock:
+                if self._listener is None or not self._listener.is_alive():
+                    self._closed = False
+                    self._listener = threading.Thread(
+                        target=self._listen, name=f'channel-layer-{self.client_prefix}', daemon=True
+                    )
+                    self._listener.start()
+
+    def _listen(self):
+        while not self._closed:
+            conn = None
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.notify_channel}')
+                self._listening.set()
+                while not self._closed:
+                    if select.select([conn], [], [], self.poll_interval)[0]:
+                        conn.poll()
+                        self._drain(conn)
+                    if time.monotonic() - self._last_cleanup > CLEANUP_INTERVAL:
+                        self._cleanup(conn)
+            except psycopg2.Error:
+                logger.exception('Channel layer listener lost its connection; reconnecting')
+                time.sleep(1)
+            finally:
+                self._listening.clear()
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def _drain(self, conn):
+        """Dispatch the notifications received so far. One bad payload on the shared channel must not
+        end the thread: consumers already parked in receive() would stop getting remote frames."""
+        while conn.notifies:
+            payload = conn.notifies.pop(0).payload
+            try:
+                self._dispatch(conn, payload)
+            except psycopg2.Error:
+                raise # Connection trouble; _listen reconnects
+            except Exception:
+                logger.exception(f'Channel layer skipped a malformed notification: {payload[:200]!r}')
+
+    def _dispatch(self, conn, payload):
+        envelope = json.loads(payload)
+        if envelope.get('origin') == self.client_prefix:
+            return # Already delivered locally by the sender
+        if 'ref' in envelope:
+            with conn.cursor() as cursor:
+                cursor.execute(f'SELECT payload FROM {ChannelMessage._meta.db_table} WHERE id = %s', [envelope['ref']])
+                row = cursor.fetchone()
+            if row is None:
+                self._count('expired') # Pruned before we got to it
+                return
+            envelope = json.loads(row[0])
+        self._count('received')
+        if 'group' in envelope:
+            self._deliver_group(envelope['group'], envelope['message'])
+        else:
+            self._deliver(envelope['channel'], envelope['message'], create=False)
+
+    def _cleanup(self, conn):
+        self._last_cleanup = time.monotonic()
+        self._expire_groups()
+        with conn.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {ChannelMessage._meta.db_table} WHERE expires_at < now()')
+
+    # Local delivery (thread-safe)
+
+    def _count(self, stat, n=1):
+        # Stats are bumped from event loops, executor threads and the listener thread alike
+        with self._lock:
+            self.stats[stat] += n
+
+    def _deliver(self, channel, message, create=True, raise_full=False):
+        with self._lock:
+            inbox = self._inboxes.get(channel)
+            if inbox is None:
+                if not create:
+                    return False
+                inbox = self._inboxes[channel] = _Inbox()
+            if len(inbox.messages) >= self.get_capacity(channel):
+                self.stats['dropped'] += 1
+                if raise_full:
+                    raise ChannelFull(channel)
+                return False
+            inbox.messages.append((time.time() + self.expiry, message))
+            self.stats['delivered'] += 1
+            while inbox.waiters:
+                waiter = inbox.waiters.popleft()
+                if not waiter.done():
+                    waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+                    break
+        return True
+
+    def _deliver_group(self, group, message):
+        with self._lock:
+            members = list(self._groups.get(group, ()))
+        for channel in members:
+            self._deliver(channel, message) # Full member inboxes drop the message, as group_send must not raise
+
+    def _expire_groups(self):
+        now = time.time()
+        cutoff = now - self.group_expiry
+        with self._lock:
+            for group, members in list(self._groups.items()):
+                for channel, joined_at in list(members.items()):
+                    if joined_at < cutoff:
+                        del members[channel]
+                if not members:
+                    del self._groups[group]
+            member_channels = {channel for members in self._groups.values() for channel in members}
+            for channel, inbox in list(self._inboxes.items()):
+                # Nobody may ever receive() again on a disconnected consumer's channel, so drop its
+                # expired messages here; they are queued oldest first, all with the same expiry
+                while inbox.messages and inbox.messages[0][0] <= now:
+                    inbox.messages.popleft()
+                    self.stats['expired'] += 1
+                if channel not in member_channels and inbox.idle():
+                    del self._inboxes[channel]
+
+    def _is_local(self, channel):
+        return '!' in channel and channel.split('!', 1)[0].endswith(self.client_prefix)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.require_valid_channel_name(channel), 'Channel name not valid'
+        assert '__asgi_channel__' not in message
+        if self._is_local(channel):
+            self._deliver(channel, message, raise_full=True)
+        else:
+            await self._publish_async({'origin': self.client_prefix, 'channel': channel, 'message': message})
+
+    async def receive(self, channel):
+        assert self.require_valid_channel_name(channel)
+        self._ensure_listener()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                inbox = self._inboxes.setdefault(channel, _Inbox())
+                now = time.time()
+                while inbox.messages:
+                    expires_at, message = inbox.messages.popleft()
+                    if expires_at > now:
+                        return message
+                    self.stats['expired'] += 1
+                waiter = loop.create_future()
+                inbox.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                with self._lock:
+                    if waiter in inbox.waiters:
+                        inbox.waiters.remove(waiter)
+
+    async def new_channel(self, prefix='specific'):
+        self._ensure_listener()
+        channel = f'{prefix}.{self.client_prefix}!{uuid.uuid4().hex}'
+        with self._lock:
+            self._inboxes[channel] = _Inbox()
+        return channel
+
+    async def group_add(self, group, channel):
+        assert self.require_valid_group_name(group), 'Group name not valid'
+        assert self.require_valid_channel_name(channel), 'Channel name not valid'
+        self._ensure_listener()
+        with self._lock:
+            self._groups.setdefault(group, {})[channel] = time.time()
+            self._inboxes.setdefault(channel, _Inbox())
+
+    async def group_discard(self, group, channel):
+        assert self.require_valid_group_name(group), 'Group name not valid'
+        assert self.require_valid_channel_name(channel), 'Channel name not valid'
+        with self._lock:
+            members = self._groups.get(group)
+            if members is not None:
+                members.pop(channel, None)
+                if not members:
+                    del self._groups[group]
+            inbox = self._inboxes.get(channel)
+            if inbox is not None and inbox.idle() and not any(channel in m for m in self._groups.values()):
+                del self._inboxes[channel]
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.require_valid_group_name(group), 'Group name not valid'
+        self._deliver_group(group, message)
+        await self._publish_async({'origin': self.client_prefix, 'group': group, 'message': message})
+
+    async def flush(self):
+        with self._lock:
+            self._inboxes.clear()
+            self._groups.clear()
+
+    async def close(self):
+        self._closed = True
+        with self._publish_lock:
+            self._close_publish_conn()
+        if self._listener is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._listener.join, self.poll_interval * 2)
+            self._listener = None
@@ -0,0 +1,137 @@
+# realtime/management/commands/bench_channel_layer.py
+import asyncio
+import multiprocessing
+import queue
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+GROUP = 'bench_channel_layer'
+
+def _layer_config(database):
+    config = settings.CHANNEL_LAYERS.get('default', {})
+    options = dict(config.get('CONFIG', {})) if config.get('BACKEND') == 'realtime.layers.PostgresChannelLayer' else {}
+    options['database'] = database
+    options.setdefault('capacity', 10000) # The bench floods one group; don't let the default capacity drop messages
+    return options
+
+def _worker(index, database, messages, timeout, ready, results):
+    """One 'daphne worker': its own process, layer and listener, one channel in the shared group."""
+    import django
+    django.setup() # Spawned processes start with a bare interpreter
+    from realtime.layers import PostgresChannelLayer
+
+    async def run():
+        layer = PostgresChannelLayer(**_layer_config(database))
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        if not await asyncio.get_running_loop().run_in_executor(None, layer.wait_listening, 10):
+            results.put((index, [], 'listener did not start'))
+            return
+        ready.put(index)
+        latencies = []
+        try:
+            while len(latencies) < messages:
+                message = await asyncio.wait_for(layer.receive(channel), timeout)
+                latencies.append((time.time() - message['sent_at']) * 1000)
+        except asyncio.TimeoutError:
+            pass # Report what arrived; the parent counts the rest as lost
+        await layer.close()
+        results.put((index, latencies, None))
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = (
+        'Multi-process harness for realtime.layers.PostgresChannelLayer: starts --workers processes that '
+        'each join one group, publishes --messages group messages from this process, and reports '
+        'cross-process delivery latency and loss'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Receiving processes (default 4)')
+        parser.add_argument('--messages', type=int, default=1000, help='Group messages to publish (default 1000)')
+        parser.add_argument('--rate', type=float, default=200, help='Messages per second, 0 for as fast as possible (default 200)')
+        parser.add_argument('--payload-bytes', type=int, default=300, help='Approximate message size; above ~7900 uses the overflow table (default 300)')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds a worker waits for the next message (default 10)')
+        parser.add_argument('--database', default='default', help='Database alias to LISTEN/NOTIFY on (default: default)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['messages'] < 1:
+            raise CommandError('--workers and --messages must be positive')
+        if connections[options['database']].vendor != 'postgresql':
+            raise CommandError('The Postgres channel layer needs a PostgreSQL database')
+        connections.close_all() # Nothing inherited by the workers
+
+        context = multiprocessing.get_context('spawn')
+        ready, results = context.Queue(), context.Queue()
+        workers = [
+            context.Process(
+                target=_worker,
+                args=(index, options['database'], options['messages'], options['timeout'], ready, results),
+            )
+            for index in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for _ in workers:
+                ready.get(timeout=60)
+        except queue.Empty:
+            for worker in workers:
+                worker.terminate()
+            raise CommandError('Workers did not join the group within 60s')
+        self.stdout.write(f"{len(workers)} workers listening; publishing {options['messages']} messages...")
+
+        published_in = asyncio.run(self.publish(options))
+
+        per_worker = {}
+        for _ in workers:
+            index, latencies, error = results.get(timeout=options['timeout'] + 60)
+            if error:
+                raise CommandError(f'Worker {index}: {error}')
+            per_worker[index] = latencies
+        for worker in workers:
+            worker.join()
+
+        self.stdout.write(f"Published in {published_in:.2f}s ({options['messages'] / published_in:.0f} msg/s)")
+        all_latencies = sorted(latency for latencies in per_worker.values() for latency in latencies)
+        expected = options['messages'] * len(workers)
+        for index, latencies in sorted(per_worker.items()):
+            self.stdout.write(f"  worker {index}: {len(latencies)}/{options['messages']} received, {self.summary(sorted(latencies))}")
+        self.stdout.write(self.style.SUCCESS(
+            f"All workers: {len(all_latencies)}/{expected} delivered ({expected - len(all_latencies)} lost), "
+            f"{self.summary(all_latencies)}"
+        ))
+
+    async def publish(self, options):
+        from realtime.layers import PostgresChannelLayer
+        layer = PostgresChannelLayer(**_layer_config(options['database']))
+        padding = 'x' * max(options['payload_bytes'] - 60, 0)
+        interval = 1 / options['rate'] if options['rate'] > 0 else 0
+        started = time.perf_counter()
+        for sequence in range(options['messages']):
+            await layer.group_send(GROUP, {'type': 'bench.message', 'seq': sequence, 'sent_at': time.time(), 'padding': padding})
+            if interval:
+                # Pace against the schedule rather than sleeping a fixed interval after each send
+                delay = started + (sequence + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        elapsed = time.perf_counter() - started
+        await layer.close()
+        return elapsed
+
+    @staticmethod
+    def summary(latencies):
+        if not latencies:
+            return 'no deliveries'
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+        return (
+            f"latency ms p50={statistics.median(latencies):.2f} p95={pct(95):.2f} "
+            f"p99={pct(99):.2f} max={latencies[-1]:.2f}"
+        )
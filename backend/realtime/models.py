@@ -0,0 +1,20 @@
+from django.db import models
+
+class ChannelMessage(models.Model):
+    """
+    Overflow storage for channel layer messages too large for a NOTIFY payload (Postgres caps
+    those at 8000 bytes). The notification carries only the row id; every listening process
+    reads the row, so rows are kept until expires_at and then pruned by the layer.
+    Written and read with raw SQL on the layer's own connections (see realtime.layers).
+    """
+    payload = models.TextField() # JSON envelope: origin, group or channel, message
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Channel message #{self.id} (expires {self.expires_at})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='channel_message_expiry_idx'),
+        ]
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+import unittest
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from .layers import MAX_NOTIFY_BYTES, PostgresChannelLayer
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY needs PostgreSQL')
+class PostgresChannelLayerTests(TransactionTestCase):
+    """Two layer instances stand in for two worker processes sharing one database."""
+
+    def setUp(self):
+        self.worker_a = PostgresChannelLayer(notify_channel='qwait_channel_layer_test', poll_interval=0.1)
+        self.worker_b = PostgresChannelLayer(notify_channel='qwait_channel_layer_test', poll_interval=0.1)
+
+    def tearDown(self):
+        async def close():
+            await self.worker_a.close()
+            await self.worker_b.close()
+        asyncio.run(close())
+
+    def run_async(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 5))
+
+    def test_group_send_reaches_members_in_other_processes(self):
+        async def scenario():
+            local = await self.worker_a.new_channel()
+            remote = await self.worker_b.new_channel()
+            await self.worker_a.group_add('waitlist_1', local)
+            await self.worker_b.group_add('waitlist_1', remote)
+            self.assertTrue(self.worker_b.wait_listening())
+            await self.worker_a.group_send('waitlist_1', {'type': 'send.waitlist.update', 'data': {'id': 7}})
+            return await self.worker_a.receive(local), await self.worker_b.receive(remote)
+        local_message, remote_message = self.run_async(scenario())
+        self.assertEqual(local_message['data'], {'id': 7})
+        self.assertEqual(remote_message, local_message)
+
+    def test_discarded_channel_gets_nothing(self):
+        async def scenario():
+            kept = await self.worker_b.new_channel()
+            dropped = await self.worker_b.new_channel()
+            await self.worker_b.group_add('waitlist_1', kept)
+            await self.worker_b.group_add('waitlist_1', dropped)
+            await self.worker_b.group_discard('waitlist_1', dropped)
+            self.assertTrue(self.worker_b.wait_listening())
+            await self.worker_a.group_send('waitlist_1', {'type': 'send.waitlist.remove', 'data': {'id': 1}})
+            await self.worker_b.receive(kept)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.worker_b.receive(dropped), 0.5)
+        self.run_async(scenario())
+
+    def test_large_payload_goes_through_overflow_table(self):
+        big = 'x' * (MAX_NOTIFY_BYTES * 2)
+        async def scenario():
+            channel = await self.worker_b.new_channel()
+            await self.worker_b.group_add('waitlist_1', channel)
+            self.assertTrue(self.worker_b.wait_listening())
+            await self.worker_a.group_send('waitlist_1', {'type': 'send.waitlist.bulk', 'data': big})
+            return await self.worker_b.receive(channel)
+        self.assertEqual(self.run_async(scenario())['data'], big)
+        self.assertEqual(self.worker_a.stats['overflow'], 1)
+
+    def test_direct_send_to_a_channel_in_another_process(self):
+        async def scenario():
+            channel = await self.worker_b.new_channel()
+            self.assertTrue(self.worker_b.wait_listening())
+            await self.worker_a.send(channel, {'type': 'hello'})
+            return await self.worker_b.receive(channel)
+        self.assertEqual(self.run_async(scenario()), {'type': 'hello'})
+
+    def test_expired_memberships_and_messages(self):
+        self.worker_b.group_expiry = 0
+        self.worker_b.expiry = 0
+        async def scenario():
+            channel = await self.worker_b.new_channel()
+            await self.worker_b.group_add('waitlist_1', channel)
+            self.worker_b._expire_groups()
+            self.worker_b._deliver_group('waitlist_1', {'type': 'late'})
+            self.assertEqual(self.worker_b._groups, {})
+            await self.worker_b.send(channel, {'type': 'stale'})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.worker_b.receive(channel), 0.2)
+        self.run_async(scenario())
+        self.assertEqual(self.worker_b.stats['expired'], 1)
+
+
+class ChannelLayerCleanupTests(SimpleTestCase):
+    """The periodic sweep needs no database: it only walks this process's inboxes."""
+
+    def test_sweep_frees_inboxes_left_with_expired_messages(self):
+        layer = PostgresChannelLayer(expiry=0)
+        layer._deliver('specific.gone!abc', {'type': 'unread'}) # Its consumer disconnected without reading
+        self.assertIn('specific.gone!abc', layer._inboxes)
+        layer._expire_groups()
+        self.assertEqual(layer._inboxes, {})
+        self.assertEqual(layer.stats['expired'], 1)
+
+    def test_malformed_notifications_are_skipped(self):
+        layer = PostgresChannelLayer()
+        layer._groups['waitlist_1'] = {'specific.here!abc': time.time()}
+        notify = lambda payload: SimpleNamespace(payload=payload)
+        conn = SimpleNamespace(notifies=[
+            notify('not json'),
+            notify(json.dumps({'origin': 'elsewhere', 'group': 'waitlist_1'})), # No message
+            notify(json.dumps({'origin': 'elsewhere', 'group': 'waitlist_1', 'message': {'type': 'ok'}})),
+        ])
+        with self.assertLogs('realtime.layers', 'ERROR') as logs:
+            layer._drain(conn)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual([message for _, message in layer._inboxes['specific.here!abc'].messages], [{'type': 'ok'}])
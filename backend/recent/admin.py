@@ -1,3 +1,11 @@
 from django.contrib import admin
+from .models import ActivityEvent
 
-# Register your models here.
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'restaurant', 'kind', 'object_id', 'created_at')
+    list_filter = ('kind', 'restaurant')
+    readonly_fields = ('restaurant', 'kind', 'object_id', 'data', 'created_at') # Append-only
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recent'
+
+    def ready(self):
+        import recent.signals # Activity log
@@ -0,0 +1,48 @@
+# recent/management/commands/prune_activity.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recent.models import ActivityEvent
+
+class Command(BaseCommand):
+    help = (
+        'Retention for the activity log: delete events older than --days, and compact events older than '
+        '--compact-days by dropping plain edits (creations, status changes, deletions and notifications are kept)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Delete every event older than this (default 90)')
+        parser.add_argument('--compact-days', type=int, default=14, help='Drop *.updated events older than this (default 14)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement (default 5000)')
+        parser.add_argument('--dry-run', action='store_true', help='Report how many rows would be deleted without writing')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['compact_days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days, --compact-days and --batch-size must be positive')
+        now = timezone.now()
+        expired = ActivityEvent.objects.filter(created_at__lt=now - timedelta(days=options['days']))
+        compactable = ActivityEvent.objects.filter(
+            created_at__lt=now - timedelta(days=options['compact_days']), kind__endswith='.updated'
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} expired and {compactable.count()} compactable events would be deleted.")
+            return
+
+        deleted_expired = self.delete_in_batches(expired, options['batch_size'])
+        deleted_compacted = self.delete_in_batches(compactable, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted_expired} expired and {deleted_compacted} compacted activity events."
+        ))
+
+    def delete_in_batches(self, queryset, batch_size):
+        # Short statements keep locks brief while the app keeps appending events
+        total = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            deleted, _ = ActivityEvent.objects.filter(id__in=ids).delete()
+            total += deleted
@@ -1,3 +1,45 @@
 from django.db import models
+from django.utils import timezone
+from auth_settings.models import Restaurant
 
-# Create your models here.
+class ActivityEvent(models.Model):
+    """
+    Append-only log of waitlist, reservation and notification mutations, one compact row per
+    change, written in the same transaction as the change (see recent.utils / recent.signals).
+    Rows are never updated; prune_activity removes old ones.
+    """
+    KIND_CHOICES = [
+        ('waitlist.created', 'Waitlist entry added'),
+        ('waitlist.updated', 'Waitlist entry edited'),
+        ('waitlist.status', 'Waitlist status changed'),
+        ('waitlist.deleted', 'Waitlist entry deleted'),
+        ('reservation.created', 'Reservation created'),
+        ('reservation.updated', 'Reservation edited'),
+        ('reservation.checked_in', 'Reservation checked in'),
+        ('reservation.deleted', 'Reservation deleted'),
+        ('notification.sent', 'Notification sent'),
+        ('notification.failed', 'Notification failed'),
+    ]
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='activity_events')
+    kind = models.CharField(max_length=24, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField(blank=True, null=True) # WaitlistEntry / Reservation id
+    data = models.JSONField(default=dict, blank=True) # Small summary: name, size, status change, channels...
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} (restaurant {self.restaurant_id}) at {self.created_at}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('ActivityEvent rows are append-only.')
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            # Keyset pagination: WHERE restaurant_id = ? AND id < ? ORDER BY id DESC
+            models.Index(fields=['restaurant', 'id'], name='recent_activity_rest_id_idx'),
+            # Retention sweeps
+            models.Index(fields=['created_at'], name='recent_activity_created_idx'),
+        ]
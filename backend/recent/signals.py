@@ -0,0 +1,44 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from reservation.models import Reservation
+from waitlist.models import WaitlistEntry
+from .utils import NOTIFICATION_FIELDS, record_event, reservation_summary, waitlist_summary
+
+def _deleting(origin, model):
+    """True when the delete targeted `model` itself, not a cascade from a restaurant or user
+    being removed (whose events go with it)."""
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+@receiver(post_save, sender=WaitlistEntry)
+def log_waitlist_save(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        record_event(instance.restaurant_id, 'waitlist.created', instance.id, waitlist_summary(instance))
+    elif getattr(instance, 'previous_status', None) not in (None, instance.status):
+        record_event(
+            instance.restaurant_id, 'waitlist.status', instance.id,
+            {**waitlist_summary(instance), 'from': instance.previous_status}
+        )
+    elif not (update_fields and set(update_fields) <= NOTIFICATION_FIELDS):
+        record_event(instance.restaurant_id, 'waitlist.updated', instance.id, waitlist_summary(instance))
+
+@receiver(post_delete, sender=WaitlistEntry)
+def log_waitlist_delete(sender, instance, origin=None, **kwargs):
+    if _deleting(origin, WaitlistEntry):
+        record_event(instance.restaurant_id, 'waitlist.deleted', instance.id, waitlist_summary(instance))
+
+@receiver(post_save, sender=Reservation)
+def log_reservation_save(sender, instance, created, **kwargs):
+    if created:
+        kind = 'reservation.created'
+    elif instance.checked_in and getattr(instance, 'previous_checked_in', None) is False:
+        kind = 'reservation.checked_in'
+    else:
+        kind = 'reservation.updated'
+    record_event(instance.restaurant_id, kind, instance.id, reservation_summary(instance))
+
+@receiver(post_delete, sender=Reservation)
+def log_reservation_delete(sender, instance, origin=None, **kwargs):
+    if _deleting(origin, Reservation):
+        record_event(instance.restaurant_id, 'reservation.deleted', instance.id, reservation_summary(instance))
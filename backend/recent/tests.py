@@ -1,3 +1,110 @@
+from datetime import date, time, timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from auth_settings.models import CustomUser, Restaurant
+from reservation.models import Reservation
+from waitlist.models import WaitlistEntry
+from .models import ActivityEvent
+
+
+class ActivityLogTests(TestCase):
+    """Mutations append events, and the feed pages through them by keyset."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def kinds(self):
+        return list(ActivityEvent.objects.filter(restaurant=self.restaurant).order_by('id').values_list('kind', flat=True))
+
+    def test_waitlist_and_reservation_mutations(self):
+        entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='5550000000', people_count=2
+        )
+        entry.notes = 'window seat'
+        entry.save()
+        entry.status = 'SERVED'
+        entry.save()
+        entry.delete()
+
+        reservation = Reservation.objects.create(
+            restaurant=self.restaurant, name='Booker', phone='5551111111', party_size=4,
+            date=date.today() + timedelta(days=1), time=time(19, 0)
+        )
+        reservation.checked_in = True
+        reservation.save()
+        reservation.delete()
+
+        self.assertEqual(self.kinds(), [
+            'waitlist.created', 'waitlist.updated', 'waitlist.status', 'waitlist.deleted',
+            'reservation.created', 'reservation.checked_in', 'reservation.deleted',
+        ])
+        status_event = ActivityEvent.objects.get(kind='waitlist.status')
+        self.assertEqual((status_event.data['from'], status_event.data['status']), ('WAITING', 'SERVED'))
+
+    def test_bulk_action_logs_each_change(self):
+        entries = [
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name=f'Guest {i}', phone_number=f'555000000{i}', people_count=2
+            )
+            for i in range(3)
+        ]
+        response = self.client.post('/api/waitlist/entries/bulk/', {'operations': [
+            {'id': entries[0].id, 'op': 'set_status', 'status': 'SERVED'},
+            {'id': entries[1].id, 'op': 'delete'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.kinds()[3:], ['waitlist.status', 'waitlist.deleted'])
+
+    def test_events_are_append_only(self):
+        event = ActivityEvent.objects.create(restaurant=self.restaurant, kind='waitlist.created')
+        event.kind = 'waitlist.deleted'
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_keyset_pagination_and_tailing(self):
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        ActivityEvent.objects.bulk_create([
+            ActivityEvent(restaurant=self.restaurant, kind='waitlist.created', object_id=i, created_at=an_hour_ago)
+            for i in range(7)
+        ])
+        ids = sorted(ActivityEvent.objects.values_list('id', flat=True), reverse=True)
+
+        # Token, restaurant, one page query; no COUNT(*)
+        with self.assertNumQueries(3):
+            first = self.client.get('/api/recent/activity/', {'limit': 3}).data
+        self.assertEqual([event['id'] for event in first['events']], ids[:3])
+        self.assertTrue(first['has_more'])
+
+        second = self.client.get('/api/recent/activity/', {'limit': 3, 'before': first['next_before']}).data
+        self.assertEqual([event['id'] for event in second['events']], ids[3:6])
+        third = self.client.get('/api/recent/activity/', {'limit': 3, 'before': second['next_before']}).data
+        self.assertEqual([event['id'] for event in third['events']], ids[6:])
+        self.assertFalse(third['has_more'])
+
+        self.assertEqual(first['latest_id'], ids[0])
+        ActivityEvent.objects.create(restaurant=self.restaurant, kind='notification.sent')
+        tail = self.client.get('/api/recent/activity/', {'after': first['latest_id']}).data
+        self.assertEqual([event['kind'] for event in tail['events']], ['notification.sent'])
+        # Too recent to be sure nothing below it is still uncommitted: the cursor stays put
+        self.assertEqual(tail['latest_id'], ids[0])
+        again = self.client.get('/api/recent/activity/', {'after': tail['latest_id']}).data
+        self.assertEqual(again['events'], tail['events'])
 
-# Create your tests here.
+    def test_tail_cursor_stops_before_events_that_may_still_be_committing(self):
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        settled, recent, newest = ActivityEvent.objects.bulk_create([
+            ActivityEvent(restaurant=self.restaurant, kind='waitlist.created', object_id=1, created_at=an_hour_ago),
+            ActivityEvent(restaurant=self.restaurant, kind='waitlist.created', object_id=2),
+            ActivityEvent(restaurant=self.restaurant, kind='waitlist.created', object_id=3, created_at=an_hour_ago),
+        ])
+        ids = sorted(event.id for event in (settled, recent, newest))
+        page = self.client.get('/api/recent/activity/', {'after': ids[0] - 1}).data
+        self.assertEqual([event['id'] for event in page['events']], ids[::-1])
+        self.assertEqual(page['latest_id'], ids[0]) # Never past the recent event, whatever comes after it
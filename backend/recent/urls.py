@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import ActivityFeedAPIView
+
+urlpatterns = [
+    path('activity/', ActivityFeedAPIView.as_view(), name='activity_feed_api'), # ?before=&after=&kind=&limit=
+]
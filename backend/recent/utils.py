@@ -0,0 +1,33 @@
+from .models import ActivityEvent
+
+# Saves that only stamp these fields are reported by the notification event instead
+NOTIFICATION_FIELDS = {'notified_at', 'notified_sms_at', 'notified_email_at', 'notification_attempts', 'updated_at'}
+
+def waitlist_summary(entry):
+    return {'name': entry.customer_name, 'size': entry.people_count, 'status': entry.status, 'source': entry.source}
+
+def reservation_summary(reservation):
+    return {
+        'name': reservation.name,
+        'size': reservation.party_size,
+        'date': reservation.date.isoformat() if reservation.date else None,
+        'time': reservation.time.strftime('%H:%M') if reservation.time else None,
+    }
+
+def record_event(restaurant_id, kind, object_id=None, data=None):
+    """Append one event. Call inside the transaction that made the change."""
+    return ActivityEvent.objects.create(restaurant_id=restaurant_id, kind=kind, object_id=object_id, data=data or {})
+
+def waitlist_status_event(entry, previous_status):
+    """Unsaved event for a status transition (for bulk writes that skip post_save)."""
+    return ActivityEvent(
+        restaurant_id=entry.restaurant_id,
+        kind='waitlist.status',
+        object_id=entry.id,
+        data={**waitlist_summary(entry), 'from': previous_status},
+    )
+
+def record_events(events):
+    """Append several unsaved events with one INSERT."""
+    if events:
+        ActivityEvent.objects.bulk_create(events)
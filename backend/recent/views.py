@@ -1,3 +1,83 @@
-from django.shortcuts import render
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from waitlist.permissions import IsRestaurantOwner
+from waitlist.utils import DELTA_CURSOR_SKEW
+from .models import ActivityEvent
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+KIND_PREFIXES = ('waitlist', 'reservation', 'notification')
+
+class ActivityFeedAPIView(APIView):
+    """
+    Newest-first activity feed for the owner's restaurant with keyset pagination on (restaurant, id):
+    - `?before=<id>` pages back through older events (pass the previous `next_before`)
+    - `?after=<id>` returns events newer than `<id>`, oldest unseen first if there are more than
+      `limit` (tailing; pass the previous `latest_id`)
+    - `?kind=waitlist|reservation|notification` and `?limit=` (default 50, max 200)
+    Every page is an index range scan, so cost doesn't grow with the size of the log.
+    Ids are handed out at insert but become visible at commit, so a slow transaction can commit an
+    id below one a client has already seen. As in the waitlist change feed, `latest_id` therefore
+    stops short of events created within DELTA_CURSOR_SKEW of the read: those come again on the
+    next tail, and clients de-duplicate by id.
+    """
+    permission_classes = [IsAuthenticated, IsRestaurantOwner]
+
+    def get(self, request):
+        restaurant = request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            before = request.query_params.get('before')
+            after = request.query_params.get('after')
+            before = int(before) if before else None
+            after = int(after) if after else None
+        except ValueError:
+            return Response({'error': 'limit, before and after must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        horizon = timezone.now() - DELTA_CURSOR_SKEW # Taken before reading: older events are all committed
+        events = ActivityEvent.objects.filter(restaurant=restaurant)
+        kind = request.query_params.get('kind')
+        if kind:
+            if kind not in KIND_PREFIXES:
+                return Response({'error': f"kind must be one of {', '.join(KIND_PREFIXES)}."}, status=status.HTTP_400_BAD_REQUEST)
+            events = events.filter(kind__startswith=f'{kind}.')
+        if before is not None:
+            events = events.filter(id__lt=before)
+        if after is not None:
+            events = events.filter(id__gt=after)
+
+        fields = ('id', 'kind', 'object_id', 'data', 'created_at')
+        # One extra row tells us whether another page exists without a COUNT(*)
+        if after is not None and before is None:
+            # Tailing: oldest unseen events first so `latest_id` never skips any; shown newest-first
+            page = list(events.order_by('id').values(*fields)[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit]
+            latest_id = after
+            for event in page:
+                if event['created_at'] >= horizon:
+                    break
+                latest_id = event['id']
+            page = page[::-1]
+            next_before = None
+        else:
+            page = list(events.order_by('-id').values(*fields)[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit]
+            next_before = page[-1]['id'] if has_more else None
+            latest_id = next((event['id'] for event in page if event['created_at'] < horizon), None)
+            if latest_id is None:
+                latest_id = page[-1]['id'] - 1 if page else after # Everything shown is recent: tail it all again
+
+        return Response({
+            'events': page,
+            'has_more': has_more, # Tailing: more new events to fetch; otherwise: older page available
+            'next_before': next_before,
+            'latest_id': latest_id, # Pass as `after`; may re-send events near the end (see above)
+        })
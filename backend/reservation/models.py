@@ -1,13 +1,15 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings # To get AUTH_USER_MODEL if needed, though Restaurant links to CustomUser directly
 from auth_settings.models import Restaurant # New import
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from notifications.utils import normalize_phone
 
 class Reservation(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='reservations')
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=15) # Consider E.164 validator/field
+    phone_e164 = models.CharField(max_length=24, blank=True, default='', editable=False) # normalize_phone(phone), set in save()
     party_size = models.PositiveIntegerField(default=1)
     date = models.DateField()
     time = models.TimeField()
@@ -20,6 +22,22 @@ class Reservation(models.Model):
     def __str__(self):
         return f"{self.name} - {self.date.strftime('%Y-%m-%d')} at {self.time.strftime('%I:%M %p')} ({self.restaurant.name})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_checked_in = instance.__dict__.get('checked_in')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.previous_checked_in = getattr(self, '_loaded_checked_in', None) # None for new rows
+        self.phone_e164 = normalize_phone(self.phone)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'phone_e164'}
+        # post_save handlers (version bump, activity log) commit or roll back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_checked_in = self.checked_in
+
     def clean(self):
         # Ensure reservation date is not in the past.
         if self.date < timezone.now().date():
@@ -34,3 +52,6 @@ class Reservation(models.Model):
     class Meta:
         ordering = ['date', 'time']
         unique_together = ['restaurant', 'phone', 'date', 'time']
+        indexes = [
+            models.Index(fields=['restaurant', 'phone_e164'], name='reservation_rest_phone_idx'),
+        ]
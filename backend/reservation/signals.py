@@ -0,0 +1,18 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from auth_settings.models import Restaurant
+from .models import Reservation
+
+def bump_reservation_version(restaurant_id):
+    Restaurant.objects.filter(pk=restaurant_id).update(reservation_version=F('reservation_version') + 1)
+
+@receiver(post_save, sender=Reservation)
+def bump_version_on_save(sender, instance, **kwargs):
+    """Create/update/check-in changes the reservation list, so its ETag must change too."""
+    bump_reservation_version(instance.restaurant_id)
+
+@receiver(post_delete, sender=Reservation)
+def bump_version_on_delete(sender, instance, **kwargs):
+    bump_reservation_version(instance.restaurant_id)
@@ -1,3 +1,53 @@
+from datetime import time, timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from auth_settings.models import CustomUser, Restaurant
+from .models import Reservation
+
+
+class ReservationConditionalGetTests(TestCase):
+    """If-None-Match on the reservation list short-circuits to 304 with minimal queries."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='host@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.date = timezone.now().date() + timedelta(days=1)
+        for hour in range(17, 21):
+            Reservation.objects.create(
+                restaurant=self.restaurant, name=f'Guest {hour}', phone=f'55520000{hour}',
+                party_size=2, date=self.date, time=time(hour, 0)
+            )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.url = f'/api/restaurants/{self.restaurant.id}/reservations/?date={self.date.isoformat()}'
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Token lookup + restaurant row only
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Reservation.objects.create(
+            restaurant=self.restaurant, name='Walk-up', phone='5552009999',
+            party_size=4, date=self.date, time=time(21, 30)
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['reservations']), 5)
 
-# Create your tests here.
+    def test_other_date_has_different_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        other = f'/api/restaurants/{self.restaurant.id}/reservations/?date={(self.date + timedelta(days=1)).isoformat()}'
+        response = self.client.get(other, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
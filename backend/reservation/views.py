@@ -1,7 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
 from django.core.cache import cache
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.contrib.auth.models import AnonymousUser # For permission checks
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -16,6 +16,8 @@ from .serializers import ReservationSerializer
 from auth_settings.models import Restaurant # New import
 from waitlist.models import WaitlistEntry # For check-in functionality
 from waitlist.serializers import WaitlistEntrySerializer # For check-in response, if needed
+from waitlist.broadcast import broadcast_waitlist_update
+from waitlist.cache import make_etag, etag_matches, with_etag, not_modified # Conditional GET helpers
 from parties.models import Party # New import from parties app
 
 logger = logging.getLogger(__name__)
@@ -69,7 +71,7 @@ class ReservationListCreateAPIView(APIView):
     def get(self, request, restaurant_id):
         restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
         # Check if the user has permission to view reservations for this restaurant
-        if restaurant.user != request.user and not request.user.is_staff:
+        if restaurant.user_id != request.user.pk and not request.user.is_staff:
             return Response({'error': 'You do not have permission to view these reservations.'}, status=status.HTTP_403_FORBIDDEN)
 
         date_str = request.query_params.get('date')
@@ -80,21 +82,26 @@ class ReservationListCreateAPIView(APIView):
                 filter_date = timezone.now().date()
         except ValueError:
             return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Unchanged reservation version for this date -> 304 without touching the reservations table
+        etag = make_etag('rsv', restaurant.id, restaurant.reservation_version, filter_date.isoformat())
+        if etag_matches(request, etag):
+            return not_modified(etag)
         
         reservations = Reservation.objects.filter(
             restaurant=restaurant,
             date=filter_date
         ).order_by('time')
         serializer = ReservationSerializer(reservations, many=True)
-        return Response({
+        return with_etag(Response({
             'date': filter_date.isoformat(),
             'reservations': serializer.data
-        })
+        }), etag)
 
     def post(self, request, restaurant_id):
         restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
         # Check if the user has permission to create a reservation for this restaurant
-        if restaurant.user != request.user and not request.user.is_staff:
+        if restaurant.user_id != request.user.pk and not request.user.is_staff:
             return Response({'error': 'You do not have permission to create reservations for this restaurant.'}, status=status.HTTP_403_FORBIDDEN)
 
         data = request.data.copy()
@@ -189,39 +196,44 @@ class ReservationCheckInAPIView(APIView):
             return Response({'error': 'Reservation already checked in.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            reservation.checked_in = True
-            reservation.check_in_time = timezone.now()
-            reservation.save()
-
-            # Add to waitlist (using WaitlistEntry from waitlist app)
-            # The logic for timestamp (e.g., placing at top) needs consideration
-            # Original code used a timestamp 30 days in the future.
-            # For DRF/API view, it might be better to let the waitlist app handle its own ordering
-            # or provide a specific flag/field if priority is needed.
-            entry_timestamp = timezone.now() # Or adjust as per desired waitlist logic
-
-            waitlist_entry_data = {
-                'restaurant': reservation.restaurant.id,
-                'customer_name': reservation.name,
-                'phone_number': reservation.phone,
-                'people_count': reservation.party_size,
-                'timestamp': entry_timestamp, 
-                'notes': f"Reservation: {reservation.time.strftime('%I:%M %p')}. {reservation.notes or ''}",
-                'status': 'WAITING'
-            }
-            # Directly create WaitlistEntry or call a service/signal in waitlist app
-            # For now, direct creation:
-            waitlist_entry = WaitlistEntry.objects.create(**waitlist_entry_data)
-            
-            # WebSocket update for waitlist should be handled by WaitlistEntry signals or save method
-            # if such a mechanism is in place (as it was for customer_interface). 
-            # Or, explicitly send here if needed, similar to customer_interface.
+            with transaction.atomic(): # Check-in and waitlist entry succeed or fail together
+                reservation.checked_in = True
+                reservation.check_in_time = timezone.now()
+                reservation.save()
+
+                # Add to waitlist (using WaitlistEntry from waitlist app)
+                # The logic for timestamp (e.g., placing at top) needs consideration
+                # Original code used a timestamp 30 days in the future.
+                # For DRF/API view, it might be better to let the waitlist app handle its own ordering
+                # or provide a specific flag/field if priority is needed.
+                entry_timestamp = timezone.now() # Or adjust as per desired waitlist logic
+
+                waitlist_entry_data = {
+                    'restaurant': reservation.restaurant,
+                    'customer_name': reservation.name,
+                    'phone_number': reservation.phone,
+                    'people_count': reservation.party_size,
+                    'timestamp': entry_timestamp, 
+                    'notes': f"Reservation: {reservation.time.strftime('%I:%M %p')}. {reservation.notes or ''}",
+                    'status': 'WAITING',
+                    # Checked-in reservations are seated ahead of walk-ins
+                    'source': 'RESERVATION',
+                    'priority': WaitlistEntry.PRIORITY_RESERVATION,
+                }
+                # Directly create WaitlistEntry or call a service/signal in waitlist app
+                # For now, direct creation:
+                waitlist_entry = WaitlistEntry.objects.create(**waitlist_entry_data)
+                # Goes ahead of every walk-in, so hosts and waiting customers must hear about it; sent once this commits
+                broadcast_waitlist_update(reservation.restaurant_id, waitlist_entry)
 
             return Response({
                 'success': True, 
                 'message': 'Reservation checked in and party added to waitlist.',
                 'waitlist_entry_id': waitlist_entry.id
             }, status=status.HTTP_200_OK)
+        except IntegrityError:
+            # waitlist_one_waiting_per_phone: this guest is already in the queue; the check-in was rolled back
+            return Response({'error': 'This phone number is already waiting in the queue.'}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             logger.error(f"Error checking in reservation {pk}: {str(e)}")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -242,7 +254,7 @@ class ServedPartyListAPIView(APIView):
     def get(self, request, restaurant_id):
         restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
         # Permission check for the restaurant
-        if restaurant.user != request.user and not request.user.is_staff:
+        if restaurant.user_id != request.user.pk and not request.user.is_staff:
             return Response({'error': 'You do not have permission for this restaurant.'}, status=status.HTTP_403_FORBIDDEN)
 
         # Get parties from WaitlistEntry model with SERVED status
@@ -1,65 +1,131 @@
 # restaurant_app/management/commands/populate_parties.py
-from django.core.management.base import BaseCommand
-from django.db.utils import IntegrityError
-# from restaurant_app.models import QueueEntry, Party, Restaurant # Old import
-from auth_settings.models import Restaurant # New import
-from parties.models import Party # Import Party from parties app
-from waitlist.models import WaitlistEntry # Import WaitlistEntry
-from django.utils import timezone
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from auth_settings.models import Restaurant
+from parties.utils import rebuild_restaurant_parties
+from waitlist.models import WaitlistEntry
 
 class Command(BaseCommand):
-    help = 'Generate Party data from WaitlistEntry history' # Updated help text
+    help = (
+        'Rebuild Party visits, last visit and name from WaitlistEntry history: one set-based pass per '
+        'restaurant, chunked bulk writes, optionally across worker processes. Safe to rerun.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, action='append', help='Restaurant id (repeatable; default: all)')
+        parser.add_argument('--workers', type=int, default=1, help='Restaurants processed in parallel (default 1)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Parties per bulk write (default 1000)')
+        parser.add_argument(
+            '--checkpoint',
+            help='File of finished restaurant ids: they are skipped when it already exists, and each '
+                 'restaurant is appended as it completes, so an interrupted run resumes where it stopped',
+        )
+        parser.add_argument(
+            '--allow-unbackfilled', action='store_true',
+            help='Rebuild even though some served entries have no phone_e164 yet; those visits are left out of the counts',
+        )
 
     def handle(self, *args, **options):
-        restaurants = Restaurant.objects.all()
-        for restaurant in restaurants:
-            self.stdout.write(f"Processing restaurant: {restaurant.name}")
-            
-            # Get unique phone numbers from this restaurant's WaitlistEntry history
-            phone_numbers = WaitlistEntry.objects.filter(
-                restaurant=restaurant
-            ).values_list('phone_number', flat=True).distinct()
-            
-            for phone in phone_numbers:
-                if not phone: continue # Skip empty phone numbers
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
 
-                # Get all entries for this phone number, ordered by timestamp
-                entries = WaitlistEntry.objects.filter(
-                    restaurant=restaurant,
-                    phone_number=phone
-                ).order_by('timestamp')
-                
-                if not entries.exists():
-                    continue
-                
-                # Use the customer name from the latest entry for this phone number
-                latest_entry = entries.last()
-                customer_name = latest_entry.customer_name
-                notes_from_latest = latest_entry.notes
-                
-                # Calculate total visits (number of SERVED entries for this phone)
-                # Assuming WaitlistEntry has a 'status' field with 'SERVED' as a possibility
-                total_visits = entries.filter(status='SERVED').count()
-                
-                # Get the last visit timestamp (from the latest SERVED entry)
-                last_served_entry = entries.filter(status='SERVED').last()
-                last_visit_time = last_served_entry.completion_time if last_served_entry and hasattr(last_served_entry, 'completion_time') and last_served_entry.completion_time else (last_served_entry.timestamp if last_served_entry else None)
+        restaurant_ids = Restaurant.objects.order_by('id').values_list('id', flat=True)
+        if options['restaurant']:
+            restaurant_ids = restaurant_ids.filter(id__in=options['restaurant'])
+        restaurant_ids = list(restaurant_ids)
+
+        done = self.read_checkpoint(options['checkpoint'])
+        pending = [restaurant_id for restaurant_id in restaurant_ids if restaurant_id not in done]
+        if len(pending) < len(restaurant_ids):
+            self.stdout.write(f"Skipping {len(restaurant_ids) - len(pending)} restaurants already in {options['checkpoint']}")
+        if not pending:
+            self.stdout.write(self.style.SUCCESS("Nothing to do."))
+            return
+
+        # The rebuild groups visits by phone_e164; rows written before the column existed would be
+        # skipped and their parties' visit counts overwritten with a smaller number
+        unbackfilled = WaitlistEntry.objects.filter(
+            restaurant_id__in=pending, status='SERVED', phone_e164=''
+        ).exclude(phone_number='').count()
+        if unbackfilled:
+            message = f"{unbackfilled} served entries have no phone_e164 yet"
+            if not options['allow_unbackfilled']:
+                raise CommandError(f"{message}; run backfill_phone_e164 first (or pass --allow-unbackfilled).")
+            self.stderr.write(self.style.WARNING(f"{message}; their visits are not counted."))
 
+        self.started = time.monotonic()
+        self.totals = {'phones': 0, 'created': 0, 'updated': 0, 'unchanged': 0}
+        self.total_restaurants = len(pending)
+        self.finished = 0
+        self.failed = []
+        workers = min(options['workers'], len(pending))
+
+        if workers == 1:
+            for restaurant_id in pending:
                 try:
-                    party, created = Party.objects.update_or_create(
-                        restaurant=restaurant,
-                        phone=phone,
-                        defaults={
-                            'name': customer_name,
-                            'visits': total_visits,
-                            'last_visit': last_visit_time,
-                            'notes': notes_from_latest # Or accumulate notes if needed
-                        }
-                    )
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(f"Created party for {customer_name} ({phone})"))
-                    else:
-                        self.stdout.write(f"Updated party for {customer_name} ({phone})")
-                except IntegrityError:
-                    self.stderr.write(self.style.ERROR(f"Integrity error for phone {phone} at restaurant {restaurant.name}. Skipping."))
-        self.stdout.write(self.style.SUCCESS("Party population complete."))
+                    stats = rebuild_restaurant_parties(restaurant_id, options['batch_size'])
+                except Exception as e:
+                    self.report_failure(restaurant_id, e)
+                    continue
+                self.report(stats, options['checkpoint'])
+        else:
+            # Children must open their own connections rather than share the parent's sockets.
+            # django.setup as the initializer also covers platforms that spawn instead of fork.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                futures = {
+                    pool.submit(rebuild_restaurant_parties, restaurant_id, options['batch_size']): restaurant_id
+                    for restaurant_id in pending
+                }
+                for future in as_completed(futures):
+                    try:
+                        stats = future.result()
+                    except Exception as e:
+                        self.report_failure(futures[future], e)
+                        continue
+                    self.report(stats, options['checkpoint'])
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Party population complete: {self.finished}/{self.total_restaurants} restaurants, "
+            f"{self.totals['phones']} guests ({self.totals['created']} created, {self.totals['updated']} updated, "
+            f"{self.totals['unchanged']} unchanged) in {elapsed:.1f}s."
+        ))
+        if self.failed:
+            self.stderr.write(self.style.ERROR(
+                f"{len(self.failed)} restaurants failed and can be rerun: {', '.join(map(str, sorted(self.failed)))}"
+            ))
+
+    def report_failure(self, restaurant_id, error):
+        # Keep going; the restaurant stays out of the checkpoint and is retried next run
+        self.failed.append(restaurant_id)
+        self.stderr.write(self.style.ERROR(f"Restaurant {restaurant_id} failed: {error}"))
+
+    def report(self, stats, checkpoint):
+        self.finished += 1
+        for key in self.totals:
+            self.totals[key] += stats[key]
+        elapsed = time.monotonic() - self.started
+        remaining = elapsed / self.finished * (self.total_restaurants - self.finished)
+        self.stdout.write(
+            f"[{self.finished}/{self.total_restaurants}] Restaurant {stats['restaurant_id']}: {stats['phones']} guests, "
+            f"{stats['created']} created, {stats['updated']} updated, {stats['unchanged']} unchanged "
+            f"(elapsed {elapsed:.1f}s, ~{remaining:.0f}s left)"
+        )
+        if checkpoint:
+            with open(checkpoint, 'a') as f:
+                f.write(f"{stats['restaurant_id']}\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read_checkpoint(self, checkpoint):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return set()
+        with open(checkpoint) as f:
+            return {int(line) for line in f if line.strip().isdigit()}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import WaitlistEntry
+from .models import WaitlistEntry, WaitTimeStat
 
 @admin.register(WaitlistEntry)
 class WaitlistEntryAdmin(admin.ModelAdmin):
@@ -10,13 +10,14 @@ class WaitlistEntryAdmin(admin.ModelAdmin):
         'phone_number',
         'people_count',
         'status',
+        'source',
         'notes',
         'timestamp',
         'quoted_time',
         'notified_at',
         'completion_time'
     )
-    list_filter = ('status', 'restaurant', 'timestamp', 'notified_at')
+    list_filter = ('status', 'source', 'restaurant', 'timestamp', 'notified_at')
     search_fields = ('customer_name', 'phone_number', 'restaurant__name', 'notes')
     list_editable = ('status', 'notes', 'quoted_time')
     date_hierarchy = 'timestamp'
@@ -27,7 +28,7 @@ class WaitlistEntryAdmin(admin.ModelAdmin):
             'fields': ('restaurant', 'customer_name', 'phone_number', 'people_count')
         }),
         ('Status & Timing', {
-            'fields': ('status', 'timestamp', 'quoted_time', 'completion_time')
+            'fields': ('status', 'source', 'priority', 'timestamp', 'quoted_time', 'completion_time')
         }),
         ('Notifications', {
             'fields': ('notified_at', 'notified_sms_at', 'notified_email_at', 'notification_attempts'),
@@ -42,4 +43,10 @@ class WaitlistEntryAdmin(admin.ModelAdmin):
         return obj.timestamp # Or whichever field represents creation time
     created_at_display.short_description = 'Created At'
 
+@admin.register(WaitTimeStat)
+class WaitTimeStatAdmin(admin.ModelAdmin):
+    list_display = ('restaurant', 'party_size_bucket', 'hour_of_week', 'samples', 'turn_minutes_ewma', 'updated_at')
+    list_filter = ('restaurant', 'party_size_bucket')
+    readonly_fields = ('samples', 'turn_minutes_sum', 'turn_minutes_ewma', 'updated_at') # Maintained by waitlist.estimator
+
 # If you have other models in the waitlist app, register them here.
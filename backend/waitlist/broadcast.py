@@ -0,0 +1,237 @@
+# waitlist/broadcast.py
+"""
+Coalescing broadcaster for the waitlist_<restaurant_id> WebSocket groups.
+
+Writes call broadcast_waitlist_update(), which enqueues the message on transaction.on_commit:
+nothing is announced that a client could not yet read back, and the request never waits on the
+channel layer. Messages for a group are held for WAITLIST_BROADCAST_WINDOW_MS (counted from the
+first one), then collapsed: repeated updates to one entry keep only the latest, an update
+followed by a removal keeps only the removal. A window that ends with a single entry change goes
+out as the usual 'send.waitlist.update' / 'send.waitlist.remove' frame; anything more becomes one
+'send.waitlist.bulk' frame ({'updated': [...], 'removed': [ids]}), which hosts already handle.
+
+Every frame carries `seq`, taken from Restaurant.waitlist_seq with one atomic UPDATE ... RETURNING,
+so sequence numbers increase per restaurant across all worker processes, and `group`, so the
+replay recorder (waitlist.replay) can file it. Clients pass the last seq they saw when they
+reconnect.
+
+Flushes run on an event loop: the one holding this process's WebSocket consumers once one has
+connected (the in-memory channel layer is not thread-safe), otherwise a private background thread.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+
+from auth_settings.models import Restaurant
+from .serializers import WaitlistEntrySerializer
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_WINDOW_MS = getattr(settings, 'WAITLIST_BROADCAST_WINDOW_MS', 100)
+LAG_SAMPLES = 1000 # Most recent enqueue-to-delivery lags kept for the stats percentiles
+
+def waitlist_group(restaurant_id):
+    return f"waitlist_{restaurant_id}"
+
+def allocate_waitlist_seq(restaurant_id):
+    """Next frame sequence number for the restaurant: a single UPDATE ... RETURNING, atomic across processes."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Restaurant._meta.db_table} SET waitlist_seq = waitlist_seq + 1 WHERE id = %s RETURNING waitlist_seq",
+            [restaurant_id]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def coalesce(messages):
+    """Collapse one window's messages for a group into as few frames as possible, latest state per entry."""
+    if len(messages) == 1:
+        return list(messages)
+    entries = {} # entry id -> latest entry data, or None once removed; re-inserted so order follows the last change
+    passthrough = [] # Messages that aren't about one entry (refresh signals, config) go out unchanged, after the entries
+    for message in messages:
+        event_type, data = message.get('type'), message.get('data') or {}
+        if event_type == 'send.waitlist.update' and 'id' in data:
+            changes = [(data['id'], data)]
+        elif event_type == 'send.waitlist.remove' and 'id' in data:
+            changes = [(data['id'], None)]
+        elif event_type == 'send.waitlist.bulk':
+            changes = [(entry['id'], entry) for entry in data.get('updated', [])]
+            changes += [(entry_id, None) for entry_id in data.get('removed', [])]
+        else:
+            passthrough.append(message)
+            continue
+        for entry_id, entry in changes:
+            entries.pop(entry_id, None)
+            entries[entry_id] = entry
+
+    frames = []
+    if len(entries) == 1:
+        (entry_id, entry), = entries.items()
+        if entry is None:
+            frames.append({'type': 'send.waitlist.remove', 'data': {'id': entry_id, 'status': 'REMOVED'}})
+        else:
+            frames.append({'type': 'send.waitlist.update', 'data': entry})
+    elif entries:
+        frames.append({'type': 'send.waitlist.bulk', 'data': {
+            'updated': [entry for entry in entries.values() if entry is not None],
+            'removed': [entry_id for entry_id, entry in entries.items() if entry is None],
+        }})
+    return frames + passthrough
+
+
+class WaitlistBroadcaster:
+    """Per-process, per-group debouncing of waitlist WebSocket messages. publish() is thread-safe."""
+
+    def __init__(self, window_ms=None, channel_layer=None, allocate_seq=allocate_waitlist_seq):
+        self.window = (BROADCAST_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self._channel_layer = channel_layer # Resolved lazily so settings overrides apply
+        self._allocate_seq = database_sync_to_async(allocate_seq)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._pending = {} # restaurant id -> [messages]; only touched on self._loop
+        self._tasks = set()
+        self._stats_lock = threading.Lock()
+        self._stats = {'events_in': 0, 'frames_out': 0, 'errors': 0}
+        self._lags = deque(maxlen=LAG_SAMPLES) # Seconds from publish() to the group_send carrying the message
+
+    # Event loop ownership
+
+    def attach(self, loop):
+        """Flush on `loop` from now on (WaitlistConsumer.connect passes the server's loop)."""
+        with self._loop_lock:
+            if self._loop is not loop and not self._loop_usable(self._loop, private_ok=False):
+                self._loop = loop
+
+    @staticmethod
+    def _loop_usable(loop, private_ok=True):
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return False
+        return private_ok or not getattr(loop, 'broadcaster_private', False)
+
+    def _get_loop(self):
+        with self._loop_lock:
+            if not self._loop_usable(self._loop):
+                loop = asyncio.new_event_loop()
+                loop.broadcaster_private = True
+                started = threading.Event()
+                loop.call_soon(started.set)
+                threading.Thread(target=loop.run_forever, name='waitlist-broadcaster', daemon=True).start()
+                started.wait()
+                self._loop = loop
+            return self._loop
+
+    # Publishing
+
+    def publish(self, restaurant_id, message):
+        """Queue `message` for the restaurant's group; it goes out when the group's window closes."""
+        with self._stats_lock:
+            self._stats['events_in'] += 1
+        loop = self._get_loop()
+        loop.call_soon_threadsafe(self._add, loop, restaurant_id, message, time.monotonic())
+
+    def _add(self, loop, restaurant_id, message, enqueued_at):
+        pending = self._pending.get(restaurant_id)
+        if pending is not None:
+            pending.append((enqueued_at, message)) # Window already open for this group
+            return
+        self._pending[restaurant_id] = [(enqueued_at, message)]
+        loop.call_later(self.window, self._start_flush, loop, restaurant_id)
+
+    def _start_flush(self, loop, restaurant_id):
+        task = loop.create_task(self._flush(restaurant_id))
+        self._tasks.add(task) # The loop only keeps weak references to tasks
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, restaurant_id):
+        pending = self._pending.pop(restaurant_id, None)
+        if not pending:
+            return
+        group = waitlist_group(restaurant_id)
+        messages = [message for _, message in pending]
+        frames = coalesce(messages)
+        channel_layer = self._channel_layer or get_channel_layer()
+        failed = False
+        for frame in frames:
+            try:
+                frame = {**frame, 'group': group, 'seq': await self._allocate_seq(restaurant_id)}
+                await channel_layer.group_send(group, frame)
+            except Exception:
+                logger.exception(f"Broadcast to {group} failed")
+                failed = True
+                with self._stats_lock:
+                    self._stats['errors'] += 1
+                continue
+            with self._stats_lock:
+                self._stats['frames_out'] += 1
+        if not failed:
+            # Each message is delivered once the last frame of its window is out
+            delivered_at = time.monotonic()
+            with self._stats_lock:
+                self._lags.extend(delivered_at - enqueued_at for enqueued_at, _ in pending)
+        logger.info(f"Sent {len(frames)} frame(s) for {len(messages)} event(s) to group {group}")
+
+    async def _flush_all(self):
+        for restaurant_id in list(self._pending):
+            await self._flush(restaurant_id)
+
+    def drain(self, timeout=5):
+        """Flush every open window now and wait for delivery (tests, shutdown)."""
+        loop = self._get_loop()
+        # Queued behind any publish() callbacks already scheduled on the loop
+        asyncio.run_coroutine_threadsafe(self._flush_all(), loop).result(timeout)
+
+    # Counters
+
+    def stats(self):
+        """Events in vs frames out, and enqueue-to-delivery lag percentiles, for this process."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            lags = sorted(self._lags)
+        stats['window_ms'] = round(self.window * 1000)
+        stats['events_per_frame'] = round(stats['events_in'] / stats['frames_out'], 2) if stats['frames_out'] else 0.0
+        stats['lag_ms'] = {'samples': len(lags)}
+        for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)):
+            stats['lag_ms'][name] = round(lags[min(len(lags) - 1, int(len(lags) * fraction))] * 1000, 1) if lags else None
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            for key in self._stats:
+                self._stats[key] = 0
+            self._lags.clear()
+
+
+broadcaster = WaitlistBroadcaster()
+
+
+def broadcast_waitlist_update(restaurant_id, entry_instance=None, event_type='send.waitlist.update', removed_id=None, full_update=False, data=None):
+    """
+    The one way to announce a waitlist change to the restaurant's sockets. The payload is built now
+    (so it reflects this write), and handed to the broadcaster once the surrounding transaction
+    commits; outside a transaction that is immediately. Never blocks on the channel layer.
+    """
+    message = {
+        'type': event_type, # e.g., 'send.waitlist.update', 'send.waitlist.remove'
+    }
+    if data is not None: # Caller already built the payload (e.g. 'send.waitlist.bulk')
+        message['data'] = data
+    elif event_type == 'send.waitlist.remove':
+        message['data'] = {'id': removed_id, 'status': 'REMOVED'}
+    elif entry_instance:
+        message['data'] = WaitlistEntrySerializer(entry_instance).data
+    elif full_update:
+        message['data'] = {'message': 'Full waitlist refresh requested'} # Signal frontend to refetch all data
+    else:
+        message['data'] = {'message': 'Waitlist updated'}
+
+    transaction.on_commit(lambda: broadcaster.publish(restaurant_id, message))
+    entry_id_log = removed_id or (entry_instance.id if entry_instance else 'general')
+    logger.info(f"Queued {event_type} for group {waitlist_group(restaurant_id)} on commit for entry/event: {entry_id_log}")
@@ -0,0 +1,135 @@
+# waitlist/cache.py
+"""
+Per-restaurant waitlist snapshot cache.
+
+Each Restaurant carries a monotonically increasing `waitlist_version`. Every write to
+WaitlistEntry bumps it (see waitlist.signals), and formatted snapshots are cached under a
+key that includes the version, so a read is served from cache until the next mutation
+and stale snapshots simply age out instead of needing explicit deletes.
+
+Snapshots also carry server-computed wait times, which go stale while the queue sits idle,
+so the key (and the polling ETags) include a wait-time bucket that rolls over every
+WAITLIST_WAIT_TIME_BUCKET_SECONDS.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from auth_settings.models import Restaurant
+from .utils import get_formatted_waitlist_entries, get_compact_waitlist_entries
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long an unchanged snapshot is kept; versions, not TTLs, drive invalidation
+SNAPSHOT_TIMEOUT = getattr(settings, 'WAITLIST_SNAPSHOT_TIMEOUT', 300)
+# How long a snapshot's wait_time values may be reused before they are recomputed
+WAIT_TIME_BUCKET_SECONDS = getattr(settings, 'WAITLIST_WAIT_TIME_BUCKET_SECONDS', 60)
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+def snapshot_cache_stats():
+    """Hit/miss counters for this process."""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+    }
+
+def reset_snapshot_cache_stats():
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+
+def wait_time_bucket():
+    """Current wait-time bucket; snapshots and ETags from an earlier one are stale."""
+    return int(time.time() // WAIT_TIME_BUCKET_SECONDS)
+
+def snapshot_cache_key(restaurant_id, version, fields=None, bucket=0):
+    key = f"waitlist_snapshot:{restaurant_id}:{version}:{bucket}"
+    if fields:
+        key += ':' + ','.join(fields)
+    return key
+
+def bump_waitlist_version(restaurant_id):
+    """Atomically increment the restaurant's waitlist version (a single UPDATE, no read)."""
+    Restaurant.objects.filter(pk=restaurant_id).update(waitlist_version=F('waitlist_version') + 1)
+
+def get_waitlist_snapshot(restaurant, fields=None, bucket=None):
+    """
+    Returns {'entries', 'count', 'version'} for the restaurant's active waitlist, plus
+    'reservation_count' for full rows. With `fields`, entries are compact rows holding only
+    those keys (see waitlist.utils.resolve_compact_fields), cached separately per field set.
+    `restaurant` must be freshly loaded so its waitlist_version reflects the latest committed write.
+    wait_time values are as of when the snapshot was built, at most one `bucket` ago
+    (pass the one the caller's ETag was made with; defaults to the current one).
+    """
+    version = restaurant.waitlist_version
+    bucket = wait_time_bucket() if bucket is None else bucket
+    key = snapshot_cache_key(restaurant.id, version, fields, bucket)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        _record('hits')
+        return snapshot
+
+    _record('misses')
+    if fields:
+        entries, count = get_compact_waitlist_entries(restaurant, fields)
+        snapshot = {'entries': entries, 'count': count, 'version': version}
+    else:
+        entries, count, reservation_count = get_formatted_waitlist_entries(restaurant)
+        snapshot = {
+            'entries': entries,
+            'count': count,
+            'reservation_count': reservation_count,
+            'version': version,
+        }
+    cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    logger.debug(f"Built waitlist snapshot for restaurant {restaurant.id} at version {version}")
+    return snapshot
+
+# --- Conditional GET helpers ---
+# ETags are derived from the per-restaurant version counters, so checking If-None-Match
+# costs nothing beyond loading the Restaurant row the view needs anyway.
+
+def make_etag(prefix, restaurant_id, version, variant=''):
+    """Strong ETag for a versioned per-restaurant resource. `variant` distinguishes
+    different representations of the same version (query params, endpoint extras)."""
+    tag = f"{prefix}-{restaurant_id}-{version}"
+    if variant:
+        tag += '-' + hashlib.md5(variant.encode()).hexdigest()[:12]
+    return f'"{tag}"'
+
+def etag_matches(request, etag):
+    """If-None-Match uses the weak comparison function (RFC 9110 13.1.2)."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    client_etags = parse_etags(header)
+    if client_etags == ['*']:
+        return True
+    return any(tag.removeprefix('W/') == etag for tag in client_etags)
+
+def with_etag(response, etag):
+    """Attach the ETag and make clients revalidate on every poll."""
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
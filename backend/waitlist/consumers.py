@@ -1,30 +1,86 @@
 # waitlist/consumers.py
+import asyncio
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-# from asgiref.sync import async_to_sync # Not currently used in this consumer but can be useful
+from auth_settings.models import Restaurant
+from .broadcast import broadcaster
+from .replay import replay_recorder
+from .serializers import WaitlistEntrySerializer
+from .utils import active_waitlist_queryset
 
 class WaitlistConsumer(AsyncWebsocketConsumer):
+    """
+    Host screen feed for one restaurant: ws/waitlist/<restaurant_id>?last_seq=<n>
+    Every frame carries a per-restaurant `seq`. On connect the client gets either the frames it
+    missed since last_seq (from this worker's replay buffer) or a 'send.waitlist.snapshot' of the
+    waiting queue; live frames follow. Only the restaurant's owner (or staff) may connect: the
+    frames carry guests' phone numbers and notes. Others are closed with 4403.
+    """
+
     async def connect(self):
         self.restaurant_id = self.scope['url_route']['kwargs']['restaurant_id']
         self.group_name = f"waitlist_{self.restaurant_id}"
+        broadcaster.attach(asyncio.get_running_loop()) # Coalesced broadcasts flush on the loop that holds the sockets
+
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4403)
+            return
+        restaurant = None
+        if self.restaurant_id.isdigit():
+            restaurant = await Restaurant.objects.filter(pk=self.restaurant_id).values('user_id').afirst()
+        if restaurant is None:
+            await self.close(code=4404)
+            return
+        if restaurant['user_id'] != user.id and not user.is_staff:
+            await self.close(code=4403)
+            return
 
-        # Join restaurant-specific group
+        # Recorder and socket join the group before the seq is read, so no frame falls between the catch-up and live updates
+        buffer = await replay_recorder.watch(self.group_name)
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
+        # Not the seq read for the ownership check: a frame sent before the joins would be in neither
+        current_seq = await Restaurant.objects.filter(pk=self.restaurant_id).values_list('waitlist_seq', flat=True).afirst()
+        if current_seq is None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.close(code=4404)
+            return
         await self.accept()
         print(f"WebSocket connected to group {self.group_name} for channel {self.channel_name}")
 
-        # Optionally, send existing waitlist on connect
-        # from .models import WaitlistEntry # Adjusted for relative import
-        # from .serializers import WaitlistEntrySerializer # Adjusted for relative import
-        # entries = await database_sync_to_async(list)(WaitlistEntry.objects.filter(restaurant_id=self.restaurant_id, status="WAITING").order_by('timestamp'))
-        # serializer = WaitlistEntrySerializer(entries, many=True)
-        # await self.send(text_data=json.dumps({
-        #     'type': 'initial_waitlist_data', # Or a more descriptive type
-        #     'payload': serializer.data
-        # }))
+        last_seq = self.get_last_seq()
+        missed = buffer.since(last_seq, current_seq) if last_seq is not None else None
+        if missed is None:
+            await self.send_snapshot(current_seq)
+        else:
+            for frame in missed:
+                await self.send_frame(frame)
+
+    def get_last_seq(self):
+        values = parse_qs(self.scope.get('query_string', b'').decode()).get('last_seq')
+        if values and values[0].isdigit():
+            return int(values[0])
+        return None
+
+    async def send_snapshot(self, seq):
+        # Read after current_seq, so frames numbered above `seq` that arrive next are never older than the snapshot
+        entries = [entry async for entry in active_waitlist_queryset(self.restaurant_id)]
+        await self.send(text_data=json.dumps({
+            'type': 'send.waitlist.snapshot',
+            'data': {'entries': WaitlistEntrySerializer(entries, many=True).data},
+            'seq': seq,
+        }))
+
+    async def send_frame(self, event):
+        await self.send(text_data=json.dumps({
+            'type': event['type'],
+            'data': event['data'],
+            'seq': event.get('seq'),
+        }))
 
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
@@ -36,22 +92,18 @@ class WaitlistConsumer(AsyncWebsocketConsumer):
 
     async def send_waitlist_update(self, event):
         """ Handles messages from the backend for new or updated entries. """
-        entry_data = event['data']
-        await self.send(text_data=json.dumps({
-            'type': 'send.waitlist.update', # Changed from 'ENTRY_UPDATED'
-            'data': entry_data             # Changed from 'payload'
-        }))
-        print(f"Sent send.waitlist.update to client in group {self.group_name}")
+        await self.send_frame(event)
+        print(f"Sent send.waitlist.update #{event.get('seq')} to client in group {self.group_name}")
 
     async def send_waitlist_remove(self, event):
-        """ Handles messages from the backend for removed entries. """
-        # The event data from broadcast_waitlist_update for remove is {'id': entry_id, 'status': 'REMOVED'}
-        removed_entry_id = event['data']['id'] 
-        await self.send(text_data=json.dumps({
-            'type': 'send.waitlist.remove', # Changed from 'ENTRY_REMOVED'
-            'data': {'id': removed_entry_id} # Changed from 'payload'
-        }))
-        print(f"Sent send.waitlist.remove to client in group {self.group_name} for ID {removed_entry_id}")
+        """ Handles messages from the backend for removed entries: {'id': entry_id, 'status': 'REMOVED'}. """
+        await self.send_frame(event)
+        print(f"Sent send.waitlist.remove #{event.get('seq')} to client in group {self.group_name} for ID {event['data']['id']}")
+
+    async def send_waitlist_bulk(self, event):
+        """ Handles one coalesced message for a bulk host action or a burst: {'updated': [...entries], 'removed': [ids]}. """
+        await self.send_frame(event)
+        print(f"Sent send.waitlist.bulk #{event.get('seq')} to client in group {self.group_name}")
 
     # Optional: Handler for general configuration changes or full refresh signals
     # async def send_config_update(self, event):
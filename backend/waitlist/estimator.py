@@ -0,0 +1,203 @@
+"""
+Data-driven wait-time quotes.
+
+Every entry that reaches SERVED contributes one observation: its wait
+(completion_time - timestamp) divided by its position when it joined, i.e. the
+minutes one "turn" of the queue took. Observations are folded into
+WaitTimeStat rows keyed by (restaurant, party size bucket, hour of week) with
+atomic F() updates, so nothing ever rescans history. A quote is simply
+position * turn minutes for the caller's bucket and hour, falling back to the
+bucket across all hours, then the whole restaurant, then DEFAULT_TURN_MINUTES.
+"""
+import logging
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField, Max, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import WaitlistEntry, WaitTimeStat
+
+logger = logging.getLogger(__name__)
+
+# Used until a restaurant has any history (the old hard-coded avg_wait_time)
+DEFAULT_TURN_MINUTES = getattr(settings, 'WAIT_ESTIMATE_DEFAULT_MINUTES', 15)
+# Observations a cell needs before its own average is trusted over the wider fallback
+MIN_SAMPLES = getattr(settings, 'WAIT_ESTIMATE_MIN_SAMPLES', 5)
+# Weight of the newest observation in a cell's moving average
+EWMA_ALPHA = getattr(settings, 'WAIT_ESTIMATE_EWMA_ALPHA', 0.1)
+# Waits longer than this are entries nobody closed out; they are ignored, and also bound the
+# "who was ahead when this party joined" lookback
+MAX_WAIT = timedelta(minutes=getattr(settings, 'WAIT_ESTIMATE_MAX_WAIT_MINUTES', 360))
+# Customers poll status every few seconds; stats only move on SERVED, so a short cache is safe
+CACHE_TIMEOUT = getattr(settings, 'WAIT_ESTIMATE_CACHE_TIMEOUT', 60)
+
+PARTY_SIZE_BUCKETS = (2, 4, 6) # 1-2, 3-4, 5-6, 7+ -> buckets 0..3
+
+def party_size_bucket(people_count):
+    for bucket, upper in enumerate(PARTY_SIZE_BUCKETS):
+        if people_count <= upper:
+            return bucket
+    return len(PARTY_SIZE_BUCKETS)
+
+def hour_of_week(moment):
+    """0 = Monday 00:00-00:59 ... 167 = Sunday 23:00-23:59, in the site's local time."""
+    local = timezone.localtime(moment)
+    return local.weekday() * 24 + local.hour
+
+def observed_turn_minutes(wait, ahead):
+    """Minutes per queue position for a party that waited `wait` with `ahead` parties in front of it,
+    or None if the observation should be ignored."""
+    if wait is None or wait < timedelta(0) or wait > MAX_WAIT:
+        return None
+    return wait.total_seconds() / 60 / (ahead + 1)
+
+def choose_turn_minutes(counts):
+    """Pick the most specific average with enough samples. `counts` has cell_samples/cell_ewma,
+    bucket_samples/bucket_sum and all_samples/all_sum (missing or None meaning no data)."""
+    if (counts.get('cell_samples') or 0) >= MIN_SAMPLES and counts.get('cell_ewma') is not None:
+        return counts['cell_ewma']
+    if (counts.get('bucket_samples') or 0) >= MIN_SAMPLES:
+        return counts['bucket_sum'] / counts['bucket_samples']
+    if counts.get('all_samples'):
+        return counts['all_sum'] / counts['all_samples']
+    return DEFAULT_TURN_MINUTES
+
+def quote_minutes(position, turn_minutes):
+    return int(math.ceil(position * turn_minutes)) if position > 0 else 0
+
+
+# --- Recording ---
+
+def ahead_at_join(entry):
+    """How many parties were in front of `entry` when it joined: earlier arrivals of the same or
+    higher priority that had not been served or removed yet."""
+    return WaitlistEntry.objects.filter(
+        restaurant_id=entry.restaurant_id,
+        priority__lte=entry.priority,
+        timestamp__lt=entry.timestamp,
+        timestamp__gte=entry.timestamp - MAX_WAIT,
+    ).filter(
+        Q(completion_time__isnull=True) | Q(completion_time__gt=entry.timestamp)
+    ).exclude(id=entry.id).count()
+
+def record_served_waits(entries):
+    """Fold newly SERVED entries into their restaurants' WaitTimeStat rows.
+    Reservation check-ins are skipped: they jump the queue, so their waits say nothing about turn time."""
+    recorded = 0
+    for entry in entries:
+        if entry.status != 'SERVED' or entry.source == 'RESERVATION' or not entry.completion_time:
+            continue
+        turn = observed_turn_minutes(entry.completion_time - entry.timestamp, ahead_at_join(entry))
+        if turn is None:
+            continue
+        stat, _ = WaitTimeStat.objects.get_or_create(
+            restaurant_id=entry.restaurant_id,
+            party_size_bucket=party_size_bucket(entry.people_count),
+            hour_of_week=hour_of_week(entry.timestamp),
+        )
+        # Early samples are averaged plainly (1/n), later ones with the fixed EWMA weight
+        weight = Greatest(Value(EWMA_ALPHA), Value(1.0) / (F('samples') + Value(1.0)), output_field=FloatField())
+        WaitTimeStat.objects.filter(pk=stat.pk).update(
+            samples=F('samples') + 1,
+            turn_minutes_sum=F('turn_minutes_sum') + turn,
+            turn_minutes_ewma=F('turn_minutes_ewma') + (Value(turn, output_field=FloatField()) - F('turn_minutes_ewma')) * weight,
+            updated_at=timezone.now(),
+        )
+        recorded += 1
+    if recorded:
+        logger.debug(f"Recorded {recorded} served waits for wait-time estimates")
+    return recorded
+
+
+# --- Estimating ---
+
+def _turn_minutes_query(restaurant_id, bucket, how):
+    in_bucket = Q(party_size_bucket=bucket)
+    in_cell = in_bucket & Q(hour_of_week=how)
+    queryset = WaitTimeStat.objects.filter(restaurant_id=restaurant_id)
+    aggregates = {
+        'cell_samples': Sum('samples', filter=in_cell),
+        'cell_ewma': Max('turn_minutes_ewma', filter=in_cell),
+        'bucket_samples': Sum('samples', filter=in_bucket),
+        'bucket_sum': Sum('turn_minutes_sum', filter=in_bucket),
+        'all_samples': Sum('samples'),
+        'all_sum': Sum('turn_minutes_sum'),
+    }
+    return queryset, aggregates
+
+def _cache_key(restaurant_id, bucket, how):
+    return f'wait_turn:{restaurant_id}:{bucket}:{how}'
+
+def get_turn_minutes(restaurant_id, people_count, at=None):
+    bucket, how = party_size_bucket(people_count), hour_of_week(at or timezone.now())
+    key = _cache_key(restaurant_id, bucket, how)
+    turn = cache.get(key)
+    if turn is None:
+        queryset, aggregates = _turn_minutes_query(restaurant_id, bucket, how)
+        turn = choose_turn_minutes(queryset.aggregate(**aggregates))
+        cache.set(key, turn, CACHE_TIMEOUT)
+    return turn
+
+async def aget_turn_minutes(restaurant_id, people_count, at=None):
+    bucket, how = party_size_bucket(people_count), hour_of_week(at or timezone.now())
+    key = _cache_key(restaurant_id, bucket, how)
+    turn = await cache.aget(key)
+    if turn is None:
+        queryset, aggregates = _turn_minutes_query(restaurant_id, bucket, how)
+        turn = choose_turn_minutes(await queryset.aaggregate(**aggregates))
+        await cache.aset(key, turn, CACHE_TIMEOUT)
+    return turn
+
+def estimate_wait_minutes(restaurant_id, people_count, position, at=None):
+    """Expected minutes until a party of `people_count` at queue `position` is seated."""
+    return quote_minutes(position, get_turn_minutes(restaurant_id, people_count, at))
+
+async def aestimate_wait_minutes(restaurant_id, people_count, position, at=None):
+    return quote_minutes(position, await aget_turn_minutes(restaurant_id, people_count, at))
+
+def quote_new_entry(restaurant_id, people_count, priority=WaitlistEntry.PRIORITY_DEFAULT):
+    """Quote for a party about to join: its position would be everyone WAITING at its priority or better, plus one."""
+    position = WaitlistEntry.objects.filter(
+        restaurant_id=restaurant_id, status='WAITING', priority__lte=priority
+    ).count() + 1
+    return estimate_wait_minutes(restaurant_id, people_count, position)
+
+async def aqueue_statuses(restaurant_id, entry_ids):
+    """
+    {entry_id: {'position', 'wait_time', 'status', 'queue_size'}} for several entries of one restaurant,
+    from a single ordered read of its WAITING queue (plus one status lookup for entries that left it).
+    Positions and estimates match aget_queue_position / aestimate_wait_minutes; turn minutes are
+    fetched once per party size bucket. Deleted entries are reported as REMOVED.
+    """
+    wanted = set(entry_ids)
+    waiting = [
+        row async for row in WaitlistEntry.objects.filter(restaurant_id=restaurant_id, status='WAITING')
+        .order_by('priority', 'timestamp', 'id').values_list('id', 'people_count')
+    ]
+    queue_size = len(waiting)
+    turns = {} # party size bucket -> turn minutes, for this pass
+    statuses = {}
+    for position, (entry_id, people_count) in enumerate(waiting, start=1):
+        if entry_id not in wanted:
+            continue
+        bucket = party_size_bucket(people_count)
+        if bucket not in turns:
+            turns[bucket] = await aget_turn_minutes(restaurant_id, people_count)
+        statuses[entry_id] = {
+            'position': position, 'wait_time': quote_minutes(position, turns[bucket]),
+            'status': 'WAITING', 'queue_size': queue_size,
+        }
+
+    gone = wanted - statuses.keys()
+    if gone:
+        async for entry_id, entry_status in WaitlistEntry.objects.filter(
+            restaurant_id=restaurant_id, id__in=gone
+        ).values_list('id', 'status'):
+            statuses[entry_id] = {'position': 0, 'wait_time': 0, 'status': entry_status, 'queue_size': queue_size}
+        for entry_id in gone - statuses.keys():
+            statuses[entry_id] = {'position': 0, 'wait_time': 0, 'status': 'REMOVED', 'queue_size': queue_size}
+    return statuses
@@ -0,0 +1,71 @@
+# waitlist/management/commands/backfill_phone_e164.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from notifications.utils import normalize_phone
+from reservation.models import Reservation
+from reservation.signals import bump_reservation_version
+from waitlist.cache import bump_waitlist_version
+from waitlist.models import WaitlistEntry
+
+class Command(BaseCommand):
+    help = (
+        'Fill WaitlistEntry.phone_e164 and Reservation.phone_e164 for rows written before the column existed '
+        '(Party is covered by backfill_party_search). Run before populate_parties.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk_update (default 2000)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        # WAITING entries are done one by one below: two of them may normalize to the same phone
+        history = WaitlistEntry.objects.exclude(status='WAITING')
+        updated = self.backfill(history, 'phone_number', options['batch_size'], bump_waitlist_version)
+        updated += self.backfill(Reservation.objects.all(), 'phone', options['batch_size'], bump_reservation_version)
+
+        duplicates, restaurant_ids = [], set()
+        for entry in WaitlistEntry.objects.filter(status='WAITING', phone_e164='').exclude(phone_number='').order_by('timestamp', 'id'):
+            try:
+                with transaction.atomic():
+                    WaitlistEntry.objects.filter(pk=entry.pk).update(
+                        phone_e164=normalize_phone(entry.phone_number), updated_at=timezone.now()
+                    )
+                updated += 1
+                restaurant_ids.add(entry.restaurant_id)
+            except IntegrityError:
+                duplicates.append(entry.id) # An earlier waiting entry already holds this phone
+        for restaurant_id in restaurant_ids:
+            bump_waitlist_version(restaurant_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Normalized {updated} phone numbers."))
+        if duplicates:
+            self.stdout.write(self.style.WARNING(
+                f"{len(duplicates)} waiting entries duplicate an earlier waiting entry's phone and were left "
+                f"unnormalized; seat or remove them, then rerun: {', '.join(map(str, duplicates))}"
+            ))
+
+    def backfill(self, queryset, phone_field, batch_size, bump_version):
+        """Normalize `queryset` in batches; bulk_update skips post_save, so the touched restaurants'
+        versions are bumped here (bump_version(restaurant_id)) and updated_at is set for the change feed."""
+        model = queryset.model
+        pending = queryset.filter(phone_e164='').exclude(**{phone_field: ''}).order_by('id').only('id', 'restaurant_id', phone_field)
+        last_id, updated, restaurant_ids = 0, 0, set()
+        while True:
+            # Walk by primary key so each batch is an index range, however large the table
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            now = timezone.now()
+            for row in batch:
+                row.phone_e164 = normalize_phone(getattr(row, phone_field))
+                row.updated_at = now
+                restaurant_ids.add(row.restaurant_id)
+            model.objects.bulk_update(batch, ['phone_e164', 'updated_at'])
+            updated += len(batch)
+        for restaurant_id in restaurant_ids:
+            bump_version(restaurant_id)
+        return updated
@@ -0,0 +1,36 @@
+# waitlist/management/commands/backfill_waitlist_source.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from waitlist.cache import bump_waitlist_version
+from waitlist.models import WaitlistEntry
+
+class Command(BaseCommand):
+    help = 'Backfill WaitlistEntry.source/priority for entries created before those columns existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report how many rows would change without writing')
+
+    def handle(self, *args, **options):
+        # Reservation check-ins used to be recognised only by their notes text:
+        # "Reservation for ..." (older check-ins) or "Reservation: <time>. ..." (ReservationCheckInAPIView)
+        reservation_notes = Q(notes__icontains='Reservation for') | Q(notes__startswith='Reservation:')
+        pending = WaitlistEntry.objects.filter(reservation_notes).exclude(source='RESERVATION')
+
+        count = pending.count()
+        if options['dry_run']:
+            self.stdout.write(f"{count} entries would be marked as reservations.")
+            return
+
+        with transaction.atomic():
+            restaurant_ids = set(pending.values_list('restaurant_id', flat=True))
+            # A queryset update skips post_save: stamp updated_at for the change feed and bump the
+            # versions ourselves, or polling hosts keep their 304s and never see the new queue order
+            updated = pending.update(
+                source='RESERVATION', priority=WaitlistEntry.PRIORITY_RESERVATION, updated_at=timezone.now()
+            )
+            for restaurant_id in restaurant_ids:
+                bump_waitlist_version(restaurant_id)
+        self.stdout.write(self.style.SUCCESS(f"Marked {updated} entries as reservations."))
@@ -0,0 +1,121 @@
+# waitlist/management/commands/backtest_wait_estimates.py
+import bisect
+import heapq
+import statistics
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from waitlist import estimator
+from waitlist.models import WaitlistEntry
+
+class Command(BaseCommand):
+    help = (
+        'Replay stored waitlist history through the wait-time estimator and report quote error. '
+        'Each served party is quoted with only the history that was complete when it joined.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, action='append', help='Restaurant id (repeatable; default: all)')
+        parser.add_argument('--days', type=int, default=90, help='How much history to replay (default 90)')
+
+    def handle(self, *args, **options):
+        entries = WaitlistEntry.objects.filter(timestamp__gte=timezone.now() - timedelta(days=options['days']))
+        if options['restaurant']:
+            entries = entries.filter(restaurant_id__in=options['restaurant'])
+        rows = entries.order_by('restaurant_id', 'timestamp', 'id').values_list(
+            'restaurant_id', 'id', 'timestamp', 'completion_time', 'status', 'priority', 'people_count', 'source'
+        )
+
+        by_restaurant = defaultdict(list)
+        for row in rows.iterator(chunk_size=2000):
+            by_restaurant[row[0]].append(row[1:])
+
+        header = f"{'restaurant':>10} {'quotes':>7} {'MAE':>7} {'median':>7} {'bias':>7} {'<=5m':>6} {'<=10m':>6} {'fixed MAE':>10}"
+        self.stdout.write(header)
+        totals = {'errors': [], 'baseline': []}
+        for restaurant_id, history in by_restaurant.items():
+            errors, baseline = self.replay(history)
+            totals['errors'] += errors
+            totals['baseline'] += baseline
+            self.report(str(restaurant_id), errors, baseline)
+        if len(by_restaurant) > 1:
+            self.report('all', totals['errors'], totals['baseline'])
+        if not totals['errors']:
+            self.stdout.write('No served, non-reservation entries in range to quote.')
+        else:
+            self.stdout.write(
+                "Errors are quote - actual wait in minutes; 'fixed MAE' is the old "
+                f"position * {estimator.DEFAULT_TURN_MINUTES} quote, for comparison."
+            )
+
+    def replay(self, history):
+        """Walk one restaurant's entries in join order. Observations become visible at their
+        completion_time, exactly as record_served_waits would have applied them live."""
+        timestamps = [row[1] for row in history]
+        cells = defaultdict(lambda: {'samples': 0, 'sum': 0.0, 'ewma': 0.0})
+        pending = [] # heap of (completion_time, seq, bucket, hour_of_week, turn minutes)
+        errors, baseline = [], []
+
+        for index, (entry_id, joined, completed, status, priority, people_count, source) in enumerate(history):
+            while pending and pending[0][0] <= joined:
+                _, _, bucket, how, turn = heapq.heappop(pending)
+                cell = cells[(bucket, how)]
+                weight = max(estimator.EWMA_ALPHA, 1.0 / (cell['samples'] + 1))
+                cell['ewma'] += (turn - cell['ewma']) * weight
+                cell['samples'] += 1
+                cell['sum'] += turn
+
+            if status != 'SERVED' or source == 'RESERVATION' or not completed:
+                continue
+            ahead = self.ahead_at_join(history, timestamps, index)
+            turn = estimator.observed_turn_minutes(completed - joined, ahead)
+            if turn is None:
+                continue
+
+            bucket, how = estimator.party_size_bucket(people_count), estimator.hour_of_week(joined)
+            position = ahead + 1
+            quote = estimator.quote_minutes(position, estimator.choose_turn_minutes(self.counts(cells, bucket, how)))
+            actual = (completed - joined).total_seconds() / 60
+            errors.append(quote - actual)
+            baseline.append(position * estimator.DEFAULT_TURN_MINUTES - actual)
+            heapq.heappush(pending, (completed, entry_id, bucket, how, turn))
+        return errors, baseline
+
+    def ahead_at_join(self, history, timestamps, index):
+        """In-memory twin of estimator.ahead_at_join."""
+        _, joined, _, _, priority, _, _ = history[index]
+        start = bisect.bisect_left(timestamps, joined - estimator.MAX_WAIT)
+        ahead = 0
+        for other_id, other_joined, other_completed, _, other_priority, _, _ in history[start:index]:
+            if other_joined >= joined or other_priority > priority:
+                continue
+            if other_completed is None or other_completed > joined:
+                ahead += 1
+        return ahead
+
+    def counts(self, cells, bucket, how):
+        counts = {'cell_samples': 0, 'cell_ewma': None, 'bucket_samples': 0, 'bucket_sum': 0.0, 'all_samples': 0, 'all_sum': 0.0}
+        for (cell_bucket, cell_how), cell in cells.items():
+            counts['all_samples'] += cell['samples']
+            counts['all_sum'] += cell['sum']
+            if cell_bucket == bucket:
+                counts['bucket_samples'] += cell['samples']
+                counts['bucket_sum'] += cell['sum']
+                if cell_how == how:
+                    counts['cell_samples'] = cell['samples']
+                    counts['cell_ewma'] = cell['ewma']
+        return counts
+
+    def report(self, label, errors, baseline):
+        if not errors:
+            return
+        absolute = [abs(error) for error in errors]
+        within = lambda limit: 100 * sum(1 for error in absolute if error <= limit) / len(absolute)
+        self.stdout.write(
+            f"{label:>10} {len(errors):>7} {statistics.mean(absolute):>7.1f} {statistics.median(absolute):>7.1f} "
+            f"{statistics.mean(errors):>+7.1f} {within(5):>5.0f}% {within(10):>5.0f}% "
+            f"{statistics.mean(abs(error) for error in baseline):>10.1f}"
+        )
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
 # from restaurant_app.models import Restaurant # Old import
 from auth_settings.models import Restaurant # New import
+from notifications.utils import normalize_phone
 
 class WaitlistEntry(models.Model):
     STATUS_CHOICES = [
@@ -9,14 +11,25 @@ class WaitlistEntry(models.Model):
         ('SERVED', 'Served'),
         ('REMOVED', 'Removed'),
     ]
+    SOURCE_CHOICES = [
+        ('WALK_IN', 'Walk-in'),
+        ('QR', 'QR Code'),
+        ('RESERVATION', 'Reservation'),
+    ]
+    # Lower priority values are seated first; checked-in reservations go to the top of the list
+    PRIORITY_RESERVATION = 0
+    PRIORITY_DEFAULT = 1
 
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='waitlist_entries')
     customer_name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=20) # Increased max_length for various formats
+    phone_e164 = models.CharField(max_length=24, blank=True, default='', editable=False) # normalize_phone(phone_number), set in save()
     people_count = models.PositiveIntegerField()
     timestamp = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='WAITING')
     notes = models.TextField(blank=True, null=True)
+    source = models.CharField(max_length=12, choices=SOURCE_CHOICES, default='WALK_IN')
+    priority = models.PositiveSmallIntegerField(default=PRIORITY_DEFAULT)
     quoted_time = models.IntegerField(blank=True, null=True) # In minutes
     # New fields for tracking notifications and service
     notified_at = models.DateTimeField(blank=True, null=True)
@@ -24,6 +37,7 @@ class WaitlistEntry(models.Model):
     notified_email_at = models.DateTimeField(blank=True, null=True)
     notification_attempts = models.PositiveIntegerField(default=0)
     completion_time = models.DateTimeField(blank=True, null=True) # When status becomes SERVED or REMOVED
+    updated_at = models.DateTimeField(auto_now=True) # Drives the change feed; set explicitly on bulk/queryset updates
 
     def __str__(self):
         return f"{self.customer_name} ({self.people_count}) at {self.restaurant.name} - {self.get_status_display()}"
@@ -39,12 +53,103 @@ class WaitlistEntry(models.Model):
             time_diff_seconds = (timezone.now() - self.timestamp).total_seconds()
         return int(time_diff_seconds / 60)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so post_save handlers can tell real transitions from re-saves
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_completion = instance.completion_snapshot()
+        return instance
+
+    def completion_snapshot(self):
+        """(timestamp, completion_time, people_count): what the analytics rollups counted a completion with."""
+        return tuple(self.__dict__.get(field) for field in ('timestamp', 'completion_time', 'people_count'))
+
+    @property
+    def became_served(self):
+        """True during post_save when this save moved the entry to SERVED (including creating it as SERVED)."""
+        return self.status == 'SERVED' and getattr(self, 'previous_status', None) != 'SERVED'
+
     def save(self, *args, **kwargs):
         if self.status in ['SERVED', 'REMOVED'] and not self.completion_time:
             self.completion_time = timezone.now()
-        super().save(*args, **kwargs)
+        self.previous_status = getattr(self, '_loaded_status', None) # None for new rows
+        self.previous_completion = getattr(self, '_loaded_completion', None)
+        self.phone_e164 = normalize_phone(self.phone_number)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'phone_e164'}
+        # post_save handlers (version bump, analytics rollups, activity log) commit or roll back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_status = self.status
+        self._loaded_completion = self.completion_snapshot()
 
     class Meta:
         ordering = ['timestamp']
         verbose_name = "Waitlist Entry"
         verbose_name_plural = "Waitlist Entries"
+        indexes = [
+            # Hot path: active list / queue counts filter on (restaurant, status) and order by timestamp
+            models.Index(fields=['restaurant', 'status', 'timestamp'], name='waitlist_rest_status_ts_idx'),
+            # Change feed: entries touched since a client's last sync
+            models.Index(fields=['restaurant', 'updated_at'], name='waitlist_rest_updated_idx'),
+            # Partial index over WAITING rows only, in host display order (priority, timestamp, id), so
+            # SERVED/REMOVED history never bloats the active lookups.
+            # Backends without partial index support (e.g. MySQL) skip it and fall back to the composite index.
+            models.Index(
+                fields=['restaurant', 'priority', 'timestamp', 'id'],
+                name='waitlist_active_idx',
+                condition=Q(status='WAITING'),
+            ),
+            # Guest history by phone (parties, duplicate checks outside the active queue)
+            models.Index(fields=['restaurant', 'phone_e164'], name='waitlist_rest_phone_idx'),
+        ]
+        constraints = [
+            # One WAITING entry per phone and restaurant: duplicate checks are a single probe of this
+            # index, and concurrent joins can't both get in (the loser's insert raises IntegrityError)
+            models.UniqueConstraint(
+                fields=['restaurant', 'phone_e164'],
+                condition=Q(status='WAITING') & ~Q(phone_e164=''),
+                name='waitlist_one_waiting_per_phone',
+            ),
+        ]
+
+
+class WaitlistTombstone(models.Model):
+    """Remembers hard-deleted entries for a while so the change feed can report them as removed."""
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='waitlist_tombstones')
+    entry_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Deleted entry {self.entry_id} (restaurant {self.restaurant_id})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'deleted_at'], name='waitlist_tombstone_idx'),
+        ]
+
+
+class WaitTimeStat(models.Model):
+    """
+    Running wait-time statistics for one (restaurant, party size bucket, hour of week) cell,
+    maintained incrementally by waitlist.estimator as entries are served.
+    Turn minutes = observed wait / position at join.
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='wait_time_stats')
+    party_size_bucket = models.PositiveSmallIntegerField() # See estimator.PARTY_SIZE_BUCKETS
+    hour_of_week = models.PositiveSmallIntegerField() # 0 = Monday 00:00 ... 167 = Sunday 23:00, local time
+    samples = models.PositiveIntegerField(default=0)
+    turn_minutes_sum = models.FloatField(default=0)
+    turn_minutes_ewma = models.FloatField(default=0) # Recent-weighted average, used once samples is large enough
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Restaurant {self.restaurant_id} bucket {self.party_size_bucket} hour {self.hour_of_week}: {self.samples} samples"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['restaurant', 'party_size_bucket', 'hour_of_week'], name='waitlist_wait_stat_cell_uniq'
+            ),
+        ]
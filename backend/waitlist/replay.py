@@ -0,0 +1,109 @@
+# waitlist/replay.py
+"""
+Gap replay for reconnecting waitlist sockets.
+
+Each worker process keeps a bounded ring buffer of the last WAITLIST_REPLAY_BUFFER_SIZE frames
+per waitlist group. The buffers are fed by one process-wide recorder channel that joins a group
+as soon as a socket for it connects here, and stays in it while the socket is gone, so frames
+sent during a client's blip are still recorded. A client reconnecting with ?last_seq=N gets the
+buffered frames after N; if any of them were evicted (or never reached this process) it gets a
+full snapshot instead.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REPLAY_BUFFER_SIZE = getattr(settings, 'WAITLIST_REPLAY_BUFFER_SIZE', 200) # Frames kept per group
+REPLAY_MAX_GROUPS = getattr(settings, 'WAITLIST_REPLAY_MAX_GROUPS', 1000) # Least recently connected groups are dropped first
+
+
+class ReplayBuffer:
+    """The last `size` frames of one group, keyed by seq."""
+
+    def __init__(self, size=REPLAY_BUFFER_SIZE):
+        self.size = size
+        self.frames = OrderedDict() # seq -> frame, ascending
+
+    def record(self, frame):
+        seq = frame.get('seq')
+        if seq is None or seq in self.frames:
+            return
+        out_of_order = bool(self.frames) and seq < next(reversed(self.frames))
+        self.frames[seq] = frame
+        if out_of_order: # Frames from different workers can cross on the way here; keep seq order
+            self.frames = OrderedDict(sorted(self.frames.items()))
+        while len(self.frames) > self.size:
+            self.frames.popitem(last=False)
+
+    def since(self, last_seq, current_seq):
+        """
+        Frames after last_seq in order, or None when the client needs a snapshot: last_seq is
+        from the future, or older than the buffer, or some frame after it is missing here.
+        Sequence numbers past the newest buffered frame are still in flight and arrive live.
+        """
+        if last_seq > current_seq:
+            return None
+        if last_seq == current_seq:
+            return []
+        if last_seq not in self.frames and last_seq + 1 not in self.frames:
+            return None
+        missed = []
+        expected = last_seq + 1
+        for seq, frame in self.frames.items():
+            if seq <= last_seq:
+                continue
+            if seq != expected:
+                return None
+            missed.append(frame)
+            expected += 1
+        return missed
+
+
+class ReplayRecorder:
+    """One channel per process that joins every watched group and files its frames into ReplayBuffers."""
+
+    def __init__(self, size=REPLAY_BUFFER_SIZE, max_groups=REPLAY_MAX_GROUPS):
+        self.size = size
+        self.max_groups = max_groups
+        self.buffers = OrderedDict() # group -> ReplayBuffer, least recently watched first
+        self.channel = None
+        self._loop = None
+        self._task = None
+
+    async def watch(self, group):
+        """Start (or keep) recording `group`; returns its buffer. Call from the consumers' event loop."""
+        channel_layer = get_channel_layer()
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            # First socket in this process (or the old loop is gone): nothing recorded so far can be trusted
+            self.buffers.clear()
+            self.channel = await channel_layer.new_channel()
+            self._loop = loop
+            self._task = loop.create_task(self._record(channel_layer, self.channel))
+        # Re-adding refreshes the membership, so a long-lived group never hits the layer's group_expiry
+        await channel_layer.group_add(group, self.channel)
+        buffer = self.buffers.pop(group, None) or ReplayBuffer(self.size)
+        self.buffers[group] = buffer
+        while len(self.buffers) > self.max_groups:
+            stale_group, _ = self.buffers.popitem(last=False)
+            await channel_layer.group_discard(stale_group, self.channel)
+        return buffer
+
+    async def _record(self, channel_layer, channel):
+        try:
+            while True:
+                frame = await channel_layer.receive(channel)
+                buffer = self.buffers.get(frame.get('group'))
+                if buffer is not None:
+                    buffer.record(frame)
+        except Exception:
+            # The next watch() sees the finished task and starts over with empty buffers
+            logger.exception('Waitlist replay recorder stopped')
+
+
+replay_recorder = ReplayRecorder()
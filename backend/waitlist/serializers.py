@@ -5,4 +5,11 @@ class WaitlistEntrySerializer(serializers.ModelSerializer):
     class Meta:
         model = WaitlistEntry
         fields = '__all__'
-        read_only_fields = ('restaurant', 'timestamp') 
\ No newline at end of file
+        read_only_fields = ('restaurant', 'timestamp') 
+
+class CustomerWaitlistEntrySerializer(serializers.ModelSerializer):
+    """What the public customer pages may see of an entry: no phone, notes or host-side fields."""
+    class Meta:
+        model = WaitlistEntry
+        fields = ('id', 'customer_name', 'people_count', 'status', 'timestamp')
+        read_only_fields = fields
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_waitlist_version
+from .estimator import record_served_waits
+from .models import WaitlistEntry, WaitlistTombstone
+from .utils import prune_waitlist_tombstones
+
+@receiver(post_save, sender=WaitlistEntry)
+def bump_version_on_save(sender, instance, **kwargs):
+    """Any create/update (viewset, customer join/leave, reservation check-in, admin) invalidates the snapshot."""
+    bump_waitlist_version(instance.restaurant_id)
+
+@receiver(post_save, sender=WaitlistEntry)
+def record_wait_on_served(sender, instance, **kwargs):
+    """Feed the wait-time estimator once per SERVED transition, after the transaction commits."""
+    if instance.became_served:
+        transaction.on_commit(lambda: record_served_waits([instance]), robust=True) # Stats never fail the committed write
+
+@receiver(post_delete, sender=WaitlistEntry)
+def bump_version_on_delete(sender, instance, origin=None, **kwargs):
+    bump_waitlist_version(instance.restaurant_id)
+    # Leave a tombstone for the change feed, unless the whole restaurant (or its owner) is being
+    # deleted; a tombstone pointing at a restaurant mid-deletion would violate its foreign key.
+    deleting_entries = isinstance(origin, WaitlistEntry) or (
+        isinstance(origin, QuerySet) and origin.model is WaitlistEntry
+    )
+    if deleting_entries:
+        WaitlistTombstone.objects.create(restaurant_id=instance.restaurant_id, entry_id=instance.id)
+        prune_waitlist_tombstones(instance.restaurant_id)
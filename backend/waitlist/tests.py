@@ -1,3 +1,708 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from auth_settings.models import CustomUser, Restaurant
+from notifications.utils import normalize_phone
+from realtime.auth import TokenAuthMiddleware
+from reservation.models import Reservation
+from . import broadcast
+from .broadcast import WaitlistBroadcaster, allocate_waitlist_seq, coalesce
+from .consumers import WaitlistConsumer
+from .estimator import DEFAULT_TURN_MINUTES, MIN_SAMPLES, estimate_wait_minutes, hour_of_week, party_size_bucket
+from .models import WaitlistEntry, WaitTimeStat
+from .replay import ReplayBuffer, replay_recorder
+from .cache import get_waitlist_snapshot
+from .utils import DELTA_CURSOR_SKEW, active_waitlist_queryset, render_qr_code
+
+
+class ActiveWaitlistIndexTests(TestCase):
+    """
+    EXPLAIN-based checks that the hot waitlist queries are answered from an index
+    rather than a scan over the whole WaitlistEntry table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        cls.restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        WaitlistEntry.objects.bulk_create([
+            WaitlistEntry(
+                restaurant=cls.restaurant,
+                customer_name=f'Guest {i}',
+                phone_number=f'555000{i:04d}',
+                people_count=2,
+                status='WAITING' if i % 10 == 0 else 'SERVED',
+            )
+            for i in range(200)
+        ])
+
+    def assertUsesIndex(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables make a seq scan look cheapest; disable it so the plan shows
+            # whether an index *can* answer the query.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan, plan)
+            self.assertIn('Index', plan, plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertRegex(plan, r'USING (COVERING )?INDEX', plan)
+            self.assertNotIn('SCAN waitlist_waitlistentry\n', plan + '\n', plan)
+        else:
+            self.skipTest(f'No EXPLAIN assertions for {connection.vendor}')
+        return plan
+
+    def test_active_list_uses_index(self):
+        # get_formatted_waitlist_entries / WaitlistEntryViewSet.list
+        plan = self.assertUsesIndex(active_waitlist_queryset(self.restaurant))
+        if connection.vendor == 'sqlite':
+            # Ordering should come straight from the index, not a temp sort
+            self.assertNotIn('TEMP B-TREE', plan, plan)
+
+    def test_queue_size_count_uses_index(self):
+        # JoinQueueAPIView / QueueStatusAPIView queue_size
+        self.assertUsesIndex(
+            WaitlistEntry.objects.filter(restaurant=self.restaurant, status='WAITING').values('id')
+        )
+
+    def test_check_phone_lookup_uses_index(self):
+        # CheckPhoneAPIView
+        self.assertUsesIndex(
+            WaitlistEntry.objects.filter(
+                restaurant=self.restaurant, status='WAITING', phone_number__iexact='5550000010'
+            )
+        )
+
+
+class WaitlistConditionalGetTests(TestCase):
+    """If-None-Match on the host polling endpoints short-circuits to 304 with minimal queries."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='host@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        for i in range(5):
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name=f'Guest {i}', phone_number=f'555100{i:04d}', people_count=2
+            )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        bucket = mock.patch('waitlist.views.wait_time_bucket', return_value=1) # Hold the clock still
+        self.bucket = bucket.start()
+        self.addCleanup(bucket.stop)
+
+    def assertConditional(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Token lookup + restaurant row only; no entries query and no serialization
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Any waitlist write changes the version and therefore the ETag
+        WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Late Guest', phone_number='5559999999', people_count=4
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_entries_list(self):
+        self.assertConditional('/api/waitlist/entries/')
+
+    def test_data_with_qr(self):
+        self.assertConditional('/api/waitlist/entries/data_with_qr/')
+
+    def test_wait_times_are_refreshed_once_the_bucket_rolls_over(self):
+        url = '/api/waitlist/entries/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Nothing was written, but a minute later the cached wait times must be recomputed
+        self.bucket.return_value = 2
+        with mock.patch('waitlist.cache.get_formatted_waitlist_entries', return_value=([], 0, 0)) as rebuild:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        rebuild.assert_called_once()
+
+    def test_saving_a_stale_restaurant_keeps_the_counters(self):
+        url = '/api/waitlist/entries/'
+        etag = self.client.get(url)['ETag']
+        version = Restaurant.objects.get(pk=self.restaurant.pk).waitlist_version
+        self.assertGreater(version, self.restaurant.waitlist_version) # Loaded before the entries were added
+
+        self.restaurant.name = 'Renamed' # e.g. from the admin
+        self.restaurant.save()
+        self.restaurant.refresh_from_db()
+        self.assertEqual((self.restaurant.name, self.restaurant.waitlist_version), ('Renamed', version))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_changes_rejects_impossible_cursor(self):
+        for since in ('yesterday', '2024-02-30T10:00:00'):
+            response = self.client.get('/api/waitlist/entries/changes/', {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+
+    def test_list_and_data_with_qr_do_not_share_etags(self):
+        list_etag = self.client.get('/api/waitlist/entries/')['ETag']
+        response = self.client.get('/api/waitlist/entries/data_with_qr/', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class WaitlistChangeFeedTests(TestCase):
+    """changes/?since=<cursor> returns what changed after the cursor, deletions included, with a safety overlap."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='host@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.entries = [
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name=f'Guest {i}', phone_number=f'555500{i:04d}', people_count=2
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.cursor = self.sync()['cursor']
+        # Everything so far is older than the cursor
+        WaitlistEntry.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def sync(self, since=None):
+        response = self.client.get('/api/waitlist/entries/changes/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_returns_rows_updated_after_the_cursor(self):
+        edited, served, untouched = self.entries
+        self.client.patch(f'/api/waitlist/entries/{edited.id}/', {'notes': 'edited'}, format='json')
+        self.client.post(f'/api/waitlist/entries/{served.id}/set_status/', {'status': 'SERVED'}, format='json')
+
+        delta = self.sync(self.cursor)
+        self.assertFalse(delta['full'])
+        self.assertEqual([(row['id'], row['notes']) for row in delta['updated']], [(edited.id, 'edited')])
+        self.assertEqual(delta['removed'], [served.id])
+        self.assertNotIn(untouched.id, [row['id'] for row in delta['updated']])
+
+    def test_deletions_come_back_as_tombstones(self):
+        deleted = self.entries[0]
+        self.assertEqual(self.client.delete(f'/api/waitlist/entries/{deleted.id}/').status_code, 204)
+        delta = self.sync(self.cursor)
+        self.assertEqual((delta['updated'], delta['removed']), ([], [deleted.id]))
+
+    def test_cursor_overlap_resends_rows_near_the_cursor(self):
+        handed_out = timezone.now()
+        data = self.sync()
+        # Handed out SKEW before the sync read, not at the moment it answered
+        self.assertLessEqual(parse_datetime(data['cursor']), timezone.now() - DELTA_CURSOR_SKEW)
+
+        # Stamped before that sync returned, but committed after it read: inside the overlap window
+        late = self.entries[1]
+        WaitlistEntry.objects.filter(pk=late.pk).update(updated_at=handed_out - DELTA_CURSOR_SKEW / 2, notes='late')
+        delta = self.sync(data['cursor'])
+        self.assertEqual([(row['id'], row['notes']) for row in delta['updated']], [(late.id, 'late')])
+
+
+class CompactWaitlistPayloadTests(TestCase):
+    """?payload=compact projects the waitlist onto the requested (or the restaurant's configured) fields."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='host@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(
+            user=self.user, name='Test Restaurant', waitlist_columns=['notes', 'source', 'not_a_column']
+        )
+        for i in range(3):
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name=f'Guest {i}', phone_number=f'555300{i:04d}',
+                people_count=2 + i, notes=f'note {i}'
+            )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        cache.clear()
+        bucket = mock.patch('waitlist.views.wait_time_bucket', return_value=1)
+        bucket.start()
+        self.addCleanup(bucket.stop)
+
+    def get(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/waitlist/entries/', {'payload': 'compact', **params}, **headers)
+
+    def test_default_fields_come_from_waitlist_columns(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        expected = ['id', 'pos', 'name', 'phone', 'size', 'wait_time', 'notes', 'source'] # Unknown columns are ignored
+        self.assertEqual(response.data['fields'], expected)
+        self.assertEqual(response.data['count'], 3)
+        for pos, row in enumerate(response.data['entries'], 1):
+            self.assertEqual(list(row), expected)
+            self.assertEqual((row['pos'], row['name'], row['notes']), (pos, f'Guest {pos - 1}', f'note {pos - 1}'))
+
+    def test_fields_param_projects_and_always_keeps_id(self):
+        response = self.get(fields='size, name')
+        self.assertEqual(response.data['fields'], ['id', 'name', 'size'])
+        self.assertEqual(response.data['entries'][0], {
+            'id': WaitlistEntry.objects.get(customer_name='Guest 0').id, 'name': 'Guest 0', 'size': 2,
+        })
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.get(fields='name,nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nope', response.data['error'])
+
+    def test_each_field_set_has_its_own_etag_and_snapshot(self):
+        names = self.get(fields='name')
+        sizes = self.get(fields='name,size')
+        full = self.client.get('/api/waitlist/entries/')
+        self.assertEqual(len({names['ETag'], sizes['ETag'], full['ETag']}), 3)
+        self.assertEqual(self.get(names['ETag'], fields='name').status_code, 304)
+        self.assertEqual(self.get(names['ETag'], fields='name,size').status_code, 200)
+
+        restaurant = Restaurant.objects.get(pk=self.restaurant.pk)
+        narrow = get_waitlist_snapshot(restaurant, ['id', 'name'], bucket=1)
+        wide = get_waitlist_snapshot(restaurant, ['id', 'name', 'size'], bucket=1)
+        self.assertEqual((set(narrow['entries'][0]), set(wide['entries'][0])), ({'id', 'name'}, {'id', 'name', 'size'}))
+
+
+class QRCodeStorageTests(TestCase):
+    """Rendered QR codes are persisted once under their digest, however many workers render them."""
+
+    def test_concurrent_first_renders_leave_one_file(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            render_qr_code.cache_clear()
+            render_qr_code('https://example.com/join-queue/1')
+            render_qr_code.cache_clear()
+            exists = default_storage.exists
+            # The second worker checked before the first had saved; the storage itself still sees the file
+            checks = iter([False])
+            with mock.patch.object(default_storage, 'exists', side_effect=lambda name: next(checks, exists(name))):
+                render_qr_code('https://example.com/join-queue/1')
+            self.assertEqual(len(os.listdir(os.path.join(media_root, 'qrcodes'))), 1)
+        render_qr_code.cache_clear()
+
+
+class WaitTimeEstimatorTests(TestCase):
+    """Served entries feed per-cell turn-time stats incrementally, and quotes fall back sensibly."""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(email='estimator@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        cache.clear()
+
+    def serve(self, joined, waited_minutes, people_count=2):
+        entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='5554000000',
+            people_count=people_count, timestamp=joined
+        )
+        entry.status = 'SERVED'
+        entry.completion_time = joined + timedelta(minutes=waited_minutes)
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        return entry
+
+    def test_default_without_history(self):
+        self.assertEqual(estimate_wait_minutes(self.restaurant.id, 2, 3), 3 * DEFAULT_TURN_MINUTES)
+        self.assertEqual(estimate_wait_minutes(self.restaurant.id, 2, 0), 0)
+
+    def test_served_transition_updates_stats_once(self):
+        joined = timezone.now() - timedelta(hours=1)
+        entry = self.serve(joined, 20)
+        stat = WaitTimeStat.objects.get(restaurant=self.restaurant)
+        self.assertEqual(stat.samples, 1)
+        self.assertEqual(stat.party_size_bucket, party_size_bucket(2))
+        self.assertEqual(stat.hour_of_week, hour_of_week(joined))
+        self.assertAlmostEqual(stat.turn_minutes_ewma, 20.0)
+
+        # Re-saving an already SERVED entry is not a new observation
+        entry.notes = 'edited'
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.assertEqual(WaitTimeStat.objects.get(restaurant=self.restaurant).samples, 1)
+
+    def test_stat_failure_does_not_fail_the_served_write(self):
+        with mock.patch('waitlist.signals.record_served_waits', side_effect=RuntimeError('stats down')):
+            entry = self.serve(timezone.now() - timedelta(hours=1), 20) # Would raise without robust=True
+        self.assertEqual(WaitlistEntry.objects.get(pk=entry.pk).status, 'SERVED')
+        self.assertFalse(WaitTimeStat.objects.exists())
+
+    def test_turn_time_divides_by_position_at_join(self):
+        joined = timezone.now() - timedelta(hours=2)
+        # Two parties still waiting when the next one joins -> it was third in line
+        for offset in (1, 2):
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name='Ahead', phone_number=f'555400001{offset}',
+                people_count=2, timestamp=joined - timedelta(minutes=offset)
+            )
+        self.serve(joined, 30)
+        stat = WaitTimeStat.objects.get(restaurant=self.restaurant)
+        self.assertAlmostEqual(stat.turn_minutes_sum, 10.0)
+
+    def test_estimate_uses_history_with_fallbacks(self):
+        joined = timezone.now() - timedelta(days=7)
+        for _ in range(MIN_SAMPLES):
+            self.serve(joined, 8)
+        cache.clear()
+        # Same bucket and hour of week as the history
+        self.assertEqual(estimate_wait_minutes(self.restaurant.id, 2, 2, at=joined), 16)
+        # Another hour falls back to the bucket average; another bucket to the restaurant average
+        self.assertEqual(estimate_wait_minutes(self.restaurant.id, 2, 2, at=joined + timedelta(hours=5)), 16)
+        self.assertEqual(estimate_wait_minutes(self.restaurant.id, 8, 1, at=joined), 8)
+
+
+class WaitingPhoneConstraintTests(TestCase):
+    """phone_e164 is the normalized lookup key, and only one WAITING entry may hold it per restaurant."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='(555) 010-2000', people_count=2
+        )
+
+    def test_normalize_phone(self):
+        for raw, expected in (
+            ('(555) 010-2000', '+15550102000'),
+            ('1-555-010-2000', '+15550102000'),
+            ('+44 20 7946 0958', '+442079460958'),
+            ('+49 30 1234567', '+49301234567'), # Ten digits, but the + says it's not a US number
+            ('010-2000', '0102000'),
+            ('  ', ''),
+        ):
+            self.assertEqual(normalize_phone(raw), expected, raw)
+        self.assertEqual(self.entry.phone_e164, '+15550102000')
+
+    def test_one_waiting_entry_per_phone(self):
+        with self.assertRaises(IntegrityError):
+            WaitlistEntry.objects.create(
+                restaurant=self.restaurant, customer_name='Again', phone_number='+1 555 010 2000', people_count=2
+            )
+        # Once seated, the same guest can queue again
+        self.entry.status = 'SERVED'
+        self.entry.save()
+        WaitlistEntry.objects.create(restaurant=self.restaurant, customer_name='Again', phone_number='5550102000', people_count=2)
+
+    def test_host_paths_report_duplicates(self):
+        response = self.client.post('/api/waitlist/entries/', {
+            'customer_name': 'Again', 'phone_number': '555.010.2000', 'people_count': 2,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('phone_number', response.data)
+
+        self.entry.status = 'SERVED'
+        self.entry.save()
+        newer = WaitlistEntry.objects.create(restaurant=self.restaurant, customer_name='Again', phone_number='5550102000', people_count=2)
+        other = WaitlistEntry.objects.create(restaurant=self.restaurant, customer_name='Other', phone_number='5550109999', people_count=2)
+        response = self.client.post('/api/waitlist/entries/bulk/', {'operations': [
+            {'id': other.id, 'op': 'set_status', 'status': 'SERVED'},
+            {'id': self.entry.id, 'op': 'set_status', 'status': 'WAITING'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 409)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'WAITING') # The whole batch rolled back
+
+        response = self.client.post(f'/api/waitlist/entries/{self.entry.id}/set_status/', {'status': 'WAITING'}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+
+class BackfillCommandTests(TestCase):
+    """Backfills write with queryset/bulk updates, so they must stamp updated_at and bump versions themselves."""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=user, name='Test Restaurant')
+        self.entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='5550102000', people_count=2,
+            notes='Reservation for 19:00'
+        )
+        self.served = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Earlier', phone_number='5550103000', people_count=2, status='SERVED'
+        )
+        self.stale = timezone.now() - timedelta(hours=1)
+        WaitlistEntry.objects.update(phone_e164='', updated_at=self.stale)
+
+    def assertChangesPublished(self, entry, version):
+        entry.refresh_from_db()
+        self.restaurant.refresh_from_db()
+        self.assertGreater(entry.updated_at, self.stale) # Picked up by the change feed
+        self.assertGreater(self.restaurant.waitlist_version, version) # And by ETags and snapshots
+
+    def test_source_backfill(self):
+        version = Restaurant.objects.get(id=self.restaurant.id).waitlist_version
+        call_command('backfill_waitlist_source', stdout=StringIO())
+        self.assertChangesPublished(self.entry, version)
+        self.assertEqual(self.entry.priority, WaitlistEntry.PRIORITY_RESERVATION)
+
+    def test_phone_backfill(self):
+        for entry in (self.entry, self.served): # The waiting entry and the batched history
+            version = Restaurant.objects.get(id=self.restaurant.id).waitlist_version
+            WaitlistEntry.objects.filter(id=entry.id).update(phone_e164='')
+            call_command('backfill_phone_e164', stdout=StringIO())
+            self.assertChangesPublished(entry, version)
+            self.assertEqual(entry.phone_e164, normalize_phone(entry.phone_number))
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.frames = []
+
+    async def group_send(self, group, message):
+        self.frames.append((group, message))
+
+
+class BroadcastCoalescingTests(TestCase):
+    """A burst of writes inside one window reaches each group as a single collapsed frame."""
+
+    def setUp(self):
+        self.layer = RecordingChannelLayer()
+        sequence = itertools.count(1)
+        self.broadcaster = WaitlistBroadcaster(
+            window_ms=50, channel_layer=self.layer, allocate_seq=lambda restaurant_id: next(sequence)
+        )
+
+    def update(self, entry_id, **fields):
+        return {'type': 'send.waitlist.update', 'data': {'id': entry_id, **fields}}
+
+    def test_burst_collapses_to_one_bulk_frame_per_group(self):
+        self.broadcaster.publish(1, self.update(10, status='WAITING'))
+        self.broadcaster.publish(1, self.update(11, status='WAITING'))
+        self.broadcaster.publish(1, self.update(10, status='NOTIFIED'))
+        self.broadcaster.publish(1, {'type': 'send.waitlist.remove', 'data': {'id': 11, 'status': 'REMOVED'}})
+        self.broadcaster.publish(1, {'type': 'send.waitlist.bulk', 'data': {'updated': [{'id': 12, 'status': 'SERVED'}], 'removed': []}})
+        self.broadcaster.publish(2, self.update(20, status='WAITING'))
+        self.broadcaster.publish(2, self.update(20, status='SERVED'))
+        self.broadcaster.drain()
+
+        frames = {group: frame for group, frame in self.layer.frames}
+        self.assertEqual(sorted(frame.pop('seq') for frame in frames.values()), [1, 2])
+        self.assertEqual(frames['waitlist_1'], {'type': 'send.waitlist.bulk', 'group': 'waitlist_1', 'data': {
+            'updated': [{'id': 10, 'status': 'NOTIFIED'}, {'id': 12, 'status': 'SERVED'}],
+            'removed': [11],
+        }})
+        # A single surviving change keeps its ordinary frame type
+        self.assertEqual(frames['waitlist_2'], {**self.update(20, status='SERVED'), 'group': 'waitlist_2'})
+        stats = self.broadcaster.stats()
+        self.assertEqual((stats['events_in'], stats['frames_out'], stats['window_ms']), (7, 2, 50))
+
+    def test_window_flushes_without_drain(self):
+        self.broadcaster.publish(1, self.update(10))
+        deadline = time.monotonic() + 2
+        while not self.layer.frames and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.layer.frames, [('waitlist_1', {**self.update(10), 'group': 'waitlist_1', 'seq': 1})])
+
+    def test_non_entry_messages_pass_through(self):
+        refresh = {'type': 'send.waitlist.update', 'data': {'message': 'Full waitlist refresh requested'}}
+        self.assertEqual(coalesce([self.update(1), refresh, self.update(1, status='SERVED')]), [
+            self.update(1, status='SERVED'), refresh,
+        ])
+
+
+class BroadcastOnCommitTests(TestCase):
+    """Host and customer writes announce themselves through the broadcaster, and only after commit."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='host@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.layer = RecordingChannelLayer()
+        sequence = itertools.count(1)
+        patcher = mock.patch.object(broadcast, 'broadcaster', WaitlistBroadcaster(
+            window_ms=0, channel_layer=self.layer, allocate_seq=lambda restaurant_id: next(sequence)
+        ))
+        self.broadcaster = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_host_write_is_published_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/waitlist/entries/', {
+                'customer_name': 'Guest', 'phone_number': '5550000000', 'people_count': 2, 'quoted_time': 10,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.broadcaster.stats()['events_in'], 0) # Nothing left the request before the commit
+
+        for callback in callbacks:
+            callback()
+        self.broadcaster.drain()
+        (group, frame), = self.layer.frames
+        self.assertEqual((group, frame['type'], frame['data']['id']), (f'waitlist_{self.restaurant.id}', 'send.waitlist.update', response.data['id']))
+        self.assertEqual(self.broadcaster.stats()['lag_ms']['samples'], 1)
+
+    def test_customer_join_and_leave_use_the_dispatcher(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/customer/join-queue/{self.restaurant.id}/submit/', {
+                'customer_name': 'Guest', 'phone_number': '5550000000', 'people_count': 2,
+            }, format='json')
+        entry_id = response.data['queue_entry_id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/customer/leave-queue/{self.restaurant.id}/{entry_id}/')
+        self.broadcaster.drain()
+
+        self.assertEqual([frame['type'] for _, frame in self.layer.frames], ['send.waitlist.update', 'send.waitlist.remove'])
+        self.assertEqual(self.layer.frames[1][1]['data'], {'id': entry_id, 'status': 'REMOVED'})
+
+    def test_reservation_check_in_uses_the_dispatcher(self):
+        reservation = Reservation.objects.create(
+            restaurant=self.restaurant, name='Booked', phone='5550000001', party_size=2,
+            date=timezone.now().date(), time=timezone.now().time()
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/restaurants/{self.restaurant.id}/reservations/{reservation.id}/check-in/')
+        self.broadcaster.drain()
+
+        (group, frame), = self.layer.frames
+        self.assertEqual((group, frame['type'], frame['data']['id']), (f'waitlist_{self.restaurant.id}', 'send.waitlist.update', response.data['waitlist_entry_id']))
+
+
+class SequencedWaitlistSocketTests(TransactionTestCase):
+    """
+    Frames carry per-restaurant seqs; reconnects replay the gap or fall back to a snapshot.
+    The consumer's database_sync_to_async closes its connection, so this can't run inside TestCase's transaction.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password123')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Test Restaurant')
+        self.entry = WaitlistEntry.objects.create(
+            restaurant=self.restaurant, customer_name='Guest', phone_number='5550000000', people_count=2
+        )
+
+    def communicator(self, path, restaurant_id=None, user=None, application=None):
+        communicator = WebsocketCommunicator(application or WaitlistConsumer.as_asgi(), path)
+        communicator.scope['url_route'] = {'kwargs': {'restaurant_id': str(restaurant_id or self.restaurant.id)}}
+        communicator.scope['user'] = user or self.user
+        return communicator
+
+    def test_sequence_numbers_are_allocated_per_restaurant(self):
+        other = Restaurant.objects.create(
+            user=CustomUser.objects.create_user(email='other@example.com', password='password123'), name='Other'
+        )
+        self.assertEqual([allocate_waitlist_seq(self.restaurant.id) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(allocate_waitlist_seq(other.id), 1)
+        self.assertIsNone(allocate_waitlist_seq(0))
+
+    def test_snapshot_then_gap_replay(self):
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(waitlist_seq=5)
+        group = f'waitlist_{self.restaurant.id}'
+        path = f'ws/waitlist/{self.restaurant.id}'
+
+        async def scenario():
+            first = self.communicator(path)
+            connected, _ = await first.connect()
+            self.assertTrue(connected)
+            snapshot = await first.receive_json_from()
+            self.assertEqual((snapshot['type'], snapshot['seq']), ('send.waitlist.snapshot', 5))
+            self.assertEqual([entry['id'] for entry in snapshot['data']['entries']], [self.entry.id])
+            await first.disconnect()
+
+            # Sent while nobody is connected; this worker's recorder still buffers them
+            channel_layer = get_channel_layer()
+            for seq in (6, 7):
+                await channel_layer.group_send(group, {
+                    'type': 'send.waitlist.update', 'group': group, 'seq': seq, 'data': {'id': self.entry.id, 'seq': seq},
+                })
+            await Restaurant.objects.filter(pk=self.restaurant.pk).aupdate(waitlist_seq=7)
+            await asyncio.sleep(0.05) # Let the recorder drain its channel
+
+            async def reconnect(last_seq):
+                communicator = self.communicator(f'{path}?last_seq={last_seq}')
+                await communicator.connect()
+                frames = []
+                while not await communicator.receive_nothing(timeout=0.1):
+                    frames.append(await communicator.receive_json_from())
+                await communicator.disconnect()
+                return frames
+
+            replayed = await reconnect(5)
+            self.assertEqual([(frame['type'], frame['seq']) for frame in replayed], [('send.waitlist.update', 6), ('send.waitlist.update', 7)])
+            self.assertEqual(await reconnect(7), [])
+            # Seq 3 was never buffered here: the gap can't be replayed
+            self.assertEqual([frame['type'] for frame in await reconnect(3)], ['send.waitlist.snapshot'])
+
+        async_to_sync(scenario)()
+
+    def test_frame_sent_before_the_joins_is_not_lost(self):
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(waitlist_seq=5)
+        group = f'waitlist_{self.restaurant.id}'
+        watch = replay_recorder.watch
+
+        async def publish_then_watch(group_name):
+            # A write commits after the ownership check but before the recorder and socket join the group
+            seq = await database_sync_to_async(allocate_waitlist_seq)(self.restaurant.id)
+            await get_channel_layer().group_send(group, {
+                'type': 'send.waitlist.update', 'group': group, 'seq': seq, 'data': {'id': self.entry.id, 'seq': seq},
+            })
+            return await watch(group_name)
+
+        async def scenario():
+            communicator = self.communicator(f'ws/waitlist/{self.restaurant.id}?last_seq=5')
+            with mock.patch.object(replay_recorder, 'watch', publish_then_watch):
+                connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            frame = await communicator.receive_json_from()
+            self.assertEqual((frame['type'], frame['seq']), ('send.waitlist.snapshot', 6)) # Not [] at seq 5
+            await communicator.disconnect()
+        async_to_sync(scenario)()
+
+    def test_unknown_restaurant_is_rejected(self):
+        async def scenario():
+            communicator = self.communicator('ws/waitlist/999999', restaurant_id=999999)
+            connected, code = await communicator.connect()
+            self.assertEqual((connected, code), (False, 4404))
+        async_to_sync(scenario)()
+
+    def test_only_the_owner_gets_the_queue(self):
+        stranger = CustomUser.objects.create_user(email='stranger@example.com', password='password123')
+        async def scenario():
+            for user in (AnonymousUser(), stranger):
+                communicator = self.communicator(f'ws/waitlist/{self.restaurant.id}', user=user)
+                connected, code = await communicator.connect()
+                self.assertEqual((connected, code), (False, 4403))
+        async_to_sync(scenario)()
+
+    def test_api_token_in_the_query_string_authenticates(self):
+        token = Token.objects.create(user=self.user)
+        application = TokenAuthMiddleware(WaitlistConsumer.as_asgi())
+        async def scenario():
+            communicator = self.communicator(
+                f'ws/waitlist/{self.restaurant.id}?token={token.key}', user=AnonymousUser(), application=application
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual((await communicator.receive_json_from())['type'], 'send.waitlist.snapshot')
+            await communicator.disconnect()
+        async_to_sync(scenario)()
+
+    def test_replay_buffer_evicts_and_detects_holes(self):
+        buffer = ReplayBuffer(size=3)
+        for seq in (1, 2, 4, 3, 5):
+            buffer.record({'seq': seq})
+        self.assertEqual(list(buffer.frames), [3, 4, 5])
+        self.assertEqual([frame['seq'] for frame in buffer.since(3, 6)], [4, 5]) # 6 still in flight
+        self.assertIsNone(buffer.since(1, 5)) # 2 was evicted
+        self.assertIsNone(buffer.since(9, 5)) # From the future
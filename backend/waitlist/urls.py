@@ -3,7 +3,10 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     WaitlistEntryViewSet,
     WaitlistRestaurantConfigAPIView,
-    WaitlistRestaurantQRCodeAPIView
+    WaitlistRestaurantQRCodeAPIView,
+    WaitlistCacheStatsAPIView,
+    WaitlistBroadcastStatsAPIView,
+    WaitlistQRCodeImageView
 )
 
 router = DefaultRouter()
@@ -11,6 +14,8 @@ router = DefaultRouter()
 # /api/waitlist/entries/{pk}/ - for retrieve, update, partial_update, destroy
 # /api/waitlist/entries/{pk}/set_status/ - for custom action set_status
 # /api/waitlist/entries/data_with_qr/ - for custom list action data_with_qr
+# /api/waitlist/entries/changes/?since=<cursor> - change feed for reconnecting clients
+# /api/waitlist/entries/bulk/ - several set_status/delete operations in one transaction
 router.register(r'entries', WaitlistEntryViewSet, basename='waitlistentry')
 
 # Maps to /api/waitlist/
@@ -20,6 +25,9 @@ urlpatterns = [
     # Standalone APIViews for restaurant-level waitlist settings
     path('config/', WaitlistRestaurantConfigAPIView.as_view(), name='waitlist-restaurant-config'),
     path('qrcode/', WaitlistRestaurantQRCodeAPIView.as_view(), name='waitlist-restaurant-qrcode'),
+    path('qrcode/<int:restaurant_id>.<str:image_format>', WaitlistQRCodeImageView.as_view(), name='waitlist-qrcode-image'),
+    path('cache-stats/', WaitlistCacheStatsAPIView.as_view(), name='waitlist-cache-stats'),
+    path('broadcast-stats/', WaitlistBroadcastStatsAPIView.as_view(), name='waitlist-broadcast-stats'),
 
     # Old FBV paths are removed as their functionality is now in the ViewSet or new APIViews.
     # Example: path('update-columns/', update_columns_view, name='waitlist-update-columns'), # Now handled by /api/waitlist/config/
@@ -1,63 +1,273 @@
-from .models import WaitlistEntry
+from .models import WaitlistEntry, WaitlistTombstone
 # from restaurant_app.models import Restaurant # Old import
 from auth_settings.models import Restaurant # New import
 import qrcode
+from qrcode.image.svg import SvgPathImage
 import base64
+import hashlib
+from functools import lru_cache
 from io import BytesIO
 import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import Now
+
+def active_waitlist_queryset(restaurant_obj):
+    """WAITING entries for a restaurant in the order the host sees them.
+    Reservations (priority 0) come first, then everyone else by arrival time.
+    Served from the partial (restaurant, priority, timestamp, id) index.
+    """
+    return WaitlistEntry.objects.filter(
+        restaurant=restaurant_obj,
+        status='WAITING'
+    ).order_by('priority', 'timestamp', 'id')
+
+def _queue_position_query(entry):
+    """The WAITING queryset and aggregates shared by get_queue_position / aget_queue_position."""
+    ahead = (
+        Q(priority__lt=entry.priority)
+        | Q(priority=entry.priority, timestamp__lt=entry.timestamp)
+        | Q(priority=entry.priority, timestamp=entry.timestamp, id__lt=entry.id)
+    )
+    queryset = WaitlistEntry.objects.filter(restaurant_id=entry.restaurant_id, status='WAITING')
+    return queryset, {'ahead': Count('id', filter=ahead), 'queue_size': Count('id')}
+
+def get_queue_position(entry):
+    """Position of a WAITING entry in the host's (priority, timestamp, id) order, plus the queue size.
+    Both come from a single aggregate over the active index, so customer polls cost
+    one query no matter how long the queue is. Returns (0, queue_size) for inactive entries.
+    """
+    queryset, aggregates = _queue_position_query(entry)
+    counts = queryset.aggregate(**aggregates)
+    position = counts['ahead'] + 1 if entry.status == 'WAITING' else 0
+    return position, counts['queue_size']
+
+async def aget_queue_position(entry):
+    """Async counterpart of get_queue_position for the async customer views."""
+    queryset, aggregates = _queue_position_query(entry)
+    counts = await queryset.aaggregate(**aggregates)
+    position = counts['ahead'] + 1 if entry.status == 'WAITING' else 0
+    return position, counts['queue_size']
+
+def with_wait_time(queryset):
+    """Annotate `waited` (a timedelta since arrival) computed by the database."""
+    return queryset.annotate(
+        waited=ExpressionWrapper(Now() - F('timestamp'), output_field=DurationField())
+    )
+
+def waited_minutes(waited):
+    return max(int(waited.total_seconds() // 60), 0) if waited is not None else 0
+
+def format_waitlist_entry(entry, position=None):
+    """Full host-dashboard row for an entry annotated by with_wait_time."""
+    wait_time = waited_minutes(entry.waited)
+    return {
+        'id': entry.id,
+        'pos': position,  # Position in the displayed list
+        'customer_name': entry.customer_name,
+        'name': entry.customer_name,  # Alternative field name for compatibility
+        'phone_number': entry.phone_number or '',
+        'phone': entry.phone_number or '',  # Alternative field name
+        'people_count': entry.people_count,
+        'party_size': entry.people_count,  # Alternative field name
+        'size': entry.people_count,  # For backward compatibility
+        'timestamp': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') if entry.timestamp else '',
+        'arrival': entry.timestamp.strftime('%H:%M') if entry.timestamp else '', # Arrival time
+        'created_at': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') if entry.timestamp else '', # Full creation timestamp
+        'quoted_time': entry.quoted_time or '',
+        'notes': entry.notes or '',
+        'source': entry.source,
+        'is_reservation': entry.source == 'RESERVATION',
+        'wait_time_minutes': wait_time,
+        'wait_time': wait_time, # Alternative field name
+        'status': entry.status,
+        'status_display': entry.get_status_display() # Human-readable status
+    }
 
 def get_formatted_waitlist_entries(restaurant_obj):
     """Get a list of formatted waitlist entries for a restaurant.
     Returns formatted entries, total count, and reservation count.
     """
-    # Filter for entries associated with the given restaurant object
-    reservation_entries = WaitlistEntry.objects.filter(
-        restaurant=restaurant_obj,
-        status='WAITING',
-        notes__icontains="Reservation for"  # Case-insensitive search for reservation notes
-    ).order_by('timestamp')
-    
-    regular_entries = WaitlistEntry.objects.filter(
-        restaurant=restaurant_obj,
-        status='WAITING'
-    ).exclude(
-        notes__icontains="Reservation for"
-    ).order_by('timestamp')
-    
-    # Combine querysets, reservations first
-    combined_entries = list(reservation_entries) + list(regular_entries)
-    
+    # Single index-ordered query; elapsed wait is computed by the database
+    entries = with_wait_time(active_waitlist_queryset(restaurant_obj))
+
     formatted_entries_list = []
-    for index, entry in enumerate(combined_entries, 1):
-        # Assuming WaitlistEntry model has a property 'wait_time_minutes'
-        wait_time = entry.wait_time_minutes if hasattr(entry, 'wait_time_minutes') else 0
-        
-        formatted_entries_list.append({
-            'id': entry.id,
-            'pos': index,  # Position in the displayed list
-            'customer_name': entry.customer_name,
-            'name': entry.customer_name,  # Alternative field name for compatibility
-            'phone_number': entry.phone_number or '',
-            'phone': entry.phone_number or '',  # Alternative field name
-            'people_count': entry.people_count,
-            'party_size': entry.people_count,  # Alternative field name
-            'size': entry.people_count,  # For backward compatibility
-            'timestamp': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') if entry.timestamp else '',
-            'arrival': entry.timestamp.strftime('%H:%M') if entry.timestamp else '', # Arrival time
-            'created_at': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') if entry.timestamp else '', # Full creation timestamp
-            'quoted_time': entry.quoted_time or '',
-            'notes': entry.notes or '',
-            'wait_time_minutes': wait_time,
-            'wait_time': wait_time, # Alternative field name
-            'status': entry.status,
-            'status_display': entry.get_status_display() # Human-readable status
-        })
-        
-    return formatted_entries_list, len(combined_entries), len(reservation_entries)
+    reservation_count = 0
+    for index, entry in enumerate(entries, 1):
+        if entry.source == 'RESERVATION':
+            reservation_count += 1
+        formatted_entries_list.append(format_waitlist_entry(entry, index))
+
+    return formatted_entries_list, len(formatted_entries_list), reservation_count
+
+# --- Change feed ---
+# Gaps older than this (or with more changes than the limit) get a full snapshot instead of a delta
+DELTA_MAX_AGE = timedelta(seconds=getattr(settings, 'WAITLIST_DELTA_MAX_AGE', 6 * 60 * 60))
+DELTA_MAX_CHANGES = getattr(settings, 'WAITLIST_DELTA_MAX_CHANGES', 200)
+# updated_at is stamped at save() time, before commit; hand out cursors a little in the past so a
+# slow transaction committing just after a sync is still picked up next time (duplicates are harmless)
+DELTA_CURSOR_SKEW = timedelta(seconds=5)
+
+def prune_waitlist_tombstones(restaurant_id):
+    WaitlistTombstone.objects.filter(
+        restaurant_id=restaurant_id,
+        deleted_at__lt=timezone.now() - DELTA_MAX_AGE
+    ).delete()
+
+def get_waitlist_changes(restaurant_obj, since):
+    """Entries created/updated/removed after `since` (an aware datetime).
+    Returns {'updated': [full rows still WAITING], 'removed': [ids no longer WAITING or deleted]},
+    or None when the gap is too old or too large for a delta to be worthwhile.
+    """
+    if since < timezone.now() - DELTA_MAX_AGE:
+        return None
+
+    changed = with_wait_time(
+        WaitlistEntry.objects.filter(restaurant=restaurant_obj, updated_at__gt=since)
+    ).order_by('priority', 'timestamp', 'id')[:DELTA_MAX_CHANGES + 1]
+    changed = list(changed)
+    if len(changed) > DELTA_MAX_CHANGES:
+        return None
+
+    deleted_ids = WaitlistTombstone.objects.filter(
+        restaurant=restaurant_obj,
+        deleted_at__gt=since
+    ).values_list('entry_id', flat=True)
+
+    return {
+        'updated': [format_waitlist_entry(entry) for entry in changed if entry.status == 'WAITING'],
+        'removed': [entry.id for entry in changed if entry.status != 'WAITING'] + list(deleted_ids),
+    }
+
+# --- Compact payload ---
+# One canonical key per field (the full rows above repeat most values under 2-3 aliases).
+# Maps compact key -> model column, or None for values computed per row.
+COMPACT_FIELDS = {
+    'id': 'id',
+    'pos': None,
+    'name': 'customer_name',
+    'phone': 'phone_number',
+    'size': 'people_count',
+    'wait_time': None,
+    'arrival_time': 'timestamp',
+    'quoted_time': 'quoted_time',
+    'notes': 'notes',
+    'source': 'source',
+    'status': 'status',
+}
+# Always shown by the host table regardless of the restaurant's column settings
+COMPACT_REQUIRED_FIELDS = ['id', 'pos', 'name', 'phone', 'size', 'wait_time']
+
+def resolve_compact_fields(restaurant_obj, fields_param=None):
+    """Fields for a compact payload: the explicit ?fields= list if given, otherwise the
+    required fields plus the restaurant's stored waitlist_columns. Returned in canonical order.
+    Raises ValueError for unknown field names in ?fields=.
+    """
+    if fields_param:
+        requested = {f.strip() for f in fields_param.split(',') if f.strip()}
+        unknown = requested - COMPACT_FIELDS.keys()
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        requested.add('id') # Rows are meaningless to the client without their id
+    else:
+        requested = set(COMPACT_REQUIRED_FIELDS)
+        requested.update(c for c in (restaurant_obj.waitlist_columns or []) if c in COMPACT_FIELDS)
+    return [f for f in COMPACT_FIELDS if f in requested]
+
+def get_compact_waitlist_entries(restaurant_obj, fields):
+    """Active waitlist rows containing only `fields` (see resolve_compact_fields).
+    Only the needed columns are selected; wait_time is computed by the database.
+    Returns the rows and the total count.
+    """
+    columns = [COMPACT_FIELDS[f] for f in fields if COMPACT_FIELDS[f]]
+    queryset = active_waitlist_queryset(restaurant_obj)
+    if 'wait_time' in fields:
+        queryset = with_wait_time(queryset)
+        columns.append('waited')
+
+    rows = []
+    for index, values in enumerate(queryset.values(*columns), 1):
+        row = {}
+        for field in fields:
+            if field == 'pos':
+                row['pos'] = index
+            elif field == 'wait_time':
+                row['wait_time'] = waited_minutes(values['waited'])
+            elif field == 'arrival_time':
+                row['arrival_time'] = values['timestamp'].isoformat() if values['timestamp'] else None
+            else:
+                row[field] = values[COMPACT_FIELDS[field]]
+        rows.append(row)
+    return rows, len(rows)
 
 # Set up logging if not already configured at app/project level
 # logger = logging.getLogger(__name__) # Can be scoped to this module if needed
 
+# --- QR codes ---
+# A restaurant's join URL only changes with FRONTEND_URL, so each (url, size, format) is rendered
+# once: memoized in-process (LRU) and persisted under MEDIA_ROOT/qrcodes/ to survive restarts.
+QR_CODE_CACHE_SIZE = getattr(settings, 'QR_CODE_CACHE_SIZE', 256)
+QR_CODE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+QR_CODE_MIN_SIZE = 1
+QR_CODE_MAX_SIZE = 40
+
+def get_join_url(restaurant_id):
+    return f"{settings.FRONTEND_URL}/join-queue/{restaurant_id}"
+
+def qr_code_digest(data, size=10, image_format='png'):
+    """Content key for a rendered QR code; also used as its ETag and cache-busting `v` param."""
+    return hashlib.sha256(f"{data}|{size}|{image_format}".encode()).hexdigest()[:20]
+
+@lru_cache(maxsize=QR_CODE_CACHE_SIZE)
+def render_qr_code(data, size=10, image_format='png'):
+    """
+    Returns the QR code image bytes for `data` in `image_format` ('png' or 'svg').
+    Raises ValueError for unsupported formats; rendering errors propagate (and are not memoized).
+    """
+    if image_format not in QR_CODE_FORMATS:
+        raise ValueError(f"Unsupported QR code format: {image_format}")
+
+    path = f"qrcodes/{qr_code_digest(data, size, image_format)}.{image_format}"
+    if default_storage.exists(path):
+        with default_storage.open(path, 'rb') as stored:
+            return stored.read()
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=size,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buffer = BytesIO()
+    if image_format == 'svg':
+        img = qr.make_image(image_factory=SvgPathImage)
+        img.save(buffer)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer, format="PNG")
+    content = buffer.getvalue()
+
+    try:
+        saved = default_storage.save(path, ContentFile(content))
+        if saved != path:
+            # Another worker stored the same render first and the storage renamed ours
+            # (<digest>_abc123.png); drop the duplicate instead of leaving it orphaned
+            default_storage.delete(saved)
+    except OSError as e:
+        # The in-process cache still works; we just re-render after a restart
+        logging.getLogger(__name__).warning(f"Could not persist QR code {path}: {str(e)}")
+    return content
+
 def generate_qr_code(data, size=10):
     """
     Generates a QR code image for the provided data URL.
@@ -65,23 +275,8 @@ def generate_qr_code(data, size=10):
     """
     logger = logging.getLogger(__name__) # Get logger instance inside function or at module level
     try:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=size,
-            border=4,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
+        img_str = base64.b64encode(render_qr_code(data, size, 'png')).decode('utf-8')
         return f"data:image/png;base64,{img_str}"
     except Exception as e:
         logger.error(f"Error generating QR code: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
@@ -1,129 +1,47 @@
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.core.exceptions import PermissionDenied
 import logging
 import json
 from django.conf import settings
-import qrcode
-from io import BytesIO
-import base64
+from django.db import IntegrityError, transaction
 
 from rest_framework import viewsets, status, generics # Added generics for APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView # For standalone API views
-from rest_framework.permissions import IsAuthenticated # Standard permission
-
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny # Standard permissions
 
 from auth_settings.models import Restaurant # New import
+from parties.utils import record_served_visits
+from analytics.utils import record_completions
+from recent.utils import record_events, waitlist_status_event
 from .models import WaitlistEntry
 from .serializers import WaitlistEntrySerializer
 from .permissions import IsRestaurantOwner # Import custom permission
+from .estimator import record_served_waits, quote_new_entry
+from .utils import (
+    resolve_compact_fields, get_waitlist_changes, DELTA_CURSOR_SKEW,
+    generate_qr_code, render_qr_code, qr_code_digest, get_join_url,
+    QR_CODE_FORMATS, QR_CODE_MIN_SIZE, QR_CODE_MAX_SIZE,
+)
+from .broadcast import broadcaster, broadcast_waitlist_update
+from .cache import (
+    get_waitlist_snapshot, snapshot_cache_stats, bump_waitlist_version,
+    make_etag, etag_matches, with_etag, not_modified, wait_time_bucket
+)
 
 logger = logging.getLogger(__name__)
 
-# --- MOVED FUNCTIONS ---
-def get_formatted_waitlist_entries(restaurant_obj):
-    """Get a list of formatted waitlist entries for a restaurant.
-    Returns formatted entries, total count, and reservation count.
-    """
-    # Filter for entries associated with the given restaurant object
-    reservation_entries = WaitlistEntry.objects.filter(
-        restaurant=restaurant_obj,
-        status='WAITING',
-        notes__icontains="Reservation for"  # Case-insensitive search for reservation notes
-    ).order_by('timestamp')
-    
-    regular_entries = WaitlistEntry.objects.filter(
-        restaurant=restaurant_obj,
-        status='WAITING'
-    ).exclude(
-        notes__icontains="Reservation for"
-    ).order_by('timestamp')
-    
-    # Combine querysets, reservations first
-    combined_entries = list(reservation_entries) + list(regular_entries)
-    
-    formatted_entries_list = []
-    for index, entry in enumerate(combined_entries, 1):
-        # Assuming WaitlistEntry model has a property 'wait_time_minutes'
-        wait_time = entry.wait_time_minutes if hasattr(entry, 'wait_time_minutes') else 0
-        
-        formatted_entries_list.append({
-            'id': entry.id,
-            'pos': index,  # Position in the displayed list
-            'customer_name': entry.customer_name,
-            'name': entry.customer_name,  # Alternative field name for compatibility
-            'phone_number': entry.phone_number or '',
-            'phone': entry.phone_number or '',  # Alternative field name
-            'people_count': entry.people_count,
-            'party_size': entry.people_count,  # Alternative field name
-            'size': entry.people_count,  # For backward compatibility
-            'timestamp': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') if entry.timestamp else '',
-            'arrival': entry.timestamp.strftime('%H:%M') if entry.timestamp else '', # Arrival time
-            'created_at': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') if entry.timestamp else '', # Full creation timestamp
-            'quoted_time': entry.quoted_time or '',
-            'notes': entry.notes or '',
-            'wait_time_minutes': wait_time,
-            'wait_time': wait_time, # Alternative field name
-            'status': entry.status,
-            'status_display': entry.get_status_display() # Human-readable status
-        })
-        
-    return formatted_entries_list, len(combined_entries), len(reservation_entries)
-
-def generate_qr_code(data, size=10):
-    """
-    Generates a QR code image for the provided data URL.
-    Returns base64 encoded image data.
-    """
-    # logger is already defined at module level
-    try:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=size,
-            border=4,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        return f"data:image/png;base64,{img_str}"
-    except Exception as e:
-        logger.error(f"Error generating QR code: {str(e)}")
-        return None
-# --- END MOVED FUNCTIONS ---
-
-# --- Helper for WebSocket updates (Revised) ---
-def broadcast_waitlist_update(restaurant_id, entry_instance=None, event_type='send.waitlist.update', removed_id=None, full_update=False):
-    channel_layer = get_channel_layer()
-    group_name = f"waitlist_{restaurant_id}" # Ensure this group name is used by your consumer
-    message = {
-        'type': event_type, # e.g., 'send.waitlist.update', 'send.waitlist.remove'
-    }
-    if event_type == 'send.waitlist.remove':
-        message['data'] = {'id': removed_id, 'status': 'REMOVED'}
-    elif entry_instance:
-        message['data'] = WaitlistEntrySerializer(entry_instance).data
-    elif full_update:
-         message['data'] = {'message': 'Full waitlist refresh requested'} # Signal frontend to refetch all data
-    else:
-        # Can be used for generic updates if needed, or this branch can be removed
-        message['data'] = {'message': 'Waitlist updated'}
-
-    async_to_sync(channel_layer.group_send)(group_name, message)
-    entry_id_log = removed_id or (entry_instance.id if entry_instance else 'general')
-    logger.info(f"Sent {event_type} to group {group_name} for entry/event: {entry_id_log}")
+BULK_MAX_OPERATIONS = 100
+# Raised via waitlist_one_waiting_per_phone: a phone can only be WAITING once per restaurant
+DUPLICATE_WAITING_ERROR = 'This phone number is already waiting in the queue.'
+QR_CODE_MAX_AGE = 365 * 24 * 60 * 60 # Versioned QR image URLs never change content
+
 
 # --- WaitlistEntryViewSet (DRF ModelViewSet - Enhanced) ---
 class WaitlistEntryViewSet(viewsets.ModelViewSet):
@@ -143,24 +61,60 @@ class WaitlistEntryViewSet(viewsets.ModelViewSet):
             logger.warning(f"User {self.request.user.id} does not have an associated restaurant.")
             return WaitlistEntry.objects.none() # Return an empty queryset
 
+    def get_payload_fields(self, request, restaurant):
+        """ `?payload=compact` selects one canonical key per field, limited to `?fields=`
+        (comma separated) or by default the restaurant's waitlist_columns. Returns None for the full payload.
+        (`format` is reserved by DRF for renderer selection, hence `payload`.) """
+        if request.query_params.get('payload') != 'compact':
+            return None
+        return resolve_compact_fields(restaurant, request.query_params.get('fields'))
+
     def list(self, request, *args, **kwargs):
-        """ Custom list view to return formatted entries, similar to refresh_waitlist_view."""
-        restaurant = get_object_or_404(Restaurant, user=request.user)
-        formatted_entries, count, _ = get_formatted_waitlist_entries(restaurant)
-        return Response({
-            'count': count,
-            'entries': formatted_entries
-        })
+        """ Custom list view to return formatted entries, similar to refresh_waitlist_view.
+        Honours If-None-Match: an unchanged waitlist version returns 304 before any entry is read."""
+        restaurant = request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        try:
+            fields = self.get_payload_fields(request, restaurant)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # The bucket moves the ETag on every so often, so idle polls still see wait_time advance
+        bucket = wait_time_bucket()
+        etag = make_etag('wl', restaurant.id, f'{restaurant.waitlist_version}.{bucket}', json.dumps(['list', fields]))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        snapshot = get_waitlist_snapshot(restaurant, fields, bucket)
+        data = {
+            'count': snapshot['count'],
+            'entries': snapshot['entries']
+        }
+        if fields:
+            data['fields'] = fields
+        return with_etag(Response(data), etag)
 
     def perform_create(self, serializer):
         # `restaurant` is automatically set to `request.user.restaurant` due to `get_queryset` and serializer scope
         # or by explicitly passing it if needed by serializer.
         # Here, we ensure it's linked to the authenticated user's restaurant.
-        instance = serializer.save(restaurant=self.request.user.restaurant)
-        broadcast_waitlist_update(self.request.user.restaurant.id, instance, event_type='send.waitlist.update')
+        restaurant = self.request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        quoted_time = serializer.validated_data.get('quoted_time')
+        if quoted_time is None: # Host left the quote blank: fill it from the restaurant's wait history
+            quoted_time = quote_new_entry(
+                restaurant.id,
+                serializer.validated_data['people_count'],
+                serializer.validated_data.get('priority', WaitlistEntry.PRIORITY_DEFAULT)
+            )
+        try:
+            instance = serializer.save(restaurant=restaurant, quoted_time=quoted_time)
+        except IntegrityError:
+            raise ValidationError({'phone_number': [DUPLICATE_WAITING_ERROR]})
+        broadcast_waitlist_update(restaurant.id, instance, event_type='send.waitlist.update')
 
     def perform_update(self, serializer):
-        instance = serializer.save()
+        try:
+            instance = serializer.save()
+        except IntegrityError:
+            raise ValidationError({'phone_number': [DUPLICATE_WAITING_ERROR]})
         broadcast_waitlist_update(instance.restaurant.id, instance, event_type='send.waitlist.update')
 
     def perform_destroy(self, instance):
@@ -178,29 +132,183 @@ class WaitlistEntryViewSet(viewsets.ModelViewSet):
         entry.status = new_status
         # if new_status in ['SERVED', 'REMOVED'] and hasattr(entry, 'completion_time'):
         #     entry.completion_time = timezone.now()
-        entry.save()
+        try:
+            entry.save()
+        except IntegrityError: # Back to WAITING while the same phone already has a newer waiting entry
+            return Response({'error': DUPLICATE_WAITING_ERROR}, status=status.HTTP_409_CONFLICT)
         broadcast_waitlist_update(entry.restaurant.id, entry, event_type='send.waitlist.update')
         return Response(WaitlistEntrySerializer(entry).data)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsRestaurantOwner])
+    def bulk(self, request):
+        """ Apply several host actions at once: {"operations": [{"id": 1, "op": "set_status", "status": "SERVED"},
+        {"id": 2, "op": "delete"}, ...]}. All operations succeed or fail together in one transaction,
+        status changes are written with a single bulk_update, Party stats, rollups and the activity log are updated in batch,
+        and one coalesced 'send.waitlist.bulk' WebSocket message is sent. """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else request.data
+        if not isinstance(operations, list) or not operations:
+            return Response({'error': 'operations must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > BULK_MAX_OPERATIONS:
+            return Response({'error': f'At most {BULK_MAX_OPERATIONS} operations per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid_statuses = [choice[0] for choice in WaitlistEntry.STATUS_CHOICES]
+        status_changes = {}
+        delete_ids = set()
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                return Response({'error': f'Operation {index} must be an object.'}, status=status.HTTP_400_BAD_REQUEST)
+            op = operation.get('op', 'set_status')
+            try:
+                entry_id = int(operation.get('id'))
+            except (TypeError, ValueError):
+                return Response({'error': f'Operation {index} has an invalid id.'}, status=status.HTTP_400_BAD_REQUEST)
+            if entry_id in status_changes or entry_id in delete_ids:
+                return Response({'error': f'Entry {entry_id} appears in more than one operation.'}, status=status.HTTP_400_BAD_REQUEST)
+            if op == 'set_status':
+                if operation.get('status') not in valid_statuses:
+                    return Response({'error': f'Operation {index} has an invalid status.'}, status=status.HTTP_400_BAD_REQUEST)
+                status_changes[entry_id] = operation['status']
+            elif op == 'delete':
+                delete_ids.add(entry_id)
+            else:
+                return Response({'error': f'Operation {index} has an unknown op. Use set_status or delete.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        restaurant = request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        requested_ids = set(status_changes) | delete_ids
+        try:
+            with transaction.atomic():
+                entries = {
+                    entry.id: entry
+                    for entry in WaitlistEntry.objects.select_for_update().filter(restaurant=restaurant, id__in=requested_ids)
+                }
+                missing = sorted(requested_ids - entries.keys())
+                if missing:
+                    return Response({'error': 'Entries not found.', 'missing_ids': missing}, status=status.HTTP_404_NOT_FOUND)
+
+                now = timezone.now()
+                changed, newly_served, events = [], [], []
+                for entry_id, new_status in status_changes.items():
+                    entry = entries[entry_id]
+                    if entry.status == new_status:
+                        continue
+                    if new_status == 'SERVED':
+                        newly_served.append(entry)
+                    previous_status = entry.status
+                    # What save() records for post_save handlers; record_completions reads it the same way
+                    entry.previous_status, entry.previous_completion = previous_status, entry.completion_snapshot()
+                    entry.status = new_status
+                    if new_status in ['SERVED', 'REMOVED'] and not entry.completion_time:
+                        entry.completion_time = now # Same rule as WaitlistEntry.save()
+                    entry.updated_at = now # bulk_update skips auto_now
+                    changed.append(entry)
+                    events.append(waitlist_status_event(entry, previous_status))
+
+                if changed:
+                    WaitlistEntry.objects.bulk_update(changed, ['status', 'completion_time', 'updated_at'])
+                    bump_waitlist_version(restaurant.id) # bulk_update sends no post_save
+                    record_completions(changed)
+                    record_events(events)
+                    transaction.on_commit(lambda: record_served_visits(newly_served), robust=True) # Party stats never fail the request
+                    transaction.on_commit(lambda: record_served_waits(newly_served), robust=True)
+                if delete_ids:
+                    WaitlistEntry.objects.filter(restaurant=restaurant, id__in=delete_ids).delete()
+        except IntegrityError:
+            # Everything rolled back: moving an entry back to WAITING collided with another waiting entry for that phone
+            return Response({'error': DUPLICATE_WAITING_ERROR}, status=status.HTTP_409_CONFLICT)
+
+        updated_data = WaitlistEntrySerializer(changed, many=True).data
+        removed_ids = sorted(delete_ids)
+        if changed or removed_ids:
+            broadcast_waitlist_update(
+                restaurant.id,
+                event_type='send.waitlist.bulk',
+                data={'updated': updated_data, 'removed': removed_ids}
+            )
+        return Response({'success': True, 'updated': updated_data, 'removed': removed_ids})
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsRestaurantOwner])
     def data_with_qr(self, request):
-        """ Consolidates api_waitlist_data_view: returns formatted entries and QR code."""
-        restaurant = get_object_or_404(Restaurant, user=request.user)
-        formatted_entries, count, _ = get_formatted_waitlist_entries(restaurant)
-        
-        join_url = f"{settings.FRONTEND_URL}/join-queue/{restaurant.id}"
-        qr_base64_data_uri = generate_qr_code(join_url)
+        """ Consolidates api_waitlist_data_view: returns formatted entries and QR code.
+        Honours If-None-Match like `list`; the ETag also covers the restaurant fields echoed back."""
+        restaurant = request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        try:
+            fields = self.get_payload_fields(request, restaurant)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        join_url = get_join_url(restaurant.id)
+        qr_urls = get_qr_code_urls(request, restaurant.id)
+        variant = json.dumps(['data_with_qr', fields, restaurant.name, restaurant.waitlist_columns, join_url, qr_urls])
+        bucket = wait_time_bucket()
+        etag = make_etag('wl', restaurant.id, f'{restaurant.waitlist_version}.{bucket}', variant)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        snapshot = get_waitlist_snapshot(restaurant, fields, bucket)
         
-        return Response({
+        data = {
             'restaurant': {
                 'id': restaurant.id,
                 'name': restaurant.name,
                 'waitlist_columns': restaurant.waitlist_columns if hasattr(restaurant, 'waitlist_columns') else ['notes', 'arrival_time', 'status'],
             },
-            'queue_entries': formatted_entries,
-            'queue_count': count,
-            'qr_code': qr_base64_data_uri,
+            'queue_entries': snapshot['entries'],
+            'queue_count': snapshot['count'],
+            # Cacheable image URLs instead of a base64 blob on every poll
+            'qr_code': qr_urls['png'],
+            'qr_code_svg': qr_urls['svg'],
             'join_url': join_url,
+        }
+        if fields:
+            data['fields'] = fields
+        return with_etag(Response(data), etag)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsRestaurantOwner])
+    def changes(self, request):
+        """ Change feed for reconnecting clients: entries created, updated or removed since `?since=<cursor>`
+        (the `cursor` returned by the previous call). `?version=<n>` matching the current waitlist version
+        short-circuits to an empty delta. Falls back to a full snapshot (`full: true`) when no cursor is given
+        or the gap is too old/too large. """
+        restaurant = request.user.restaurant_profile # Loaded and verified by IsRestaurantOwner
+        version = restaurant.waitlist_version
+        # Taken before reading so nothing committed during this request can fall between cursors
+        cursor = timezone.now() - DELTA_CURSOR_SKEW
+
+        since_param = request.query_params.get('since')
+        since = None
+        if since_param:
+            try:
+                since = parse_datetime(since_param.replace(' ', '+')) # Unencoded '+' in the offset arrives as a space
+            except ValueError: # Well formed but not a real time, e.g. February 30th
+                since = None
+            if since is None:
+                return Response({'error': 'Invalid since cursor. Use an ISO 8601 timestamp.'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        if request.query_params.get('version') == str(version):
+            return Response({
+                'version': version,
+                'cursor': since.isoformat() if since else cursor.isoformat(),
+                'full': False,
+                'updated': [],
+                'removed': [],
+            })
+
+        delta = get_waitlist_changes(restaurant, since) if since else None
+        if delta is None:
+            snapshot = get_waitlist_snapshot(restaurant)
+            return Response({
+                'version': version,
+                'cursor': cursor.isoformat(),
+                'full': True,
+                'entries': snapshot['entries'],
+                'count': snapshot['count'],
+            })
+        return Response({
+            'version': version,
+            'cursor': cursor.isoformat(),
+            'full': False,
+            **delta,
         })
 
 # --- Standalone APIViews for Restaurant-level Waitlist Operations ---
@@ -230,7 +338,7 @@ class WaitlistRestaurantConfigAPIView(APIView):
             return Response({'error': 'Columns must be a list.'}, status=status.HTTP_400_BAD_REQUEST)
         
         restaurant.waitlist_columns = selected_columns
-        restaurant.save()
+        restaurant.save(update_fields=['waitlist_columns']) # Never write back a stale waitlist_version
         # Optionally, broadcast a general config update if clients need to know
         # broadcast_waitlist_update(restaurant.id, event_type='send.config.update', full_update=True) # Example for config
         return Response({'success': True, 'message': 'Waitlist columns updated.', 'columns': selected_columns}, status=status.HTTP_200_OK)
@@ -241,13 +349,79 @@ class WaitlistRestaurantQRCodeAPIView(APIView):
 
     def get(self, request, *args, **kwargs):
         restaurant = get_object_or_404(Restaurant, user=request.user)
-        join_url = f"{settings.FRONTEND_URL}/join-queue/{restaurant.id}"
-        qr_base64_data_uri = generate_qr_code(join_url)
+        join_url = get_join_url(restaurant.id)
+        qr_base64_data_uri = generate_qr_code(join_url) # Memoized; see render_qr_code
+        qr_urls = get_qr_code_urls(request, restaurant.id)
         return Response({
             'qr_code': qr_base64_data_uri,
+            'qr_code_url': qr_urls['png'],
+            'qr_code_svg_url': qr_urls['svg'],
             'join_url': join_url,
         }, status=status.HTTP_200_OK)
 
+class WaitlistQRCodeImageView(APIView):
+    """ Public, cacheable QR code image for a restaurant's join URL: /api/waitlist/qrcode/<id>.png|.svg
+    Optional `?size=` (box size, 1-40) and `?download=1`. Requests carrying the current `?v=` digest
+    (as produced by get_qr_code_urls) are marked immutable; the digest changes whenever the join URL does. """
+    authentication_classes = [] # Rendered as <img src>, so no auth header; the join URL is public anyway
+    permission_classes = [AllowAny]
+
+    def get(self, request, restaurant_id, image_format):
+        if image_format not in QR_CODE_FORMATS:
+            return Response({'error': 'Unsupported format. Use png or svg.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            size = int(request.query_params.get('size', 10))
+        except ValueError:
+            size = 0
+        if not QR_CODE_MIN_SIZE <= size <= QR_CODE_MAX_SIZE:
+            return Response({'error': f'size must be between {QR_CODE_MIN_SIZE} and {QR_CODE_MAX_SIZE}.'}, status=status.HTTP_400_BAD_REQUEST)
+        get_object_or_404(Restaurant, id=restaurant_id)
+
+        join_url = get_join_url(restaurant_id)
+        digest = qr_code_digest(join_url, size, image_format)
+        etag = f'"{digest}"'
+        if request.query_params.get('v') == digest:
+            cache_control = f'public, max-age={QR_CODE_MAX_AGE}, immutable'
+        else:
+            cache_control = 'public, max-age=3600'
+
+        if etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(render_qr_code(join_url, size, image_format), content_type=QR_CODE_FORMATS[image_format])
+            if request.query_params.get('download') == '1':
+                response['Content-Disposition'] = f'attachment; filename="qr_code_{restaurant_id}.{image_format}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+def get_qr_code_urls(request, restaurant_id, size=10):
+    """ Absolute PNG/SVG image URLs for the restaurant's QR code, versioned by content digest. """
+    join_url = get_join_url(restaurant_id)
+    return {
+        image_format: request.build_absolute_uri(
+            reverse('waitlist-qrcode-image', kwargs={'restaurant_id': restaurant_id, 'image_format': image_format})
+            + f"?size={size}&v={qr_code_digest(join_url, size, image_format)}"
+        )
+        for image_format in QR_CODE_FORMATS
+    }
+
+
+class WaitlistCacheStatsAPIView(APIView):
+    """ Staff-only view of the waitlist snapshot cache hit/miss counters for this worker process. """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(snapshot_cache_stats(), status=status.HTTP_200_OK)
+
+
+class WaitlistBroadcastStatsAPIView(APIView):
+    """ Staff-only view of the WebSocket broadcast coalescing counters (events in vs frames out) for this worker process. """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(broadcaster.stats(), status=status.HTTP_200_OK)
+
 
 # --- Retained Function-Based Views (if any are still needed and don't fit ViewSet/APIView model well) ---
 # Most of the previous FBVs like add_party_view, remove_entry_view, mark_as_served_view,
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import { getQueueConfirmationDetails, leaveQueue } from '../../services/customerQueueService';
+import { connectToQueuePositionSocket } from '../../services/realtimeService';
 
 const QueueConfirmation = () => {
   const { restaurantId, queueEntryId } = useParams();
@@ -44,11 +45,14 @@ const QueueConfirmation = () => {
     
     fetchQueueConfirmation();
     
-    // Set up polling to refresh the data every 30 seconds
-    // const intervalId = setInterval(fetchQueueConfirmation, 30000); // Commented out polling
-    
-    // Clean up on component unmount
-    // return () => clearInterval(Number(intervalId)); // Commented out cleanup for polling
+    // Position and estimate are pushed over a WebSocket whenever the queue moves, instead of polling
+    if (!restaurantId || !queueEntryId) return undefined;
+    const closeSocket = connectToQueuePositionSocket(restaurantId, queueEntryId, (update) => {
+      setQueuePosition(update.position || 0);
+      setEstimatedWaitTime(update.wait_time || 0);
+      setQueueEntry(prev => (prev ? { ...prev, status: update.status } : prev));
+    });
+    return closeSocket;
   }, [restaurantId, queueEntryId]);
   
   const handleRemoveFromQueue = async () => {
@@ -212,20 +216,10 @@ const QueueConfirmation = () => {
                   <span className="text-gray-600">Name:</span>
                   <span className="font-medium">{queueEntry?.customer_name}</span>
                 </div>
-                <div className="flex justify-between">
-                  <span className="text-gray-600">Phone:</span>
-                  <span className="font-medium">{queueEntry?.phone_number}</span>
-                </div>
                 <div className="flex justify-between">
                   <span className="text-gray-600">Party Size:</span>
                   <span className="font-medium">{queueEntry?.people_count} people</span>
                 </div>
-                {queueEntry?.notes && (
-                  <div className="flex justify-between">
-                    <span className="text-gray-600">Notes:</span>
-                    <span className="font-medium">{queueEntry?.notes}</span>
-                  </div>
-                )}
               </div>
             </div>
             
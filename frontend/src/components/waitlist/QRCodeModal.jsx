@@ -3,8 +3,8 @@ import React from 'react';
 const QRCodeModal = ({ showQRModal, closeQRModal, restaurantName, qrCodeURL, joinURL, copyJoinLink, handleDownloadQRCode }) => {
   if (!showQRModal) return null;
   
-  // Check if QR code is available
-  const isQRCodeAvailable = qrCodeURL && qrCodeURL.startsWith('data:image');
+  // Check if QR code is available (an image URL from the API, or a legacy base64 data URI)
+  const isQRCodeAvailable = qrCodeURL && (qrCodeURL.startsWith('data:image') || qrCodeURL.startsWith('http'));
   
   return (
     <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
@@ -125,7 +125,8 @@ const Waitlist = () => {
   const handleDownloadQRCode = () => {
     if (qrCodeURL) {
       const link = document.createElement('a');
-      link.href = qrCodeURL;
+      // Image URLs are cross-origin, so ask the API for an attachment instead of relying on `download`
+      link.href = qrCodeURL.startsWith('data:') ? qrCodeURL : `${qrCodeURL}&download=1`;
       // Sanitize restaurant name for filename
       const fileName = `${restaurantName.replace(/[^a-z0-9]/gi, '_').toLowerCase()}_qr_code.png`;
       link.download = fileName;
@@ -238,7 +239,7 @@ const Waitlist = () => {
         }
       case 'send.waitlist.remove':
         {
-          const removedEntryId = data.removed_id; // Backend sends { removed_id: id }
+          const removedEntryId = data.removed_id ?? data.id; // Backend sends { id, status: 'REMOVED' }
           if (!removedEntryId) {
             console.warn('Received waitlist.remove message without removed_id:', data);
             return;
@@ -253,6 +254,35 @@ const Waitlist = () => {
           showToast(`${partyName} was removed from the waitlist.`, 'info');
           break;
         }
+      case 'send.waitlist.snapshot': // Sent on (re)connect when the missed frames can't be replayed
+        {
+          const snapshotEntries = (data.entries || []).map(transformApiEntryToComponentFormat);
+          const snapshotIds = new Set(snapshotEntries.map(entry => entry.id));
+          setWaitlistEntries(prevEntries => assignPositions([
+            // The snapshot only holds the waiting queue; keep served/removed rows already on screen
+            ...prevEntries.filter(entry => !snapshotIds.has(entry.id) && entry.status !== 'WAITING'),
+            ...snapshotEntries,
+          ]));
+          break;
+        }
+      case 'send.waitlist.bulk': // Coalesced burst or bulk action: { updated: [entries], removed: [ids] }
+        {
+          const updatedEntries = (data.updated || []).map(transformApiEntryToComponentFormat);
+          const removedIds = new Set(data.removed || []);
+          setWaitlistEntries(prevEntries => {
+            const updatesById = new Map(updatedEntries.map(entry => [entry.id, entry]));
+            const merged = prevEntries
+              .filter(entry => !removedIds.has(entry.id))
+              .map(entry => {
+                const update = updatesById.get(entry.id);
+                if (!update) return entry;
+                updatesById.delete(entry.id);
+                return { ...entry, ...update };
+              });
+            return assignPositions([...merged, ...updatesById.values()]);
+          });
+          break;
+        }
       // case 'WAITLIST_COLUMNS_UPDATED': // If you had a WebSocket message for this
       //   {
       //     if (data.columns && Array.isArray(data.columns)) {
@@ -17,6 +17,11 @@ const WSS_BASE_URL = `${WSS_PROTOCOL}://${wsHost}`.replace(/^http/, 'ws');
 
 let socket = null;
 let onMessageHandler = null;
+// Highest frame seq seen per restaurant; sent back on reconnect so the server replays only what we missed
+const lastSeqByRestaurant = {};
+let reconnectTimer = null;
+let reconnectAttempts = 0;
+let activeRestaurantId = null;
 
 /**
  * Connects to the WebSocket server for a specific restaurant's waitlist.
@@ -35,19 +40,34 @@ const connectToWaitlistSocket = (restaurantId, onMessage) => {
     socket.close();
   }
 
-  const WSS_URL = `${WSS_BASE_URL}/ws/waitlist/${restaurantId}`; // Matches Python backend example
-  console.log(`Attempting to connect to WebSocket: ${WSS_URL}`);
+  activeRestaurantId = restaurantId;
+  const lastSeq = lastSeqByRestaurant[restaurantId];
+  // Browsers can't send an Authorization header on a WebSocket, so the API token goes in the query string
+  const params = new URLSearchParams({ token: localStorage.getItem('authToken') || '' });
+  if (lastSeq != null) {
+    params.set('last_seq', lastSeq);
+  }
+  const WSS_URL = `${WSS_BASE_URL}/ws/waitlist/${restaurantId}?${params}`;
+  console.log(`Attempting to connect to WebSocket for restaurant ${restaurantId}`);
 
   socket = new WebSocket(WSS_URL);
   onMessageHandler = onMessage;
 
   socket.onopen = () => {
-    console.log(`WebSocket connected successfully to ${WSS_URL}`);
+    console.log(`WebSocket connected successfully for restaurant ${restaurantId}`);
+    reconnectAttempts = 0;
   };
 
   socket.onmessage = (event) => {
     try {
       const message = JSON.parse(event.data);
+      if (typeof message.seq === 'number') {
+        // A snapshot resets the position; replayed and live frames move it forward
+        const seen = lastSeqByRestaurant[restaurantId];
+        if (message.type === 'send.waitlist.snapshot' || seen == null || message.seq > seen) {
+          lastSeqByRestaurant[restaurantId] = message.seq;
+        }
+      }
       if (onMessageHandler) {
         onMessageHandler(message);
       }
@@ -62,12 +82,20 @@ const connectToWaitlistSocket = (restaurantId, onMessage) => {
     // You might want to trigger a UI update or a reconnect attempt here
   };
 
+  const handler = onMessage;
   socket.onclose = (event) => {
     console.log('WebSocket disconnected:', event.code, event.reason);
     socket = null;
-    onMessageHandler = null;
-    // Optionally, implement automatic reconnection logic here
-    // Be careful with infinite loops if the server is down.
+    // Unexpected drop: reconnect with backoff (capped at 30s) and resume from the last seq.
+    // disconnectWebSocket() clears activeRestaurantId first, 4404 means the restaurant is gone and
+    // 4403 that this login may not watch it.
+    if (activeRestaurantId === restaurantId && event.code !== 4404 && event.code !== 4403) {
+      const delay = Math.min(30000, 1000 * 2 ** reconnectAttempts);
+      reconnectAttempts += 1;
+      reconnectTimer = setTimeout(() => connectToWaitlistSocket(restaurantId, handler), delay);
+    } else {
+      onMessageHandler = null;
+    }
   };
 };
 
@@ -75,6 +103,9 @@ const connectToWaitlistSocket = (restaurantId, onMessage) => {
  * Disconnects the WebSocket.
  */
 const disconnectWebSocket = () => {
+  activeRestaurantId = null;
+  clearTimeout(reconnectTimer);
+  reconnectAttempts = 0;
   if (socket) {
     console.log('Disconnecting WebSocket...');
     socket.close();
@@ -83,6 +114,46 @@ const disconnectWebSocket = () => {
   }
 };
 
+/**
+ * Subscribes to a customer's own queue position: the server pushes
+ * { position, wait_time, status, queue_size } whenever it changes, instead of the page polling.
+ * Reconnects with backoff until the returned function is called or the entry is gone (4404).
+ * @returns {function} Call to close the socket and stop reconnecting.
+ */
+const connectToQueuePositionSocket = (restaurantId, entryId, onUpdate) => {
+  let positionSocket = null;
+  let retryTimer = null;
+  let attempts = 0;
+  let closed = false;
+
+  const open = () => {
+    positionSocket = new WebSocket(`${WSS_BASE_URL}/ws/queue/${restaurantId}/${entryId}`);
+    positionSocket.onopen = () => { attempts = 0; };
+    positionSocket.onmessage = (event) => {
+      try {
+        const message = JSON.parse(event.data);
+        if (message.type === 'queue.position' && message.data) onUpdate(message.data);
+      } catch (error) {
+        console.error('Error parsing queue position message:', error, event.data);
+      }
+    };
+    positionSocket.onclose = (event) => {
+      positionSocket = null;
+      if (closed || event.code === 4404) return;
+      const delay = Math.min(30000, 1000 * 2 ** attempts);
+      attempts += 1;
+      retryTimer = setTimeout(open, delay);
+    };
+  };
+  open();
+
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (positionSocket) positionSocket.close();
+  };
+};
+
 // If you need to send messages from client to server via WebSocket (not in this primary use case)
 // const sendWebSocketMessage = (message) => {
 //   if (socket && socket.readyState === WebSocket.OPEN) {
@@ -92,4 +163,4 @@ const disconnectWebSocket = () => {
 //   }
 // };
 
-export { connectToWaitlistSocket, disconnectWebSocket /*, sendWebSocketMessage */ };
\ No newline at end of file
+export { connectToWaitlistSocket, disconnectWebSocket, connectToQueuePositionSocket /*, sendWebSocketMessage */ };
\ No newline at end of file
@@ -128,6 +128,8 @@ const getWaitlistEntryById = async (entryId) => {
 // Function to send a notification (SMS/Email) via the notifications app
 const sendAppNotification = async (notificationData) => {
   // Expected notificationData: { entry_id, notification_type ('sms', 'email', 'both'), message?, subject?, email_context? }
+  // The backend queues the notification and answers 202 { job_id, status }; delivery can be followed at
+  // /api/notifications/jobs/<job_id>/
   try {
     const response = await apiClient.post('/api/notifications/send/', notificationData);
     console.log('Send notification response:', response.data);
@@ -141,6 +143,22 @@ const sendAppNotification = async (notificationData) => {
   }
 };
 
+// Page several parties at once: { restaurant_id, count } for the next N not yet notified, or
+// { restaurant_id, entry_ids }, plus the same notification_type/message fields as sendAppNotification.
+// Responds with { notified: [{ entry_id, job_id, status, sms, email }], skipped: [{ entry_id, reason }] }
+const notifyNextParties = async (batchData) => {
+  try {
+    const response = await apiClient.post('/api/notifications/notify-next/', batchData);
+    return { success: true, data: response.data };
+  } catch (error) {
+    console.error('Error notifying parties:', error.response?.data || error.message);
+    return {
+      success: false,
+      message: error.response?.data?.detail || error.response?.data?.error || 'Failed to notify parties'
+    };
+  }
+};
+
 // Old functions that need to be updated or removed:
 // fetchWaitlist -> replaced by getWaitlistData
 // fetchQRCode -> replaced by fetchQRCodeOnly or getWaitlistData
@@ -166,5 +184,6 @@ export {
   updateWaitlistColumnSettings,
   getWaitlistEntryById,
   sendAppNotification, // Replaces sendSmsNotification and can do more
+  notifyNextParties,
   // ... any other relevant exports that are kept or refactored ...
 }; 
\ No newline at end of file